@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from functools import wraps
+from typing import Callable, Tuple
+
+
+class ADAPIProxy:
+    """ Base for wrappers around the AppDaemon api. Attributes the wrapper does not define are read from
+        the wrapped api, and methods are stored on the wrapper so the next lookup skips __getattr__.
+        Methods named in wrap_callbacks get their callback passed through wrap_callback first. """
+
+    wrap_callbacks: Tuple[str, ...] = ()
+
+    def __init__(self, ADapi):
+        self._ADapi = ADapi
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._ADapi, name)
+        if name in self.wrap_callbacks:
+            method = attr
+
+            @wraps(method)
+            def attr(callback, *args, **kwargs):
+                return method(self.wrap_callback(callback), *args, **kwargs)
+
+        if callable(attr):
+            setattr(self, name, attr)
+        return attr
+
+    def wrap_callback(self, callback: Callable) -> Callable:
+        return callback
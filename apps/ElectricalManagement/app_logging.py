@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Callable, Dict, Tuple
+
+LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+}
+
+
+class Lazy:
+    """ Log argument that is only computed if the message is logged.
+        Use for values that need a state read or calculation: Lazy(lambda: self.ADapi.get_state(sensor)) """
+
+    __slots__ = ('func',)
+
+    def __init__(self, func: Callable[[], Any]):
+        self.func = func
+
+    def __str__(self) -> str:
+        return str(self.func())
+
+    def __repr__(self) -> str:
+        return repr(self.func())
+
+
+class AppLogger:
+    """ Logging in front of ADapi.log. Checks level before formatting, formats arguments with %
+        only when logged, and limits how often the same warning is repeated. """
+
+    def __init__(self, ADapi, repeat_interval:float = 3600):
+        self.ADapi = ADapi
+        self.repeat_interval = repeat_interval
+        self._limited: Dict[str, Tuple[float, int]] = {} # key: (last logged, suppressed since)
+        try:
+            self._logger = ADapi.get_main_log()
+        except Exception:
+            self._logger = None
+
+    def is_enabled(self, level:str) -> bool:
+        if self._logger is None:
+            return True
+        return self._logger.isEnabledFor(LEVELS.get(level, logging.INFO))
+
+    def log(self, level:str, msg:str, *args) -> None:
+        if not self.is_enabled(level):
+            return
+        if args:
+            msg = msg % args
+        self.ADapi.log(msg, level = level)
+
+    def debug(self, msg:str, *args) -> None:
+        self.log('DEBUG', msg, *args)
+
+    def info(self, msg:str, *args) -> None:
+        self.log('INFO', msg, *args)
+
+    def warning(self, msg:str, *args) -> None:
+        self.log('WARNING', msg, *args)
+
+    def warning_limited(self, key:str, msg:str, *args) -> None:
+        """ Logs warning at most once every repeat_interval seconds for *key*,
+            with the number of warnings that were left out in between """
+
+        now = time.monotonic()
+        last, suppressed = self._limited.get(key, (None, 0))
+        if last is not None and now - last < self.repeat_interval:
+            self._limited[key] = (last, suppressed + 1)
+            return
+        self._limited[key] = (now, 0)
+        if suppressed:
+            msg += f" (repeated {suppressed} times since last warning)"
+        self.log('WARNING', msg, *args)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api_proxy import ADAPIProxy
+
+ENTITY_ID = re.compile(r'^[a-z_]+\.[a-z0-9_]+$')
+
+StateKey = Tuple[Optional[str], str] # namespace, entity_id
+
+
+def entity_ids(model) -> Iterable[str]:
+    """ Yields all fields in a pydantic model that holds an entity id. """
+
+    for name in type(model).model_fields:
+        value = getattr(model, name, None)
+        if isinstance(value, str) and ENTITY_ID.match(value):
+            yield value
+
+
+def apply_service_call(states: Dict[StateKey, dict], service: str, data: dict) -> None:
+    """ Sets state and attributes in *states* that *service* is expected to change,
+        so reads after a deferred call see the new value. """
+
+    domain, _, action = service.partition('/')
+    entities = data.get('entity_id')
+    if isinstance(entities, str):
+        entities = (entities,)
+    for entity_id in entities or ():
+        state = states.get((data.get('namespace'), entity_id))
+        if state is None:
+            continue
+        if action == 'turn_off' or (action == 'turn_on' and domain != 'climate'):
+            state['state'] = action[5:]
+        elif action in ('set_value', 'select_option'):
+            state['state'] = str(data.get('value', data.get('option')))
+        elif action == 'set_hvac_mode':
+            state['state'] = data.get('hvac_mode')
+        elif action == 'set_temperature':
+            state.setdefault('attributes', {})['temperature'] = data.get('temperature')
+
+
+class TickADAPI(ADAPIProxy):
+    """ Wraps AppDaemon api for the async control loop.
+        While a tick runs in the current thread, get_state is answered from states read concurrently
+        before the tick, and call_service is collected so the calls can be awaited together after the tick.
+        Collected calls are applied to the read states, so the rest of the tick sees what it wrote.
+        Outside a tick, and for states not read in advance, calls go straight to AppDaemon.
+        Coroutines run in the event loop thread, outside the tick, so awaited service calls get their result. """
+
+    def __init__(self, ADapi):
+        super().__init__(ADapi)
+        self._tick = threading.local()
+
+    def begin_tick(self, states: Dict[StateKey, dict]) -> None:
+        self._tick.states = states
+        self._tick.calls = []
+
+    def end_tick(self) -> List[Tuple[str, dict]]:
+        """ Stops answering from read states and returns collected service calls. """
+
+        calls = getattr(self._tick, 'calls', None) or []
+        self._tick.states = None
+        self._tick.calls = None
+        return calls
+
+    def get_state(self, entity_id = None, attribute = None, default = None, **kwargs):
+        states = getattr(self._tick, 'states', None)
+        if states is not None and entity_id is not None and set(kwargs) <= {'namespace'}:
+            key = (kwargs.get('namespace'), entity_id)
+            if key in states:
+                state = states[key]
+                if state is None:
+                    return default
+                if attribute == 'all':
+                    return state
+                if attribute is None:
+                    value = state.get('state')
+                elif attribute in state and attribute != 'attributes':
+                    value = state[attribute]
+                else:
+                    value = state.get('attributes', {}).get(attribute)
+                return default if value is None else value
+
+        if attribute is not None:
+            kwargs['attribute'] = attribute
+        if default is not None:
+            kwargs['default'] = default
+        return self._ADapi.get_state(entity_id, **kwargs)
+
+    def call_service(self, service: str, **kwargs):
+        calls = getattr(self._tick, 'calls', None)
+        if calls is not None:
+            calls.append((service, kwargs))
+            apply_service_call(self._tick.states, service, kwargs)
+            return None
+        return self._ADapi.call_service(service, **kwargs)
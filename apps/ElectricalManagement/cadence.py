@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import math
+from datetime import timedelta
+
+
+class UsageCadence:
+    """ Decides how many seconds to wait until next checkElectricalUsage.
+        Runs seldom when there is plenty of headroom and nothing to control,
+        and often when consumption is close to max kWh usage pr hour. """
+
+    def __init__(self,
+        min_interval:int = 10,
+        normal_interval:int = 60,
+        max_interval:int = 300,
+    ):
+        self.min_interval = max(int(min_interval), 1)
+        self.normal_interval = max(int(normal_interval), self.min_interval)
+        self.max_interval = max(int(max_interval), self.normal_interval)
+        self.fast_interval = min(math.ceil(self.min_interval * 1.5), self.normal_interval)
+
+    def next_interval(self,
+        available_Wh:float,
+        max_target_kWh_buffer:float,
+        max_kwh_usage_pr_hour:float,
+        controllable_loads:int,
+        remaining_minute:int,
+    ) -> int:
+        """ Returns seconds until next check based on headroom, loads to control and minutes left of the hour. """
+
+        if available_Wh < 0 or max_target_kWh_buffer < 0:
+            return self.min_interval
+
+        limit_Wh = max(max_kwh_usage_pr_hour * 1000, 1)
+        headroom = available_Wh / limit_Wh
+
+        if headroom < 0.1:
+            if remaining_minute <= 15:
+                return self.min_interval
+            return self.fast_interval
+
+        if headroom < 0.25 and remaining_minute <= 15:
+            return self.fast_interval
+
+        if (
+            controllable_loads == 0
+            and headroom > 0.5
+            and max_target_kWh_buffer > 1
+        ):
+            return self.max_interval
+
+        return self.normal_interval
+
+    def next_runtime(self, now, interval:int):
+        """ Returns next runtime. Never skips past the top of the hour so hourly reset runs on time. """
+
+        next_hour = now.replace(minute = 0, second = 0, microsecond = 0) + timedelta(hours = 1)
+        return min(now + timedelta(seconds = interval), next_hour)
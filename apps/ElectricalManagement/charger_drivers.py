@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from electrical_chargers import Charger
+
+
+class ChargerDriver:
+    """ Sends start, stop and ampere commands to the charger hardware.
+        Charger keeps the shared state and decides when to call the driver.
+
+        Capability flags:
+            settable_amps: Charging ampere can be set. Charger does not adjust ampere if False.
+            phase_switching: Active phases can change between sessions and are read when charging starts.
+            dynamic_circuit_limit: Charger limits current on the circuit itself and reports why current is limited.
+            requires_wake: Car must be woken to receive commands.
+            stop_when_idle: Stop is also sent when the charger is not charging, so a paused session does not resume.
+            unlink_on_no_power: Charger is in the car. NoPower when charging should start means the car is charging
+                from another charger, and the car is unlinked from this one.
+
+        Default driver uses charger_switch to start/stop and charging_amps number entity to set ampere. """
+
+    settable_amps:bool = True
+    phase_switching:bool = False
+    dynamic_circuit_limit:bool = False
+    requires_wake:bool = False
+    stop_when_idle:bool = False
+    unlink_on_no_power:bool = False
+
+    def __init__(self, charger: Charger):
+        self.charger = charger
+
+    @property
+    def ADapi(self):
+        return self.charger.ADapi
+
+    def start(self) -> None:
+        self.ADapi.call_service('switch/turn_on',
+            entity_id = self.charger.charger_data.charger_switch,
+            namespace = self.charger.namespace,
+        )
+
+    def stop(self) -> None:
+        self.ADapi.call_service('switch/turn_off',
+            entity_id = self.charger.charger_data.charger_switch,
+            namespace = self.charger.namespace,
+        )
+
+    def set_amps(self, amps:int) -> None:
+        self.charger.charger_data.ampereCharging = amps
+        self.ADapi.call_service('number/set_value',
+            value = amps,
+            entity_id = self.charger.charger_data.charging_amps,
+            namespace = self.charger.namespace
+        )
+
+
+class TeslaDriver(ChargerDriver):
+    """ Commands through Tesla custom integration api. Calls are async so waking the car does not block. """
+
+    phase_switching = True
+    requires_wake = True
+    unlink_on_no_power = True
+
+    def start(self) -> None:
+        self.ADapi.create_task(self._command('START_CHARGE', "Could not Start Charging"))
+
+    def stop(self) -> None:
+        self.ADapi.create_task(self._command('STOP_CHARGE', "Could not Stop Charging"))
+
+    async def _command(self, command:str, error:str) -> None:
+        charger = self.charger
+        if charger.connected_vehicle is None:
+            return
+        try:
+            await self.ADapi.call_service('tesla_custom/api',
+                namespace = charger.namespace,
+                command = command,
+                parameters = {'path_vars': {'vehicle_id': charger.charger_id}, 'wake_if_asleep': self.requires_wake}
+            )
+            await charger.connected_vehicle._force_API_update()
+        except Exception as e:
+            self.ADapi.log(f"{charger.charger} {error}. Exception: {e}", level = 'WARNING')
+
+    def set_amps(self, amps:int) -> None:
+        self.charger.charger_data.ampereCharging = amps
+        self.ADapi.call_service('tesla_custom/api',
+            namespace = self.charger.namespace,
+            command = 'CHARGING_AMPS',
+            parameters = {'path_vars': {'vehicle_id': self.charger.charger_id}, 'charging_amps': amps}
+        )
+
+
+class EaseeDriver(ChargerDriver):
+    """ Commands through Easee EV charger component. Ampere is set as dynamic charger limit,
+        and ampereCharging is updated from the charging_amps sensor. """
+
+    phase_switching = True
+    dynamic_circuit_limit = True
+    stop_when_idle = True
+
+    def start(self) -> None:
+        self._action('resume', "Could not Start Charging")
+
+    def stop(self) -> None:
+        self._action('pause', "Could not Stop Charging")
+
+    def _action(self, action_command:str, error:str) -> None:
+        try:
+            self.ADapi.call_service('easee/action_command',
+                namespace = self.charger.namespace,
+                action_command = action_command,
+                charger_id = self.charger.charger_id
+            )
+        except Exception as e:
+            self.ADapi.log(f"{self.charger.charger} {error}. Exception: {e}", level = 'WARNING')
+
+    def set_amps(self, amps:int) -> None:
+        ampereCharging = self.charger.charger_data.ampereCharging
+        # Charger reports up to one ampere below the dynamic limit
+        if ampereCharging != amps and ampereCharging != amps -1:
+            self.ADapi.call_service('easee/set_charger_dynamic_limit',
+                namespace = self.charger.namespace,
+                current = amps,
+                charger_id = self.charger.charger_id
+            )
+
+
+class AudiDriver(ChargerDriver):
+    """ Commands through Audi Connect integration. Does not support setting ampere. """
+
+    settable_amps = False
+    stop_when_idle = True
+    unlink_on_no_power = True
+
+    def start(self) -> None:
+        if self.charger.connected_vehicle is not None:
+            self._action('start_charger', "Could not Start Charging")
+
+    def stop(self) -> None:
+        self._action('stop_charger', "Could not Stop Charging")
+
+    def _action(self, action:str, error:str) -> None:
+        try:
+            self.ADapi.call_service('audiconnect/execute_vehicle_action',
+                namespace = self.charger.namespace,
+                vin = self.charger.charger_id,
+                action = action
+            )
+        except Exception as e:
+            self.ADapi.log(f"{self.charger.charger} {error}. Exception: {e}", level = 'WARNING')
+
+    def set_amps(self, amps:int) -> None:
+        pass
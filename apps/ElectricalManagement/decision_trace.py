@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+from api_proxy import ADAPIProxy
+
+NO_RULE = 'none' # Recorded when no rule fired
+
+
+@dataclass
+class DecisionRecord:
+    time: datetime
+    accumulated_kWh: float
+    projected_kWh_usage: float
+    available_Wh: float
+    max_target_kWh_buffer: float
+    rule: str
+    actions: List[str] = field(default_factory=list)
+    elapsed: float = 0.0 # Seconds
+
+
+@dataclass
+class RuleStats:
+    fired: int = 0
+    actions: int = 0
+    elapsed: float = 0.0
+    max_elapsed: float = 0.0
+
+
+class DecisionTrace:
+    """ Ring buffer with the last decisions made by the consumption control, and statistics pr rule.
+        Service calls made while a decision runs are recorded as its actions. """
+
+    def __init__(self, size:int = 500):
+        self.records: deque[DecisionRecord] = deque(maxlen = size)
+        self.stats: Dict[str, RuleStats] = {}
+        self._local = threading.local()
+
+    @contextmanager
+    def capture(self) -> Iterator[List[str]]:
+        """ Collects service calls made in this thread while the context is open """
+
+        actions: List[str] = []
+        self._local.actions = actions
+        try:
+            yield actions
+        finally:
+            self._local.actions = None
+
+    def record_call(self, service: str, kwargs: dict) -> None:
+        actions = getattr(self._local, 'actions', None)
+        if actions is not None:
+            actions.append(f"{service} {kwargs.get('entity_id', '')}".rstrip())
+
+    def add(self, record: DecisionRecord) -> None:
+        self.records.append(record)
+        stats = self.stats.get(record.rule)
+        if stats is None:
+            stats = self.stats[record.rule] = RuleStats()
+        stats.fired += 1
+        stats.actions += len(record.actions)
+        stats.elapsed += record.elapsed
+        if record.elapsed > stats.max_elapsed:
+            stats.max_elapsed = record.elapsed
+
+    def dump(self) -> dict:
+        return {
+            'stats': {
+                rule: {
+                    'fired': s.fired,
+                    'actions': s.actions,
+                    'avg_ms': round(s.elapsed / s.fired * 1000, 3) if s.fired else 0.0,
+                    'max_ms': round(s.max_elapsed * 1000, 3),
+                }
+                for rule, s in self.stats.items()
+            },
+            'records': [
+                {
+                    **{k: v for k, v in asdict(r).items() if k != 'elapsed'},
+                    'time': r.time.isoformat(),
+                    'elapsed_ms': round(r.elapsed * 1000, 3),
+                }
+                for r in list(self.records)
+            ],
+        }
+
+
+class TraceADAPI(ADAPIProxy):
+    """ Wraps the AppDaemon api so service calls are recorded in the decision trace """
+
+    def __init__(self, ADapi, trace: DecisionTrace):
+        super().__init__(ADapi)
+        self._trace = trace
+
+    def call_service(self, service: str, **kwargs):
+        self._trace.record_call(service, kwargs)
+        return self._ADapi.call_service(service, **kwargs)
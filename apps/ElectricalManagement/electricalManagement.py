@@ -7,10 +7,14 @@ from __future__ import annotations
 from appdaemon import adbase as ad
 
 import math
+import asyncio
 import json
 import os
+import shutil
 import importlib.util
 import copy
+import time
+import tracemalloc
 
 import bisect
 from datetime import timedelta
@@ -21,11 +25,12 @@ from pydantic_models import (
     PersistenceData,
     load_persistence,
     dump_persistence,
+    persistence_exists,
+    persistence_files,
     ChargerData,
     CarData,
     HeaterBlock,
     TempConsumption,
-    WattSlot,
     Decision,
 )
 from utils import (
@@ -39,7 +44,23 @@ from utils import (
     ModeTranslations
 )
 from registry import Registry
+from thread_safety import state_lock
+from async_loop import TickADAPI, entity_ids
+from profiling import ProfileCapture, ProfiledADAPI
+from memory_bounds import dedupe, prune_unknown, cap_consumption_buckets, memory_report
+from metrics import Metrics, MetricsADAPI
+from decision_trace import DecisionTrace, DecisionRecord, TraceADAPI, NO_RULE
+from app_logging import AppLogger, Lazy
+from notification_outbox import NotificationOutbox
 from scheduler import Scheduler
+from watt_slots import WattSlots
+from cadence import UsageCadence
+from energy_integrator import EnergyIntegrator
+from load_profile import LoadProfilePredictor, BaselineLoadModel
+from price_timeline import PriceTimeline
+from schedule_offload import ScheduleOffloader, AvailableWattSnapshot, build_available_watt
+from replanner import PlanReplanner
+from overconsumption import ReduceOption, cheapest_reduction
 from electrical_cars import Car, Tesla_car
 from electrical_chargers import Charger, Tesla_charger, Audi_charger, Easee, Onboard_charger
 from electrical_heater import Heater, Climate, On_off_switch
@@ -57,18 +78,6 @@ class ElectricalUsage(ad.ADBase):
 
         @Pythm / https://github.com/Pythm
     """
-    _instance = None
-
-    def __new__(cls, *args, **kwargs):
-        if not cls._instance:
-            cls._instance = super(ElectricalUsage, cls).__new__(cls)
-        return cls._instance
-
-    @classmethod
-    def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = ElectricalUsage()
-        return cls._instance
 
     def initialize(self):
         self._setup_api_and_translations()
@@ -82,12 +91,17 @@ class ElectricalUsage(ad.ADBase):
 
         self.json_path = self.args.get('json_path', None)
         if self.json_path is None:
-            self.json_path:str = f"{self.AD.config_dir}/persistent/electricity/"
-            if not os.path.exists(self.json_path):
-                os.makedirs(self.json_path)
-            self.json_path += 'electricalmanagement.json'
+            directory:str = f"{self.AD.config_dir}/persistent/electricity/"
+            self.json_path:str = os.path.join(directory, self.name, 'electricalmanagement.json')
+            os.makedirs(os.path.dirname(self.json_path), exist_ok = True)
+            self._migrate_legacy_persistence(
+                os.path.join(directory, 'electricalmanagement.json'),
+                inherit = self.args.get('inherit_legacy_persistence', False),
+            )
+        self.persistence_binary:bool = self.args.get('persistence_format', 'json') == 'binary'
 
         self._load_persistent_data()
+        self.available_watt = WattSlots.from_slots(self._persistence.available_watt)
 
         self.charging_scheduler = Scheduler(
             api = self.ADapi,
@@ -98,8 +112,11 @@ class ElectricalUsage(ad.ADBase):
             electricalPriceApp = self.electricalPriceApp,
             notify_app = self.notify_app,
             recipients = self.recipients,
+            price_timeline = self.price_timeline,
             chargingQueue = self._persistence.chargingQueue,
-            available_watt = self._persistence.available_watt,
+            available_watt = self.available_watt,
+            charging_order = self.args.get('charging_order', 'priority'),
+            lock = self.state_lock,
         )
 
         main_vacation_sensor = self._get_vacation_state()
@@ -261,6 +278,7 @@ class ElectricalUsage(ad.ADBase):
                 carName = carName,
                 car_data = self._persistence.car[carName],
                 charging_scheduler = self.charging_scheduler,
+                registry = self.registry,
             )
             self.cars[tesla_car.vehicle_id] = tesla_car
 
@@ -364,6 +382,7 @@ class ElectricalUsage(ad.ADBase):
                 vehicle_id = vehicle_id,
                 car_data = self._persistence.car[carName],
                 charging_scheduler = self.charging_scheduler,
+                registry = self.registry,
             )
             self.cars[audi_car.vehicle_id] = audi_car
 
@@ -461,6 +480,7 @@ class ElectricalUsage(ad.ADBase):
                 vehicle_id = cfg['carName'],
                 car_data = self._persistence.car[cfg['carName']],
                 charging_scheduler = self.charging_scheduler,
+                registry = self.registry,
             )
             self.cars[cfg['carName']] = car
 
@@ -561,9 +581,9 @@ class ElectricalUsage(ad.ADBase):
 
         for car in self.all_cars():
             if car.car_data.connected_charger_id:
-                charger = Registry.get_charger(car.car_data.connected_charger_id)
+                charger = self.registry.get_charger(car.car_data.connected_charger_id)
                 if charger is not None:
-                    Registry.set_link(car, charger)
+                    self.registry.set_link(car, charger)
             else:
                 self._connect_car_and_charger(car)
 
@@ -744,6 +764,7 @@ class ElectricalUsage(ad.ADBase):
                 charging_scheduler = self.charging_scheduler,
                 notify_app = self.notify_app,
                 print_save_hours = print_save_hours,
+                price_timeline = self.price_timeline,
             )
             self.heaters.append(climate)
             climate.out_temp = self._persistence.weather.out_temp
@@ -805,6 +826,7 @@ class ElectricalUsage(ad.ADBase):
                 charging_scheduler = self.charging_scheduler,
                 notify_app = self.notify_app,
                 print_save_hours = print_save_hours,
+                price_timeline = self.price_timeline,
             )
             self.heaters.append(switch)
 
@@ -812,15 +834,40 @@ class ElectricalUsage(ad.ADBase):
         for heater in self._persistence.heater.values():
             heater.sort_temperatures()
 
+        self._setup_profiling()
+        self._setup_memory_accounting()
+        self._setup_metrics()
+
         self.ADapi.run_in(self._create_runners, 60)
         self.ADapi.run_in(self._get_new_prices, 60)
 
 
     def _setup_api_and_translations(self):
         self.ADapi = self.get_ad_api()
+        # One lock and registry pr instance, so several instances can manage separate sites in one AppDaemon
+        self.state_lock = state_lock(self.args.get('thread_safe', False))
+        self.registry = Registry(self.state_lock)
+        # Layers that are turned off are left out, so calls do not pass through them
+        self.profiler = ProfileCapture(self.ADapi, calls = self.args.get('profile_calls', 100))
+        self.ADapi = ProfiledADAPI(self.ADapi, self.profiler)
+        self.metrics = Metrics(const_labels = (('app', self.name),))
+        self.metrics_file = self.args.get('metrics_file', None)
+        if self.metrics_file is not None:
+            self.ADapi = MetricsADAPI(self.ADapi, self.metrics)
+        self.async_control_loop:bool = self.args.get('async_control_loop', False)
+        if self.async_control_loop:
+            self.ADapi = TickADAPI(self.ADapi)
+        decision_trace_size:int = self.args.get('decision_trace_size', 500)
+        self.decision_trace = DecisionTrace(size = decision_trace_size)
+        if decision_trace_size > 0:
+            self.ADapi = TraceADAPI(self.ADapi, self.decision_trace)
+        self.applog = AppLogger(self.ADapi)
         self.HASS_namespace = self.args.get('main_namespace', 'default')
 
         self.ADapi.listen_event(self._notify_event, "mobile_app_notification_action", namespace=self.HASS_namespace)
+        self.ADapi.listen_event(self._preview_event, "ELECTRICAL_PREVIEW", namespace=self.HASS_namespace)
+        self.ADapi.register_endpoint(self._preview_endpoint, self.args.get('preview_endpoint', f"{self.name}_preview"))
+        self.ADapi.listen_event(self._decision_trace_event, "ELECTRICAL_DECISION_TRACE", namespace=self.HASS_namespace)
 
         global translations
         spec = importlib.util.find_spec('translations_lightmodes')
@@ -838,41 +885,217 @@ class ElectricalUsage(ad.ADBase):
         self.heaters: list = []
 
         self.heatersRedusedConsumption:list = []
+        self._decision_table: list[Decision] = self._build_decision_table()
         self.lastTimeHeaterWasReduced = self.ADapi.datetime(aware = True) - timedelta(minutes = 5)
 
         self.notify_overconsumption_when_away: bool = 'notify_overconsumption_also_when_away' in self.args.get('options')
         self.notify_overconsumption: bool = 'notify_overconsumption' in self.args.get('options') or self.notify_overconsumption_when_away
         self.pause_charging: bool = 'pause_charging' in self.args.get('options')
 
+        # Overconsumption resolver. 'joint' picks the cheapest set of heaters and chargers to reduce in one check
+        self.overconsumption_resolver:str = self.args.get('overconsumption_resolver', 'sequential')
+        self.reduce_cost_heater:float = self.args.get('reduce_cost_heater', 1.0)
+        self.reduce_cost_charging:float = self.args.get('reduce_cost_charging', 0.5)
+
         self.buffer = self.args.get('buffer', 0.4) + 0.01
         self.max_kwh_goal = self.args.get('max_kwh_goal', 15)
 
         # Variables for different calculations
-        self.accumulated_unavailable:int = 0
+        self.accumulated_unavailable:float = 0
         self.last_accumulated_kWh:float = 0
         self.accumulated_kWh_wasUnavailable:bool = False
         self.solar_producing_change_to_zero:bool = False
         self.notify_about_overconsumption:bool = False
         self.totalWattAllHeaters:float = 0
         self.houseIsOnFire:bool = False
-        self.find_next_charger_counter:int = 0
+        self.find_next_charger_counter:float = 0
         self.hour_to_add_to_high_consumption_hours = -1
+        self.current_consumption:float = 0.0
+        self.current_consumption_is_estimate:bool = False
+        self.predicted_consumption:float = 0.0
+        self.current_production:float = 0.0
+        self.available_Wh:float = 0.0
+        self.max_target_kWh_buffer:float = 0.0
+        self.projected_kWh_usage:float = 0.0
+
+        # Adaptive interval for checkElectricalUsage
+        self.usage_cadence = UsageCadence(
+            min_interval = self.args.get('check_interval_min', 10),
+            max_interval = self.args.get('check_interval_max', 300),
+        )
+        self.last_usage_check = None
+        self.elapsed_minutes:float = 1.0
+        self.last_hourly_reset = None
+
+        # React to large jumps in power between checks
+        self.reaction_power_step:float = self.args.get('reaction_power_step', 1500)
+        self.reaction_debounce:int = self.args.get('reaction_debounce', 5)
+        self.reaction_min_interval:int = self.args.get('reaction_min_interval', 30)
+        self.last_power_reaction = None
+
+        # Energy integrated from power sensors. Used when accumulated sensors are unavailable or stale
+        self.power_integrators: dict[str, EnergyIntegrator] = {
+            'consumption': EnergyIntegrator(),
+            'production': EnergyIntegrator(),
+        }
+        self.accumulated_kWh_error:float = 0.0
+        self.accumulated_kWh_from_integrator:bool = False
+
+        # Heavy scheduling computations runs on a snapshot away from the AppDaemon worker thread
+        self.schedule_offloader = ScheduleOffloader(self.ADapi, mode = self.args.get('schedule_offload', 'thread'), lock = self.state_lock)
 
         self.checkIdleConsumption_Handler = None
+        self.checkElectricalUsage_Handler = None
+        self.powerReaction_Handler = None
+
+    def _setup_profiling(self):
+        """ Profiling of consumption control, heaters, charging queue and state callbacks.
+            Started with profile_switch or the ELECTRICAL_PROFILE event, and stops after profile_calls callbacks. """
+
+        self.profiler.directory = os.path.dirname(self.json_path)
+        self.checkElectricalUsage = self.profiler.wrap(self.checkElectricalUsage)
+        self.charging_scheduler.process_charging_queue = self.profiler.wrap(self.charging_scheduler.process_charging_queue)
+
+        self.profile_switch = self.args.get('profile_switch', None)
+        if self.profile_switch is not None:
+            self.ADapi.listen_state(self._profile_switch_listen, self.profile_switch, namespace = self.HASS_namespace)
+            self.profiler.on_finished = self._turn_off_profile_switch
+        self.ADapi.listen_event(self._profile_event, "ELECTRICAL_PROFILE", namespace = self.HASS_namespace)
+
+    def _setup_metrics(self):
+        """ Control loop metrics in Prometheus text format, written to metrics_file for the node exporter textfile collector """
+
+        metrics = self.metrics
+        metrics.histogram('tick_duration_seconds', "Duration of consumption control checks")
+        metrics.histogram('scheduler_recompute_seconds', "Duration of charging queue planning")
+        metrics.counter('decisions_total', "Consumption control decisions fired pr rule")
+        if self.metrics_file is None:
+            return
+        self.checkElectricalUsage = metrics.timed('tick_duration_seconds', self.checkElectricalUsage)
+        self.charging_scheduler._plan_charging_queue = metrics.timed(
+            'scheduler_recompute_seconds', self.charging_scheduler._plan_charging_queue
+        )
+
+        metrics.gauge('available_wh', "Available Wh this hour at last check", lambda: self.available_Wh)
+        metrics.gauge('projected_kwh_usage', "Projected kWh usage for rest of hour at last check", lambda: self.projected_kWh_usage)
+        metrics.gauge('accumulated_kwh', "Accumulated kWh this hour at last check", lambda: self.accumulated_kWh)
+        metrics.gauge('max_target_kwh_buffer', "kWh below target at last check", lambda: self.max_target_kWh_buffer)
+        metrics.gauge('queue_length', "Length of charging and reduced heater queues", lambda: (
+            ((('queue', 'chargingQueue'),), len(self.charging_scheduler.chargingQueue)),
+            ((('queue', 'queueChargingList'),), len(self._persistence.queueChargingList)),
+            ((('queue', 'solarChargingList'),), len(self._persistence.solarChargingList)),
+            ((('queue', 'heatersRedusedConsumption'),), len(self.heatersRedusedConsumption)),
+        ))
+        metrics.gauge('charger_ampere', "Ampere set on charger", lambda: [
+            ((('charger', charger.charger),), charger.charger_data.ampereCharging)
+            for charger in self.all_chargers()
+        ])
+
+        self.ADapi.run_every(self._write_metrics, "now", self.args.get('metrics_interval', 60))
+
+    def _write_metrics(self, kwargs) -> None:
+        try:
+            self.metrics.write(self.metrics_file)
+        except OSError as e:
+            self.ADapi.log(f"Not able to write metrics to {self.metrics_file}: {e}", level = 'WARNING')
+
+    def _setup_memory_accounting(self):
+        self.max_heater_consumption_buckets:int = self.args.get('max_heater_consumption_buckets', 24)
+        self._started_tracemalloc:bool = False
+        if self.args.get('memory_tracemalloc', False) and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self.ADapi.listen_event(self._memory_report_event, "ELECTRICAL_MEMORY_REPORT", namespace = self.HASS_namespace)
+
+    def _memory_structures(self) -> Dict[str, Any]:
+        structures: Dict[str, Any] = {
+            'chargingQueue': self.charging_scheduler.chargingQueue,
+            'queueChargingList': self._persistence.queueChargingList,
+            'solarChargingList': self._persistence.solarChargingList,
+            'heatersRedusedConsumption': [heater.heater for heater in self.heatersRedusedConsumption],
+            'high_consumption_hours': self._persistence.high_consumption.high_consumption_hours,
+            'idle_usage': self._persistence.idle_usage.ConsumptionData,
+            'load_profile': self._persistence.load_profile,
+            'baseline_profile': self._persistence.baseline_profile,
+            'available_watt': (self.available_watt.start, self.available_watt.end,
+                               self.available_watt.available_Wh, self.available_watt.duration_hours),
+        }
+        for heater in self.heaters:
+            structures[f"{heater.heater} ConsumptionData"] = heater.heater_data.ConsumptionData
+        return structures
+
+    def _addressed_to_me(self, data) -> bool:
+        """ Events without 'app' in data are handled by all instances """
+
+        return data.get('app', self.name) == self.name
+
+    def _memory_report_event(self, event_name, data, **kwargs) -> None:
+        """ Logs size of learned tables and lists, and writes the report to the persistence directory """
+
+        if not self._addressed_to_me(data):
+            return
+        report = memory_report(self._memory_structures(), path_filter = os.path.dirname(os.path.abspath(__file__)))
+        self.ADapi.log(report, level = 'INFO')
+        with open(os.path.join(os.path.dirname(self.json_path), 'memory_report.txt'), 'w', encoding = 'utf-8') as f:
+            f.write(report)
+
+    def _enforce_memory_bounds(self, kwargs) -> None:
+        """ Removes duplicates and stale ids from lists, and caps learned heater consumption buckets """
+
+        known_vehicles = self.cars.keys()
+        removed = dedupe(self._persistence.high_consumption.high_consumption_hours)
+        removed += dedupe(self.heatersRedusedConsumption)
+        removed += prune_unknown(self.heatersRedusedConsumption, self.heaters)
+        for charging_list in (self._persistence.queueChargingList, self._persistence.solarChargingList):
+            removed += dedupe(charging_list)
+            removed += prune_unknown(charging_list, known_vehicles)
+        for item in list(self.charging_scheduler.chargingQueue):
+            if item.vehicle_id not in known_vehicles:
+                self.charging_scheduler.removeFromQueue(item.vehicle_id)
+                removed += 1
+        for heater in self.heaters:
+            removed += cap_consumption_buckets(heater.heater_data.ConsumptionData, self.max_heater_consumption_buckets)
+        if removed:
+            self.applog.debug("Removed %s duplicate, stale or least sampled entries", removed)
+
+    def _profile_switch_listen(self, entity, attribute, old, new, kwargs) -> None:
+        if new == 'on':
+            self.profiler.start()
+        elif new == 'off':
+            self.profiler.stop()
+
+    def _profile_event(self, event_name, data, **kwargs) -> None:
+        if not self._addressed_to_me(data):
+            return
+        calls = data.get('calls')
+        self.profiler.start(calls = int(calls) if calls else None)
+
+    def _turn_off_profile_switch(self) -> None:
+        if self.ADapi.get_state(self.profile_switch, namespace = self.HASS_namespace) == 'on':
+            self.ADapi.call_service('input_boolean/turn_off',
+                entity_id = self.profile_switch,
+                namespace = self.HASS_namespace,
+            )
 
     def _setup_notify_app(self):
         name_of_notify_app = self.args.get('notify_app', None)
         self.recipients = self.args.get('notify_receiver', [])
         if name_of_notify_app is not None:
-            self.notify_app = self.ADapi.get_app(name_of_notify_app)
+            notify_app = self.ADapi.get_app(name_of_notify_app)
         else:
-            self.notify_app = Notify_Mobiles(self.ADapi, self.HASS_namespace)
+            notify_app = Notify_Mobiles(self.ADapi, self.HASS_namespace)
+        self.notify_app = NotificationOutbox(self.ADapi, notify_app,
+            coalesce_seconds = self.args.get('notify_coalesce_seconds', 10),
+            retries = self.args.get('notify_retries', 3),
+        )
         
         self.home_name = self.args.get('home_name', 'home')
 
     def _setup_electricity_price(self):
         if 'electricalPriceApp' in self.args:
             self.electricalPriceApp = self.ADapi.get_app(self.args['electricalPriceApp'])
+            self.price_timeline = PriceTimeline.shared(self.electricalPriceApp)
+            self.price_timeline.refresh()
         else:
             raise Exception(
                 "\nFrom version 1.0.0 the electrical price calculations have been moved to it's own repository.\n"
@@ -914,12 +1137,42 @@ class ElectricalUsage(ad.ADBase):
         self.current_production_sensor = self.args.get('power_production', None)  # Watt
         self.accumulated_production_current_hour = self.args.get('accumulated_production_current_hour', None)  # kWh
 
+    def _migrate_legacy_persistence(self, legacy_path:str, inherit:bool) -> None:
+        """ Copies persistence from the shared file used before one file pr app instance.
+            Only the instance configured with inherit_legacy_persistence takes over the data. """
+
+        if persistence_exists(self.json_path) or not persistence_exists(legacy_path):
+            return
+        if not inherit:
+            self.ADapi.log(
+                f"Found persistent data from before one file pr app instance in {legacy_path}. "
+                "Set inherit_legacy_persistence: true on the instance that should keep it.",
+                level = 'INFO'
+            )
+            return
+        for src, dst in zip(persistence_files(legacy_path), persistence_files(self.json_path)):
+            if os.path.exists(src):
+                shutil.copy2(src, dst)
+        self.ADapi.log(f"Copied persistent data from {legacy_path} to {self.json_path}", level = 'INFO')
+
     def _load_persistent_data(self):
-        self._persistence: PersistenceData = load_persistence(self.json_path)
+        self._persistence: PersistenceData = load_persistence(
+            self.json_path,
+            binary = self.persistence_binary,
+            warn = lambda message: self.ADapi.log(message, level = 'WARNING'),
+        )
 
         if self._persistence.max_usage.max_kwh_usage_pr_hour == 0:
             self._persistence.max_usage.max_kwh_usage_pr_hour = self.max_kwh_goal
 
+        self.load_profile = LoadProfilePredictor(
+            profile = self._persistence.load_profile,
+            alpha = self.args.get('load_profile_alpha', 0.1),
+        )
+        self.baseline_model = BaselineLoadModel(
+            profile = self._persistence.baseline_profile,
+        )
+
     def _get_vacation_state(self) -> str:
         main_vacation_sensor = self.args.get('away_state') or self.args.get('vacation')
         if not main_vacation_sensor and self.ADapi.entity_exists('input_boolean.vacation', namespace = self.HASS_namespace):
@@ -942,42 +1195,79 @@ class ElectricalUsage(ad.ADBase):
         
         if self.current_consumption_sensor is not None and self.accumulated_consumption_current_hour is not None:
             runtime = get_next_runtime_aware(startTime = now, offset_seconds = 0, delta_in_seconds = 60)
-            self.ADapi.run_every(self.checkElectricalUsage, runtime, 60)
+            self.checkElectricalUsage_Handler = self.ADapi.run_at(self._usage_check_callback(), runtime)
+
+            self.power_integrators['consumption'].add_sample(now, self.current_consumption)
+            self.ADapi.listen_state(self._power_changed, self.current_consumption_sensor,
+                power = 'consumption'
+            )
+            if self.current_production_sensor is not None:
+                self.power_integrators['production'].add_sample(now, self._get_sensor_value(self.current_production_sensor))
+                self.ADapi.listen_state(self._power_changed, self.current_production_sensor,
+                    power = 'production'
+                )
         else:
             self.available_Wh = 10000 # Set a trick fixed value since sensors are missing.
             runtime = get_next_runtime_aware(startTime = now, offset_seconds = 0, delta_in_seconds = 600)
             self.ADapi.run_every(self.checkChargingQueue, runtime, 600)
 
+        self._enforce_memory_bounds(0)
+        self.ADapi.run_daily(self._enforce_memory_bounds, "14:25:00")
         self.ADapi.run_daily(self.dump_persistence_file, "14:30:00")
         self.ADapi.run_daily(self._get_new_prices, "00:03:00")
         self.ADapi.run_daily(self._get_new_prices, "13:01:00")
 
+        # Receding horizon replanning of charging queue and heater save windows
+        replan_interval = self.args.get('replan_interval', 0) # Minutes. 0 is off
+        if replan_interval:
+            self.replanner = PlanReplanner(
+                api = self.ADapi,
+                scheduler = self.charging_scheduler,
+                heaters = self.heaters,
+                offloader = self.schedule_offloader,
+                registry = self.registry,
+                time_budget = self.args.get('replan_time_budget', 10),
+            )
+            runtime = get_next_runtime_aware(startTime = now, offset_seconds = 30, delta_in_seconds = replan_interval * 60)
+            self.ADapi.run_every(self.replanner.replan, runtime, replan_interval * 60)
 
-        item = self.electricalPriceApp.elpricestoday[0]
-        duration = (item.end - item.start).total_seconds()
+        duration = self.price_timeline.slot_duration_seconds()
         runtime_switch = get_next_runtime_aware(startTime = now, offset_seconds = 1, delta_in_seconds = duration)
         interval = min(duration, 900)
         runtime_climate = get_next_runtime_aware(startTime = now, offset_seconds = 1, delta_in_seconds = interval)
 
         for heater in self.heaters:
+            # Heaters are slotted, so the profiled callback is registered instead of replacing the method
             if isinstance(heater, Climate):
-                self.ADapi.run_every(heater.heater_setNewValues, runtime_climate, interval)
+                self.ADapi.run_every(self.profiler.wrap(heater.heater_setNewValues), runtime_climate, interval)
             else:
-                self.ADapi.run_every(heater.heater_setNewValues, runtime_switch, duration)
+                self.ADapi.run_every(self.profiler.wrap(heater.heater_setNewValues), runtime_switch, duration)
 
     # Finished initialization.
 
     def terminate(self) -> None:
         """ Writes charger and car data to persisten storage before terminating app """
 
+        if hasattr(self, "schedule_offloader"):
+            self.schedule_offloader.shutdown()
+        if getattr(self, "_started_tracemalloc", False):
+            tracemalloc.stop()
         if hasattr(self, "_persistence"):
-            dump_persistence(self.json_path, self._persistence)
+            self._dump_persistence()
 
     def dump_persistence_file(self, kwargs) -> None:
         """ Writes charger and car data to persisten storage daily """
 
         if hasattr(self, "_persistence"):
-            dump_persistence(self.json_path, self._persistence)
+            self._dump_persistence()
+
+    def _dump_persistence(self) -> None:
+        """ Converts runtime stores to persistence models and writes persistence """
+
+        with self.state_lock:
+            if hasattr(self, "available_watt"):
+                self._persistence.available_watt = self.available_watt.to_slots()
+            dump_persistence(self.json_path, self._persistence, binary = self.persistence_binary)
 
     def all_cars(self) -> Iterable[Car]:
         """ Returns iterable car list """
@@ -1023,14 +1313,14 @@ class ElectricalUsage(ad.ADBase):
 
             elif ChargingState != 'Disconnected':
                 if car.onboard_charger is not None:
-                    Registry.set_link(car, car.onboard_charger)
+                    self.registry.set_link(car, car.onboard_charger)
                 else:
                     for charger in self.all_chargers():
                         if (
                             charger.connected_vehicle is None
                             and charger._guest_car == car
                         ):
-                            Registry.set_link(car, charger)
+                            self.registry.set_link(car, charger)
 
     def _get_new_prices(self, kwargs) -> None:
         """ Fetches new prices and finds charge time """
@@ -1042,6 +1332,8 @@ class ElectricalUsage(ad.ADBase):
             self.ADapi.run_in(self._get_new_prices, 600)
             return # Wait until prices tomorrow is valid
 
+        self.price_timeline.refresh()
+
         for heater in self.heaters:
             if (
                 self.electricalPriceApp.tomorrow_valid # if tomorrows prices are found
@@ -1081,23 +1373,179 @@ class ElectricalUsage(ad.ADBase):
 
     def checkElectricalUsage(self, kwargs) -> None:
         """ Calculate and ajust consumption to stay within kWh limit.
-            Start and stops charging when time to charge """
+            Start and stops charging when time to charge.
+            Reschedules itself with an interval based on headroom left this hour """
+
+        try:
+            self._check_electrical_usage()
+        finally:
+            self._schedule_next_usage_check()
+
+    async def checkElectricalUsage_async(self, kwargs) -> None:
+        """ Async variant of checkElectricalUsage, used with async_control_loop.
+            Reads all sensors concurrently, runs the check in an executor thread against those states,
+            and awaits the service calls from the check concurrently. """
+
+        states = await self._read_states_concurrently()
+        calls = await self.ADapi.run_in_executor(self._run_usage_check_tick, states)
+        if not calls:
+            return
+        results = await asyncio.gather(
+            *(self.ADapi.call_service(service, **data) for service, data in calls),
+            return_exceptions = True
+        )
+        for (service, data), result in zip(calls, results):
+            if isinstance(result, Exception):
+                self.ADapi.log(
+                    f"Service call {service} for {data.get('entity_id')} failed: {result}",
+                    level = 'WARNING'
+                )
+
+    def _usage_check_callback(self):
+        if self.async_control_loop:
+            return self.checkElectricalUsage_async
+        return self.checkElectricalUsage
+
+    def _run_usage_check_tick(self, states: dict) -> list:
+        """ Runs checkElectricalUsage with states read in advance, and returns the service calls it made. """
+
+        with self.state_lock:
+            self.ADapi.begin_tick(states)
+            try:
+                self.checkElectricalUsage(0)
+            finally:
+                calls = self.ADapi.end_tick()
+        return calls
+
+    def _state_keys_for_tick(self) -> list:
+        """ Returns (namespace, entity_id) for all sensors the consumption check might read """
+
+        keys = {
+            (None, sensor) for sensor in (
+                self.current_consumption_sensor,
+                self.accumulated_consumption_current_hour,
+                self.current_production_sensor,
+                self.accumulated_production_current_hour,
+            ) if sensor
+        }
+        for car in self.cars.values():
+            keys.update((car.namespace, entity_id) for entity_id in entity_ids(car.car_data))
+        for charger in self.chargers.values():
+            keys.update((charger.namespace, entity_id) for entity_id in entity_ids(charger.charger_data))
+        for heater in self.heaters:
+            keys.update((heater.namespace, entity_id) for entity_id in entity_ids(heater.heater_data))
+        return list(keys)
+
+    async def _read_states_concurrently(self) -> dict:
+        keys = self._state_keys_for_tick()
+        results = await asyncio.gather(
+            *(
+                self.ADapi.get_state(entity_id, attribute = 'all', namespace = namespace)
+                if namespace is not None else
+                self.ADapi.get_state(entity_id, attribute = 'all')
+                for namespace, entity_id in keys
+            ),
+            return_exceptions = True
+        )
+        return {
+            key: result
+            for key, result in zip(keys, results)
+            if not isinstance(result, Exception)
+        }
+
+    def _power_changed(self, entity, attribute, old, new, kwargs) -> None:
+        """ Integrates power into energy for this hour, and reacts to power consumption or production
+            jumping more than reaction_power_step since last check, instead of waiting for the next scheduled check """
+
+        try:
+            new_power = float(new)
+        except (ValueError, TypeError):
+            return
+
+        power = kwargs['power']
+        self.power_integrators[power].add_sample(self.ADapi.datetime(aware = True), new_power)
+
+        if abs(new_power - getattr(self, f"current_{power}")) < self.reaction_power_step:
+            return
+        if (
+            self.powerReaction_Handler is not None
+            and self.ADapi.timer_running(self.powerReaction_Handler)
+        ):
+            return # Already waiting to react
+
+        delay = self.reaction_debounce
+        if self.last_power_reaction is not None:
+            since_last = (self.ADapi.datetime(aware = True) - self.last_power_reaction).total_seconds()
+            delay = max(delay, self.reaction_min_interval - since_last)
+        self.powerReaction_Handler = self.ADapi.run_in(self._react_to_power_change, delay)
+
+    def _react_to_power_change(self, kwargs) -> None:
+        self.powerReaction_Handler = None
+        self.last_power_reaction = self.ADapi.datetime(aware = True)
+        self.checkElectricalUsage(0)
+
+    def _schedule_next_usage_check(self) -> None:
+        now = self.ADapi.datetime(aware = True)
+        interval = self.usage_cadence.next_interval(
+            available_Wh = self.available_Wh,
+            max_target_kWh_buffer = self.max_target_kWh_buffer,
+            max_kwh_usage_pr_hour = self._persistence.max_usage.max_kwh_usage_pr_hour,
+            controllable_loads = self._count_controllable_loads(),
+            remaining_minute = 60 - now.minute,
+        )
+        cancel_timer_handler(ADapi = self.ADapi, handler = self.checkElectricalUsage_Handler, name = "checkElectricalUsage")
+        self.checkElectricalUsage_Handler = self.ADapi.run_at(self._usage_check_callback(),
+            self.usage_cadence.next_runtime(now, interval)
+        )
+
+    def _count_controllable_loads(self) -> int:
+        """ Number of loads that currently can be adjusted by the app """
+
+        return (
+            len(self.charging_scheduler.chargingQueue)
+            + len(self._persistence.queueChargingList)
+            + len(self._persistence.solarChargingList)
+            + len(self.heatersRedusedConsumption)
+        )
+
+    def _minutes_since_last_check(self, now) -> float:
+        """ Minutes since previous check. Used to scale estimates now that interval varies """
 
+        if self.last_usage_check is None:
+            return 1.0
+        return min(max((now - self.last_usage_check).total_seconds() / 60, 0.0), 60.0)
+
+    def _check_electrical_usage(self) -> None:
         now = self.ADapi.datetime(aware = True)
         minute = now.minute
         remaining_minute = 60 - minute
+        self.elapsed_minutes = self._minutes_since_last_check(now)
+        self.last_usage_check = now
 
         self._get_current_consumption()
         self._get_accumulated_kWh()
 
+        charging_watt = self._get_charging_watt()
+        if not self.current_consumption_is_estimate:
+            self.load_profile.update(now, self.current_consumption - charging_watt)
+            self.baseline_model.update(now,
+                out_temp = self._persistence.weather.out_temp,
+                base_watt = self.current_consumption - charging_watt,
+                minutes = self.elapsed_minutes
+            )
+
         if minute == 0:
-            self._reset_hourly(now)
+            this_hour = now.replace(minute = 0, second = 0, microsecond = 0)
+            if self.last_hourly_reset != this_hour:
+                self.last_hourly_reset = this_hour
+                self._reset_hourly(now)
             return
 
         self.current_production = self._get_sensor_value(self.current_production_sensor)
-        self.production_kWh = self._get_sensor_value(self.accumulated_production_current_hour)
+        self.production_kWh = self._get_production_kWh(now)
 
         self.max_target_kWh_buffer = self._calc_max_target_kWh_buffer(now)
+        self.predicted_consumption = self._calc_predicted_consumption(now, charging_watt)
         self.projected_kWh_usage = self._calc_projected_kWh_usage(now)
         self.available_Wh = self._calc_available_Wh(now)
 
@@ -1141,10 +1589,35 @@ class ElectricalUsage(ad.ADBase):
         )
 
     def _dispatch_decision(self) -> None:
-        for dec in self._build_decision_table():
-            if dec.predicate():
-                dec.action()
-                break
+        start = time.perf_counter()
+        record = DecisionRecord(
+            time = self.last_usage_check,
+            accumulated_kWh = self.accumulated_kWh,
+            projected_kWh_usage = self.projected_kWh_usage,
+            available_Wh = self.available_Wh,
+            max_target_kWh_buffer = self.max_target_kWh_buffer,
+            rule = NO_RULE,
+        )
+        with self.decision_trace.capture() as actions:
+            for dec in self._decision_table:
+                if dec.predicate():
+                    record.rule = dec.name
+                    self.metrics.inc('decisions_total', (('decision', dec.name),))
+                    dec.action()
+                    break
+        record.actions = actions
+        record.elapsed = time.perf_counter() - start
+        self.decision_trace.add(record)
+
+    def _decision_trace_event(self, event_name, data, **kwargs) -> None:
+        """ Writes the last decisions and statistics pr rule to decision_trace.json in the persistence directory """
+
+        if not self._addressed_to_me(data):
+            return
+        trace = self.decision_trace.dump()
+        with open(os.path.join(os.path.dirname(self.json_path), 'decision_trace.json'), 'w', encoding = 'utf-8') as f:
+            json.dump(trace, f, indent = 2)
+        self.ADapi.log(f"Decision statistics: {trace['stats']}", level = 'INFO')
 
     def _build_decision_table(self) -> list[Decision]:
         return [
@@ -1171,19 +1644,24 @@ class ElectricalUsage(ad.ADBase):
             if self.max_target_kWh_buffer > -0.5 and minute < 6:
                 return
 
-        if self._update_ChargingQueue(charging_list = self._persistence.queueChargingList):
-            reduce_Wh, self.available_Wh = self._get_heaters_reduced_previous_consumption(avail = self.available_Wh)
+        if self.overconsumption_resolver == 'joint':
+            self._update_ChargingQueue(charging_list = self._persistence.queueChargingList)
+            if self._resolve_overconsumption_jointly():
+                return
+        else:
+            if self._update_ChargingQueue(charging_list = self._persistence.queueChargingList):
+                reduce_Wh, self.available_Wh = self._get_heaters_reduced_previous_consumption(avail = self.available_Wh)
 
-            if reduce_Wh + self.available_Wh < 0:
-                reduce_Wh, self.available_Wh = self._reduce_charging_ampere(reduce_Wh = reduce_Wh,
-                                                                            available_Wh = self.available_Wh,
-                                                                            charging_list = self._persistence.queueChargingList)
+                if reduce_Wh + self.available_Wh < 0:
+                    reduce_Wh, self.available_Wh = self._reduce_charging_ampere(reduce_Wh = reduce_Wh,
+                                                                                available_Wh = self.available_Wh,
+                                                                                charging_list = self._persistence.queueChargingList)
 
-        if reduce_Wh + self.available_Wh > 0:
-            return
+            if reduce_Wh + self.available_Wh > 0:
+                return
 
-        if minute > 7 or not self._persistence.queueChargingList:
-            self._reduce_heating()
+            if minute > 7 or not self._persistence.queueChargingList:
+                self._reduce_heating()
 
         if (
             (self._persistence.max_usage.max_kwh_usage_pr_hour
@@ -1205,6 +1683,98 @@ class ElectricalUsage(ad.ADBase):
                     self._notify_overconsumption(hour = now.hour)
 
 
+    def _reduce_options(self) -> List[ReduceOption]:
+        """ Returns all heaters that can be turned down and chargers that can reduce ampere, with cost pr kW.
+            Heaters are only offered when the consumption is known to come from heating, as in _reduce_heating """
+
+        options: List[ReduceOption] = []
+        for heater in self.heaters:
+            if heater in self.heatersRedusedConsumption:
+                continue
+            heater_consumption_now, valid_consumption = heater.get_heater_consumption()
+            if (
+                heater_consumption_now > 100
+                and (
+                    valid_consumption
+                    or self.ADapi.get_state(heater.heater,
+                        attribute = 'hvac_action',
+                        namespace = heater.namespace
+                    ) == 'heating'
+                )
+            ):
+                options.append(ReduceOption(
+                    target = heater,
+                    watt = heater_consumption_now,
+                    cost = self.reduce_cost_heater,
+                ))
+
+        for queue_id in self._persistence.queueChargingList:
+            car = self.registry.get_car(queue_id)
+            if car is None or car.connected_charger is None or not car.connected_charger.driver.settable_amps:
+                continue
+            charger_data = car.connected_charger.charger_data
+            ampere_charging = charger_data.ampereCharging
+            if ampere_charging == 0:
+                ampere_charging = car.connected_charger.update_ampere_charging_from_sensor()
+            if ampere_charging <= charger_data.min_ampere:
+                continue
+            # Cars with high priority (low number) cost more to slow down
+            priority = min(max(car.car_data.priority, 1), 5)
+            options.append(ReduceOption(
+                target = car,
+                watt = (ampere_charging - charger_data.min_ampere) * charger_data.voltPhase,
+                cost = self.reduce_cost_charging * (6 - priority) / 5,
+                divisible = True,
+                step_watt = charger_data.voltPhase,
+            ))
+        return options
+
+    def _resolve_overconsumption_jointly(self) -> bool:
+        """ Reduces the cheapest combination of heaters and chargers that covers the deficit, all in this check.
+            Returns True if consumption is back within the limit """
+
+        deficit = -self.available_Wh
+        if deficit <= 0:
+            return True
+
+        chosen = cheapest_reduction(deficit, self._reduce_options())
+        if not chosen:
+            return False
+
+        # Chargers can be reduced in steps. Give back what is not needed, starting with the most expensive
+        surplus = sum(option.watt for option in chosen) - deficit
+        reduce_watt = {id(option): option.watt for option in chosen}
+        for option in sorted(chosen, key=lambda o: o.cost, reverse=True):
+            if surplus <= 0:
+                break
+            if option.divisible:
+                give_back = math.floor(min(surplus, option.watt - option.step_watt) / option.step_watt) * option.step_watt
+                if give_back > 0:
+                    reduce_watt[id(option)] -= give_back
+                    surplus -= give_back
+
+        now = self.ADapi.datetime(aware = True)
+        for option in chosen:
+            watt = reduce_watt[id(option)]
+            if option.divisible:
+                car = option.target
+                charger = car.connected_charger
+                amps = math.ceil(watt / option.step_watt)
+                charger.setChargingAmps(charging_amp_set = charger.charger_data.ampereCharging - amps)
+                self.available_Wh += amps * option.step_watt
+            else:
+                heater = option.target
+                self.heatersRedusedConsumption.append(heater)
+                self.lastTimeHeaterWasReduced = now
+                heater.last_reduced_state = now
+                heater.heater_data.prev_consumption = watt
+                heater.setSaveState()
+                self.available_Wh += watt
+                if watt > heater.heater_data.normal_power:
+                    heater.heater_data.normal_power = watt
+
+        return self.available_Wh > -100
+
     def _act_heaters_reduced(self) -> None:
         """ Reduce charging speed to turn heaters back on """
 
@@ -1296,7 +1866,7 @@ class ElectricalUsage(ad.ADBase):
             # production is to low -> stop and reset.
             to_remove = set()
             for queue_id in reversed(self._persistence.solarChargingList):
-                car = Registry.get_car(queue_id)
+                car = self.registry.get_car(queue_id)
                 if car is None or car.connected_charger is None:
                     continue
 
@@ -1348,7 +1918,7 @@ class ElectricalUsage(ad.ADBase):
         next_vehicle_id = False
         to_remove = set()
         for queue_id in charging_list:
-            car = Registry.get_car(queue_id)
+            car = self.registry.get_car(queue_id)
             if car is None:
                 continue
 
@@ -1426,7 +1996,7 @@ class ElectricalUsage(ad.ADBase):
                                 charger.connected_vehicle is None
                                 and charger.getChargingState() in ('Stopped', 'awaiting_start')
                             ):
-                                Registry.unlink(car)
+                                self.registry.unlink(car)
                                 charger.findCarConnectedToCharger()
 
             elif not car.isConnected():
@@ -1436,21 +2006,21 @@ class ElectricalUsage(ad.ADBase):
 
             else:
                 if car.onboard_charger is not None:
-                    Registry.set_link(car, car.onboard_charger)
+                    self.registry.set_link(car, car.onboard_charger)
                 else:
                     for charger in self.all_chargers():
                         if (
                             charger.connected_vehicle is None
                             and charger._guest_car == car
                         ):
-                            Registry.set_link(car, charger)
+                            self.registry.set_link(car, charger)
 
         charging_list[:] = [
             qid for qid in charging_list
             if qid not in to_remove
         ]
 
-        self.find_next_charger_counter += 1
+        self.find_next_charger_counter += self.elapsed_minutes
         if next_vehicle_id or self.find_next_charger_counter > 5 and not charging_list:
             self._update_ChargingQueue(charging_list = charging_list)
             self.find_next_charger_counter = 0
@@ -1469,7 +2039,9 @@ class ElectricalUsage(ad.ADBase):
     def _get_current_consumption(self) -> None:
         try:
             self.current_consumption = float(self.ADapi.get_state(self.current_consumption_sensor))
+            self.current_consumption_is_estimate = False
         except (TypeError, ValueError):
+            self.current_consumption_is_estimate = True
             self.current_consumption, heater_consumption = self.get_idle_and_heater_consumption()
             if self.current_consumption is None:
                 self.current_consumption = 2000.0
@@ -1487,11 +2059,36 @@ class ElectricalUsage(ad.ADBase):
                     try:
                         self.current_consumption += car.connected_charger.charger_data.ampereCharging * car.connected_charger.charger_data.voltPhase
                     except (TypeError, ValueError):
-                        self.ADapi.log(
-                            f"Not able to get charging info when current consumption is unavailable from {type(car.connected_charger).__name__}",
-                            level = 'WARNING'
+                        self.applog.warning_limited('charging_info_unavailable',
+                            "Not able to get charging info when current consumption is unavailable from %s",
+                            type(car.connected_charger).__name__
                         )
 
+    def _get_integrated_kWh(self, power:str, now) -> Optional[float]:
+        """ Returns kWh integrated from power sensor this hour, or ``None`` if it does not cover the hour
+            or the error bound is too large to trust """
+
+        integrator = self.power_integrators[power]
+        integrator.advance(now)
+        if not integrator.covers_hour(now):
+            return None
+        integrated_kWh, error_kWh = integrator.kWh()
+        if error_kWh > max(abs(integrated_kWh) * 0.1, 0.1):
+            return None
+        if power == 'consumption':
+            self.accumulated_kWh_error = error_kWh
+        return integrated_kWh
+
+    def _get_production_kWh(self, now) -> float:
+        if self.accumulated_production_current_hour is not None:
+            if self.ADapi.get_state(self.accumulated_production_current_hour) not in UNAVAIL:
+                return self._get_sensor_value(self.accumulated_production_current_hour)
+        if self.current_production_sensor is not None:
+            integrated_kWh = self._get_integrated_kWh('production', now)
+            if integrated_kWh is not None:
+                return integrated_kWh
+        return 0.0
+
     def _get_accumulated_kWh(self) -> None:
         now = self.ADapi.datetime(aware = True)
         minute = now.minute
@@ -1503,24 +2100,39 @@ class ElectricalUsage(ad.ADBase):
                 self.accumulated_unavailable = 0
                 self.ADapi.create_task(self._reload_accumulated_consumption_sensor())
             else:
-                self.accumulated_unavailable += 1
+                self.accumulated_unavailable += self.elapsed_minutes
 
-            self.accumulated_kWh = float(self.last_accumulated_kWh + (self.current_consumption/60000))
+            integrated_kWh = self._get_integrated_kWh('consumption', now)
+            self.accumulated_kWh_from_integrator = integrated_kWh is not None
+            if self.accumulated_kWh_from_integrator:
+                self.accumulated_kWh = integrated_kWh
+            else:
+                self.accumulated_kWh = float(self.last_accumulated_kWh + (self.current_consumption/60000) * self.elapsed_minutes)
             self.last_accumulated_kWh = self.accumulated_kWh
             self.accumulated_kWh_wasUnavailable = True
         else:
             if self.accumulated_kWh_wasUnavailable:
                 self.accumulated_kWh_wasUnavailable = False
 
-                if self.last_accumulated_kWh + (self.current_consumption/60000) < self.accumulated_kWh:
-                    error_ratio = self.accumulated_kWh / (self.last_accumulated_kWh + (self.current_consumption/60000))
+                estimated_kWh = self.last_accumulated_kWh + (self.current_consumption/60000) * self.elapsed_minutes
+                used_integrator = self.accumulated_kWh_from_integrator
+                self.accumulated_kWh_from_integrator = False
+                if used_integrator:
+                    # Estimate was measured, not based on idle consumption. No need to correct error ratio.
+                    self.applog.debug(
+                        "Accumulated kWh was unavailable. Integrated from power: %s ± %.2f. Actual: %s",
+                        Lazy(lambda: round(self.power_integrators['consumption'].kWh()[0], 2)),
+                        self.accumulated_kWh_error, self.accumulated_kWh
+                    )
+                elif estimated_kWh < self.accumulated_kWh:
+                    error_ratio = self.accumulated_kWh / estimated_kWh
                     if error_ratio > 2:
                         error_ratio = 2
                     else:
                         error_ratio += 0.1
                     self._persistence.max_usage.calculated_difference_on_idle *= error_ratio
                     self.ADapi.log(
-                        f"Accumulated kWh was unavailable. Estimated: {round(self.last_accumulated_kWh + (self.current_consumption/60000),2)}. "
+                        f"Accumulated kWh was unavailable. Estimated: {round(estimated_kWh,2)}. "
                         f"Actual: {self.accumulated_kWh}. New error ratio: {self._persistence.max_usage.calculated_difference_on_idle}",
                         level = 'INFO'
                     )
@@ -1534,10 +2146,13 @@ class ElectricalUsage(ad.ADBase):
                 if stale_time > timedelta(minutes = 3):
                     self.ADapi.create_task(self._reload_accumulated_consumption_sensor())
 
-                    if minute < 2:
+                    integrated_kWh = self._get_integrated_kWh('consumption', now)
+                    if integrated_kWh is not None:
+                        self.last_accumulated_kWh = self.accumulated_kWh = integrated_kWh
+                    elif minute < 2:
                         self.last_accumulated_kWh = self.accumulated_kWh = 1
                     else:
-                        add_consumption = round(self.current_consumption/60000 ,2)
+                        add_consumption = round((self.current_consumption/60000) * self.elapsed_minutes ,2)
                         self.accumulated_kWh += add_consumption
                         self.last_accumulated_kWh += add_consumption
 
@@ -1559,9 +2174,32 @@ class ElectricalUsage(ad.ADBase):
         ) * minute_ratio
         return target - (self.accumulated_kWh - self.production_kWh)
 
+    def _get_charging_watt(self) -> float:
+        """ Returns watt used by cars the app is currently charging """
+
+        charging_watt = 0.0
+        for queue_id in set(self._persistence.queueChargingList) | set(self._persistence.solarChargingList):
+            car = self.registry.get_car(queue_id)
+            if car is None or car.connected_charger is None:
+                continue
+            charger_data = car.connected_charger.charger_data
+            charging_watt += charger_data.ampereCharging * charger_data.voltPhase
+        return min(charging_watt, max(self.current_consumption, 0.0))
+
+    def _calc_predicted_consumption(self, now, charging_watt:float) -> float:
+        """ Expected average consumption in watt for the rest of the hour.
+            Uses learned load profile when it has enough data, otherwise current consumption """
+
+        if self.current_consumption_is_estimate:
+            return self.current_consumption
+        base_watt = self.load_profile.predict_average_watt(now, self.current_consumption - charging_watt)
+        if base_watt is None:
+            return self.current_consumption
+        return charging_watt + max(base_watt, 0.0)
+
     def _calc_projected_kWh_usage(self, now) -> float:
         remaining_minute = 60 - now.minute
-        return  ((self.current_consumption - self.current_production) / 60000.0) * remaining_minute
+        return  ((self.predicted_consumption - self.current_production) / 60000.0) * remaining_minute
 
     def _calc_available_Wh(self, now) -> float:
         remaining_minute = 60 - now.minute
@@ -1569,7 +2207,7 @@ class ElectricalUsage(ad.ADBase):
                 self._persistence.max_usage.max_kwh_usage_pr_hour
                 - self.buffer
                 + (self.max_target_kWh_buffer * (60 / remaining_minute))
-                ) * 1000 - self.current_consumption
+                ) * 1000 - self.predicted_consumption
 
 
     # Manage charging consumption
@@ -1586,7 +2224,7 @@ class ElectricalUsage(ad.ADBase):
         remaining_minute = 60 - minute
 
         if self._checkIfPossibleToStartCharging():
-            car = Registry.get_car(next_vehicle_to_start)
+            car = self.registry.get_car(next_vehicle_to_start)
             if car is None:
                 return
             if cancel_timer_handler(ADapi = self.ADapi, handler = self.checkIdleConsumption_Handler, name = "log"):
@@ -1623,7 +2261,7 @@ class ElectricalUsage(ad.ADBase):
                                          vehicle_id:str = None, 
                                          remaining_minute:int = 1) -> None:
         if remaining_minute > 3:
-            car = Registry.get_car(vehicle_id)
+            car = self.registry.get_car(vehicle_id)
             if car is not None:
                 car.startChargingCar()
                 #AmpereToCharge = math.floor(self.available_Wh / car.connected_charger.charger_data.voltPhase)
@@ -1638,7 +2276,7 @@ class ElectricalUsage(ad.ADBase):
         minute = now.minute
         remaining_minute = 60 - minute
 
-        car = Registry.get_car(vehicle_id)
+        car = self.registry.get_car(vehicle_id)
         if car is not None:
             if car.isChargingAtMaxAmps():
                 return True
@@ -1682,6 +2320,7 @@ class ElectricalUsage(ad.ADBase):
                         if car.car_data.kWh_remain_to_charge > 1:
                             data = {
                                 'tag' : 'charging' + str(car.carName),
+                                'action_data' : {'app' : self.name},
                                 'actions' : [{ 'action' : 'find_new_chargetime'+str(car.carName), 'title' : f'Find new chargetime for {car.carName}' }]
                                 }
                             self.notify_app.send_notification(
@@ -1698,7 +2337,7 @@ class ElectricalUsage(ad.ADBase):
         """ Reduces charging to stay within max kWh """
 
         for queue_id in reversed(charging_list):
-            car = Registry.get_car(queue_id)
+            car = self.registry.get_car(queue_id)
             if car is None or car.connected_charger is None:
                 continue
 
@@ -1732,7 +2371,7 @@ class ElectricalUsage(ad.ADBase):
 
     def _stop_chargers_due_to_overconsumption(self) -> bool:
         for queue_id in reversed(self._persistence.queueChargingList):
-            car = Registry.get_car(queue_id)
+            car = self.registry.get_car(queue_id)
             if car is None or car.connected_charger is None:
                 continue
 
@@ -1833,7 +2472,7 @@ class ElectricalUsage(ad.ADBase):
                     if not 'presence' in daytime:
                         if (start := self.ADapi.parse_datetime(daytime['start'])) <= now_notAware < (end := self.ADapi.parse_datetime(daytime['stop'])):
 
-                            off_hours = self.ADapi.parse_datetime(daytime['stop']) - self.ADapi.parse_datetime(daytime['start'])
+                            off_hours = end - start
                             hoursOffInt = off_hours.seconds//3600
                             break
             if hoursOffInt == 0:
@@ -1867,24 +2506,29 @@ class ElectricalUsage(ad.ADBase):
         save_end_hour = now.replace(minute = 0, second = 0, microsecond = 0)
         duration_hours = 1
 
-        slots: List[WattSlot] = []
+        slot_times: List[Tuple] = []
         for item in self.electricalPriceApp.elpricestoday:
             duration_hours = (item.end - item.start).total_seconds() / 3600.0
-            base_wh = self._persistence.max_usage.max_kwh_usage_pr_hour * 1_000 * duration_hours
-            slots.append(WattSlot(start=item.start, end=item.end, available_Wh=base_wh))
+            slot_times.append((item.start, item.end))
 
         reduce_avg_heater_watt = 1.0
         reduce_avg_idle_watt   = 1.0
+        idle_watt: float | None = None
         idle_block = self._persistence.idle_usage
         if idle_block and idle_block.ConsumptionData:
             idle_consumption = get_consumption_for_outside_temp(idle_block.ConsumptionData, self._persistence.weather.out_temp)
             if idle_consumption:
                 reduce_avg_heater_watt = float(idle_consumption.HeaterConsumption or 0)
                 reduce_avg_idle_watt   = float(idle_consumption.Consumption or 0)
-                idle_val = (reduce_avg_heater_watt + reduce_avg_idle_watt) * duration_hours
-                for s in slots:
-                    s.available_Wh -= idle_val
+                idle_watt = reduce_avg_heater_watt + reduce_avg_idle_watt
+
+        # Use learned baseline for each slot where there is enough data, and flat idle consumption otherwise
+        slot_watt: List[Optional[float]] = []
+        for start, end in slot_times:
+            watt = self.baseline_model.predict_watt(start, self._persistence.weather.out_temp)
+            slot_watt.append(idle_watt if watt is None else watt)
 
+        heater_loads: List[Tuple] = []
         total_power = self.totalWattAllHeaters or 1.0
         for heater_id, heater_block in self._persistence.heater.items():
             if not heater_block or not heater_block.ConsumptionData:
@@ -1932,29 +2576,25 @@ class ElectricalUsage(ad.ADBase):
                 heater_watt = heater_block.normal_power or 0.0
                 pct = heater_watt / total_power
                 heater_watt -= reduce_avg_heater_watt * pct
-                heater_consumption = heater_watt * duration_hours
-
-                idx = bisect.bisect_left([s.start for s in slots], end_time)
-                remaining = expected_kwh
-                for s in slots[idx:]:
-                    if remaining <= 0:
-                        break
-                    usable = min(s.available_Wh, heater_consumption)
-                    if remaining > heater_consumption:
-                        if s.available_Wh < heater_consumption:
-                            remaining -= s.available_Wh
-                            s.available_Wh = 0.0
-                        else:
-                            remaining -= heater_consumption
-                            s.available_Wh -= heater_consumption
-                    else:
-                        s.available_Wh -= remaining
-                        remaining = 0.0
-                        break
+                heater_loads.append((end_time, expected_kwh, heater_watt * duration_hours))
+
+        snapshot = AvailableWattSnapshot(
+            slots = slot_times,
+            max_kwh_usage_pr_hour = self._persistence.max_usage.max_kwh_usage_pr_hour,
+            slot_watt = slot_watt,
+            heater_loads = heater_loads,
+        )
 
-        self.charging_scheduler.save_endHour = save_end_hour
-        self._persistence.available_watt.clear()
-        self._persistence.available_watt.extend(slots)
+        def _apply(slots: WattSlots) -> None:
+            self.charging_scheduler.save_endHour = save_end_hour
+            self.available_watt.replace(slots)
+            if self.charging_scheduler.chargingQueue:
+                self.charging_scheduler.process_charging_queue_offloaded(self.schedule_offloader)
+
+        self.schedule_offloader.submit(build_available_watt, snapshot, _apply,
+            name = 'available watt',
+            pure = True
+        )
 
     def logIdleConsumption(self, kwargs) -> None:
         """ Calculate the new idle & heater consumption values for the *current* outside temperature """
@@ -2151,6 +2791,8 @@ class ElectricalUsage(ad.ADBase):
             To call from another app use: self.fire_event('MODE_CHANGE', mode = 'fire')
             Set back to normal with mode 'false-alarm' """
 
+        if not self._addressed_to_me(data):
+            return
         if data['mode'] == translations.fire:
             self.houseIsOnFire = True
             for car in self.all_cars_connected():
@@ -2184,6 +2826,7 @@ class ElectricalUsage(ad.ADBase):
                 self.hour_to_add_to_high_consumption_hours = hour
                 # TODO: Add option to increase max kwh for this month
                 data = {'tag': 'overconsumption',
+                        'action_data' : {'app' : self.name},
                         'actions' : [{ 'action' : 'add_high_consumption_hours',
                         'title' : f'Add Hour {hour} to High Consumption'
                         }]
@@ -2204,10 +2847,17 @@ class ElectricalUsage(ad.ADBase):
             self.notify_about_overconsumption = True
 
     def _notify_event(self, event_name, data, **kwargs) -> None:
+        if not self._addressed_to_me(data.get('action_data') or {}):
+            return
         action = data['action']
 
         if action == 'add_high_consumption_hours':
-            self._persistence.high_consumption.high_consumption_hours.append(self.hour_to_add_to_high_consumption_hours)
+            high_consumption_hours = self._persistence.high_consumption.high_consumption_hours
+            if (
+                self.hour_to_add_to_high_consumption_hours >= 0
+                and self.hour_to_add_to_high_consumption_hours not in high_consumption_hours
+            ):
+                high_consumption_hours.append(self.hour_to_add_to_high_consumption_hours)
         for car in self.all_cars():
             if action == 'find_new_chargetime'+str(car.carName):
                 car.kWhRemaining()
@@ -2233,6 +2883,63 @@ class ElectricalUsage(ad.ADBase):
                 charger.startCharging()
                 return
 
+    def preview_charging(self, data: dict) -> dict:
+        """ Returns the charging plan if a car is queued with the values in data, without changing the live queue.
+            data must contain 'car' (name or vehicle_id). 'kWhRemaining', 'maxAmps', 'voltPhase', 'finish_by_hour'
+            and 'priority' are optional and defaults to the current values for the car. """
+
+        car_id = data.get('car')
+        car = self.cars.get(car_id) or next((c for c in self.all_cars() if c.carName == car_id), None)
+        if car is None:
+            return {'error': f"Car {car_id} not found"}
+
+        charger = car.connected_charger or car.onboard_charger
+        try:
+            kWhRemaining = float(data.get('kWhRemaining', car.car_data.kWh_remain_to_charge))
+            maxAmps = int(data.get('maxAmps', car.getCarMaxAmps()))
+            voltPhase = int(data.get('voltPhase', charger.charger_data.voltPhase if charger is not None else 220))
+            finish_by_hour = int(data.get('finish_by_hour', car.finish_by_hour))
+            priority = int(data.get('priority', car.car_data.priority))
+        except (ValueError, TypeError) as e:
+            return {'error': f"Not valid input: {e}"}
+
+        with self.state_lock:
+            queue, simultaneous = self.charging_scheduler.previewCharging(
+                vehicle_id = car.vehicle_id,
+                kWhRemaining = kWhRemaining,
+                maxAmps = maxAmps,
+                voltPhase = voltPhase,
+                finish_by_hour = finish_by_hour,
+                priority = priority,
+                name = car.carName,
+            )
+
+        return {
+            'vehicle_id': car.vehicle_id,
+            'simultaneous': simultaneous,
+            'queue': [
+                item.model_dump(mode = 'json', include = {
+                    'vehicle_id', 'name', 'priority', 'kWhRemaining', 'finish_by_hour',
+                    'chargingStart', 'estimateStop', 'chargingStop', 'price',
+                })
+                for item in queue
+            ],
+        }
+
+    def _preview_endpoint(self, data, *args, **kwargs):
+        """ AppDaemon api endpoint: POST /api/appdaemon/<preview_endpoint>. Defaults to <app name>_preview """
+
+        result = self.preview_charging(data or {})
+        return result, 400 if 'error' in result else 200
+
+    def _preview_event(self, event_name, data, **kwargs) -> None:
+        """ Answers ELECTRICAL_PREVIEW events with an ELECTRICAL_PREVIEW_RESULT event """
+
+        if not self._addressed_to_me(data):
+            return
+        result = self.preview_charging(data)
+        self.ADapi.fire_event("ELECTRICAL_PREVIEW_RESULT", namespace = self.HASS_namespace, app = self.name, **result)
+
     def _awayStateListen_Main(self, entity, attribute, old, new, kwargs) -> None:
         """ Listen for changes in vacation switch """
 
@@ -2252,16 +2959,24 @@ class Notify_Mobiles:
     def send_notification(self, **kwargs) -> None:
         """ Sends notification to recipients via Home Assistant notification.
         """
+        for service, data in self.notification_calls(**kwargs):
+            self.ADapi.call_service(service, **data)
+
+    def notification_calls(self, **kwargs) -> List[Tuple[str, dict]]:
+        """ Returns service calls to send notification, one pr recipient.
+        """
         message:str = kwargs['message']
         message_title:str = kwargs.get('message_title', 'Home Assistant')
         message_recipient:str = kwargs.get('message_recipient', True)
         also_if_not_home:bool = kwargs.get('also_if_not_home', False)
         data:dict = kwargs.get('data', {'clickAction' : 'noAction'})
 
-        for re in message_recipient:
-            self.ADapi.call_service(f'notify/{re}',
-                title = message_title,
-                message = message,
-                data = data,
-                namespace = self.namespace
-            )
+        return [
+            (f'notify/{re}', {
+                'title': message_title,
+                'message': message,
+                'data': data,
+                'namespace': self.namespace,
+            })
+            for re in message_recipient
+        ]
@@ -5,8 +5,8 @@ from datetime import timedelta
 from typing import Optional
 
 from utils import cancel_timer_handler#, cancel_listen_handler
+from app_logging import AppLogger, Lazy
 
-from registry import Registry
 from scheduler import Scheduler
 
 UNAVAIL = ('unavailable', 'unknown')
@@ -20,15 +20,29 @@ class Car:
         self.guestCharging:bool # Defaults to False
         self.connected_vehicle # Car to charge
     """
+
+    # Slotted to keep memory pr car low and attribute access fast in the control loop
+    __slots__ = (
+        'ADapi', 'applog', 'registry', 'namespace', 'car_data', 'charging_scheduler',
+        'vehicle_id', 'carName', 'finish_by_hour',
+        'charge_now_HA_switch', 'charge_now', 'charge_only_on_solar', 'charging_on_solar',
+        'start_charging_max', 'pct_start_charge',
+        'connected_charger', 'onboard_charger',
+        'find_Chargetime_Whenhome_handler', 'max_range_handler',
+    )
+
     def __init__(self, api,
         namespace:str,
         carName:str, # Name of car
         vehicle_id:str, # ID of car
         car_data,
         charging_scheduler,
+        registry,
     ):
 
         self.ADapi = api
+        self.applog = AppLogger(api)
+        self.registry = registry
         self.namespace = namespace
         self.car_data = car_data
         self.charging_scheduler = charging_scheduler
@@ -73,7 +87,7 @@ class Car:
         # Charger objects:
         self.connected_charger: Optional[Charger] = None
         self.onboard_charger: Optional[Charger] = None
-        Registry.register_car(self)
+        self.registry.register_car(self)
 
         if self.car_data.charge_limit is not None:
             self.car_data.kWh_remain_to_charge:float = self.kWhRemaining()
@@ -111,7 +125,7 @@ class Car:
         """
 
     def set_connected_charger(self, charger: Charger) -> None:
-        Registry.set_link(self, charger)
+        self.registry.set_link(self, charger)
 
         # Functions on when to charge Car
     def _finishByHourListen(self, entity, attribute, old, new, kwargs) -> None:
@@ -171,7 +185,7 @@ class Car:
         charger_state = self.getCarChargerState()
         if self.connected_charger is None:
             if charger_state != 'NoPower':
-                Registry.set_link(self, self.onboard_charger)
+                self.registry.set_link(self, self.onboard_charger)
             else:
                 return
         if (
@@ -245,14 +259,14 @@ class Car:
                     if onboard_charger is self.connected_charger:
                         self.connected_charger._CleanUpWhenChargingStopped()
                     else:
-                        Registry.unlink(self)
-                        Registry.set_link(self, self.onboard_charger)
+                        self.registry.unlink(self)
+                        self.registry.set_link(self, self.onboard_charger)
 
             if self.max_range_handler is not None:
                 # TODO: Program charging to max at departure time.
                 # @HERE: Call a function that will cancel handler when car is disconnected
                 #self.ADapi.run_in(self.resetMaxRangeCharging, 1)
-                self.ADapi.log(f"{self.charger} Has a max_range_handler. Not Programmed yet", level = 'DEBUG')
+                self.applog.debug("%s Has a max_range_handler. Not Programmed yet", self.charger)
 
     def isConnected(self) -> bool:
         """ Returns True if charge cable is connected.
@@ -447,11 +461,11 @@ class Car:
                     attribute = 'charging_state'
                 )
             except (ValueError, TypeError) as ve:
-                self.ADapi.log(
-                    f"{self.charger} Could not get attribute = 'charging_state' from: "
-                    f"{self.ADapi.get_state(self.car_data.charger_sensor, namespace = self.namespace)} "
-                    f"Error: {ve}",
-                    level = 'DEBUG'
+                self.applog.debug(
+                    "%s Could not get attribute = 'charging_state' from: %s Error: %s",
+                    self.carName,
+                    Lazy(lambda: self.ADapi.get_state(self.car_data.charger_sensor, namespace = self.namespace)),
+                    ve
                 )
             else:
                 if state == 'Starting':
@@ -482,11 +496,14 @@ class Car:
 
 class Tesla_car(Car):
 
+    __slots__ = ()
+
     def __init__(self, api,
         namespace,
         carName,
         car_data,
         charging_scheduler,
+        registry,
     ):
 
         self.vehicle_id = api.get_state(car_data.online_sensor,
@@ -501,6 +518,7 @@ class Tesla_car(Car):
             vehicle_id = self.vehicle_id,
             car_data = car_data,
             charging_scheduler = charging_scheduler,
+            registry = registry,
         )
         self.onboard_charger = None
 
@@ -1,17 +1,31 @@
 from __future__ import annotations
 
 import math
-import inspect
 import uuid
 from typing import Optional
 
 from electrical_cars import Car
 from pydantic_models import CarData
 from utils import cancel_timer_handler, cancel_listen_handler
+from app_logging import AppLogger, Lazy
+from charger_drivers import ChargerDriver, TeslaDriver, EaseeDriver, AudiDriver
 
-from registry import Registry
 
 class Charger:
+    """ Charger parent class. Keeps charging state and sends commands through driver.
+    Set driver_class in childclass to a ChargerDriver for the vendor. """
+
+    driver_class = ChargerDriver
+
+    # Slotted to keep memory pr charger low and attribute access fast in the control loop
+    __slots__ = (
+        'manager', 'ADapi', 'applog', 'registry', 'driver', 'namespace', 'notify_app', 'recipients',
+        'charger', 'charger_id', 'charger_data', 'charging_scheduler',
+        'connected_vehicle', '_cars', '_guest_car',
+        'guestCharging', 'idle_current', 'doNotStartMe', 'session_start_charge',
+        'checkCharging_handler', '_recheck_findCarConnectedToCharger_handler',
+        'reason_for_no_current_handler', 'noPowerDetected_handler',
+    )
 
     def __init__(self, api,
         namespace:str,
@@ -25,6 +39,8 @@ class Charger:
 
         self.manager = api
         self.ADapi = api.ADapi
+        self.applog = AppLogger(self.ADapi)
+        self.registry = api.registry
         self.connected_vehicle: Optional[Car] = None
         self.namespace = namespace
         self.charger = charger
@@ -33,6 +49,7 @@ class Charger:
         self.charging_scheduler = charging_scheduler
         self.notify_app = notify_app
         self.recipients = recipients
+        self.driver = self.driver_class(self)
 
         # Helpers
         self.checkCharging_handler = None
@@ -42,7 +59,7 @@ class Charger:
         self.session_start_charge:float = 0.0
         self._guest_car = None
 
-        Registry.register_charger(self)
+        self.registry.register_charger(self)
 
         # Switch to allow guest to charge
         if isinstance(charger_data.guest, str):
@@ -84,10 +101,19 @@ class Charger:
                 if self.compareChargingState(
                     car_status = car.getCarChargerState()
                 ):
-                    Registry.set_link(car, self)
+                    self.registry.set_link(car, self)
                     self.kWhRemaining()
                     self.connected_vehicle.findNewChargeTime()
                     self._register_battery_soc_for_calculation()
+                    if (
+                        self.driver.dynamic_circuit_limit
+                        and self.connected_vehicle.onboard_charger is None
+                        and self.charger_data.reason_for_no_current is not None
+                    ):
+                        # Set max ampere charging for unconnected cars.
+                        self.reason_for_no_current_handler = self.ADapi.listen_state(self.reasonChange, self.charger_data.reason_for_no_current,
+                            namespace = self.namespace
+                        )
                     return True
 
         if self.connected_vehicle is None:
@@ -159,7 +185,7 @@ class Charger:
         try:
             pwr = float(pwr)
         except (ValueError, TypeError) as ve:
-            self.ADapi.log(f"{self.charger} Could not get charger_power: {pwr} Error: {ve}", level = 'DEBUG')
+            self.applog.debug("%s Could not get charger_power: %s Error: %s", self.charger, pwr, ve)
             pwr = 0
         return pwr
 
@@ -187,10 +213,7 @@ class Charger:
         try:
             newAmp = math.floor(float(new))
         except (ValueError, TypeError) as ve:
-            self.ADapi.log(
-                f"{self.charger} Not able to get ampere charging. New is {new}. Error {ve}",
-                level = 'DEBUG'
-            )
+            self.applog.debug("%s Not able to get ampere charging. New is %s. Error %s", self.charger, new, ve)
         else:
             self.charger_data.ampereCharging = newAmp
 
@@ -200,10 +223,7 @@ class Charger:
             newAmp = math.floor(float(self.ADapi.get_state(self.charger_data.charging_amps,
                                 namespace = self.namespace)))
         except (ValueError, TypeError) as ve:
-            self.ADapi.log(
-                f"{self.charger} Not able to get ampere charging. New is {newAmp}. Error {ve}",
-                level = 'DEBUG'
-            )
+            self.applog.debug("%s Not able to get ampere charging. New is %s. Error %s", self.charger, newAmp, ve)
         else:
             self.charger_data.ampereCharging = newAmp
         return newAmp
@@ -218,6 +238,8 @@ class Charger:
     def setChargingAmps(self, charging_amp_set:int = 16) -> int:
         """ Function to set ampere charging to received value. Returns actual restricted within min/max ampere """
 
+        if not self.driver.settable_amps:
+            return self.charger_data.ampereCharging
         max_available_amps = self.getmaxChargingAmps()
         if charging_amp_set < self.charger_data.min_ampere:
             charging_amp_set = self.charger_data.min_ampere
@@ -229,14 +251,7 @@ class Charger:
                 if connected_charger is not onboard_charger:
                     onboard_charger.setChargingAmps(charging_amp_set = onboard_charger.getmaxChargingAmps())
 
-        stack = inspect.stack() # Check if called from child
-        if stack[1].function != 'setChargingAmps':
-            self.charger_data.ampereCharging = charging_amp_set
-            self.ADapi.call_service('number/set_value',
-                value = self.charger_data.ampereCharging,
-                entity_id = self.charger_data.charging_amps,
-                namespace = self.namespace
-            )
+        self.driver.set_amps(charging_amp_set)
         return charging_amp_set
 
     def Charger_ChargeCableConnected(self, entity, attribute, old, new, kwargs) -> None:
@@ -273,7 +288,7 @@ class Charger:
 
         connected_charger = getattr(self.connected_vehicle, "connected_charger", None)
         if connected_charger is self:
-            Registry.unlink_by_charger(self)
+            self.registry.unlink_by_charger(self)
 
     def ChargingStarted(self, entity, attribute, old, new, kwargs) -> None:
         """ Charger started charging. Check if controlling car and if chargetime has been set up """
@@ -295,7 +310,8 @@ class Charger:
 
             else:
                 self.setVolts()
-                self.setPhases()
+                if self.driver.phase_switching:
+                    self.setPhases()
                 self.setVoltPhase(
                     volts = self.charger_data.volts,
                     phases = self.charger_data.phases
@@ -309,7 +325,7 @@ class Charger:
             self.setChargingAmps(charging_amp_set = self.charger_data.min_ampere) # Set to minimum amp for preheat.
 
     def startCharging(self) -> bool:
-        """ Starts charger. Parent class returns boolen to child if ready to start charging """
+        """ Starts charger. Returns True if start command was sent """
 
         if cancel_timer_handler(ADapi = self.ADapi, handler = self.checkCharging_handler, name = self.charger):
             self.checkCharging_handler = None
@@ -318,68 +334,50 @@ class Charger:
         self.checkCharging_handler = self.ADapi.run_in(self._check_that_charging_started, 60)
 
         self.charging_scheduler.markAsCharging(self.connected_vehicle.vehicle_id)
-        stack = inspect.stack()
-        if stack[1].function == 'startCharging':
-            return True
-        else:
-            self.ADapi.call_service('switch/turn_on',
-                entity_id = self.charger_data.charger_switch,
-                namespace = self.namespace,
-            )
-        return False
+        self.driver.start()
+        return True
 
     def stopCharging(self, force_stop:bool = False) -> bool:
-        """ Stops charger. Parent class returns boolen to child if able to stop charging """
+        """ Stops charger. Returns False if car should not be stopped """
 
         if self.connected_vehicle is not None:
             if not self.connected_vehicle.isConnected() or (self.connected_vehicle.dontStopMeNow() and not force_stop):
                 return False
 
         cancel_timer_handler(ADapi = self.ADapi, handler = self.checkCharging_handler, name = self.charger)
-        if self.getChargingState() in ('Charging', 'Starting'):
+        charging = self.getChargingState() in ('Charging', 'Starting')
+        if charging:
             self.checkCharging_handler = self.ADapi.run_in(self._check_that_charging_stopped, 60)
-
-            stack = inspect.stack()
-            if stack[1].function != 'stopCharging':
-                self.ADapi.call_service('switch/turn_off',
-                    entity_id = self.charger_data.charger_switch,
-                    namespace = self.namespace,
-                )
+        if charging or self.driver.stop_when_idle:
+            self.driver.stop()
         return True
 
-    def _check_that_charging_started(self, kwargs) -> bool:
+    def _check_that_charging_started(self, kwargs) -> None:
         cancel_timer_handler(ADapi = self.ADapi, handler = self.checkCharging_handler, name = self.charger)
-        if not self.getChargingState() in ('Charging', 'Complete', 'Disconnected'):
+        state = self.getChargingState()
+        if state == 'NoPower' and self.driver.unlink_on_no_power:
+            connected_charger = getattr(self.connected_vehicle, "connected_charger", None)
+            if connected_charger is self:
+                self.registry.unlink_by_charger(self)
+                return
+        if not state in ('Charging', 'Complete', 'Disconnected'):
             self.checkCharging_handler = self.ADapi.run_in(self._check_that_charging_started, 60)
+            self.driver.start()
 
-            stack = inspect.stack()
-            if stack[1].function in ('startCharging', '_check_that_charging_started'):
-                return False
-            else:
-                self.ADapi.call_service('switch/turn_on',
-                    entity_id = self.charger_data.charger_switch,
-                    namespace = self.namespace,
-                )
-        return True
-
-    def _check_that_charging_stopped(self, kwargs) -> bool:
+    def _check_that_charging_stopped(self, kwargs) -> None:
         if self.connected_vehicle is not None:
             cancel_timer_handler(ADapi = self.ADapi, handler = self.checkCharging_handler, name = self.charger)
             if self.connected_vehicle.dontStopMeNow():
-                return True
+                return
             if self.getChargingState() == 'Charging':
                 self.checkCharging_handler = self.ADapi.run_in(self._check_that_charging_stopped, 60)
+                self.driver.stop()
 
-                stack = inspect.stack()
-                if stack[1].function in ('stopCharging', '_check_that_charging_stopped'):
-                    return False
-                else:
-                    self.ADapi.call_service('switch/turn_off',
-                        entity_id = self.charger_data.charger_switch,
-                        namespace = self.namespace,
-                    )
+    def setVolts(self) -> None:
+        """ Updates volts from charger sensors. Set in child class if charger reports volts """
 
-        return True
+    def setPhases(self) -> None:
+        """ Updates phases from charger sensors. Set in child class if charger reports phases """
 
     def _updateMaxkWhCharged(self, session: float) -> None:
         if self.connected_vehicle.car_data.max_kWh_charged < session:
@@ -472,6 +470,24 @@ class Charger:
         ):
             self.charger_data.voltPhase = volts
 
+    def reasonChange(self, entity, attribute, old, new, kwargs) -> None:
+        """ Listens to reason for no current on chargers with dynamic circuit limit.
+            Easee reason can be:
+            'no_current_request' / 'undefined' / 'waiting_in_queue' / 'limited_by_charger_max_limit' /
+            'limited_by_local_adjustment' / 'limited_by_car' / 'car_not_charging' /  from reason_for_no_current """
+
+        if (
+            new == 'limited_by_car'
+        ):
+            chargingAmpere = math.ceil(float(self.ADapi.get_state(self.charger_data.charging_amps,
+                namespace = self.namespace))
+            )
+            if (
+                self.connected_vehicle.car_data.car_limit_max_ampere != chargingAmpere
+                and chargingAmpere >= 6
+            ):
+                self.connected_vehicle.car_data.car_limit_max_ampere = chargingAmpere
+
     def idle_currentListen(self, entity, attribute, old, new, kwargs) -> None:
         if new == 'on':
             self.idle_current = True
@@ -483,6 +499,7 @@ class Charger:
 
         data = {
             'tag' : carName,
+            'action_data' : {'app' : self.manager.name},
             'actions' : [{ 'action' : 'chargeNow'+str(self.charger), 'title' : f'Charge {carName} Now' },
                          { 'action' : 'kWhremaining'+str(self.charger),
                            'title' : 'Input expected kWh to charge',
@@ -517,7 +534,7 @@ class Charger:
                     self.connected_vehicle._handleChargeCompletion()
                     self.stopCharging()
                     self.remove_car_from_list(self.connected_vehicle.vehicle_id)
-                    Registry.unlink_by_charger(self)
+                    self.registry.unlink_by_charger(self)
                     self._guest_car = None
                 elif (
                     self.connected_vehicle.isConnected()
@@ -542,10 +559,11 @@ class Charger:
             vehicle_id = guest_id,
             car_data = guest_car_cfg,
             charging_scheduler = self.charging_scheduler,
+            registry = self.registry,
         )
 
         self.add_car_to_list(self._guest_car)
-        Registry.set_link(self._guest_car, self)
+        self.registry.set_link(self._guest_car, self)
         self.connected_vehicle.car_data.kWh_remain_to_charge = 10
 
     def add_car_to_list(self, car_instance):
@@ -558,6 +576,9 @@ class Tesla_charger(Charger):
     """ Tesla
         Child class of Charger. Uses Tesla custom integration. https://github.com/alandtse/tesla Easiest installation is via HACS. """
 
+    driver_class = TeslaDriver
+    __slots__ = ()
+
     def __init__(self, api,
         Car,
         namespace:str,
@@ -588,7 +609,7 @@ class Tesla_charger(Charger):
 
         self.noPowerDetected_handler = None
 
-        Registry.set_onboard_link(Car, self)
+        self.registry.set_onboard_link(Car, self)
 
         self.ADapi.listen_state(self.ChargingStarted, self.charger_data.charger_switch,
             namespace = self.namespace,
@@ -624,11 +645,11 @@ class Tesla_charger(Charger):
         except (ValueError, TypeError) as ve:
             return None
         except Exception as e:
-            self.ADapi.log(
-                f"{self.charger} Could not get attribute = 'charging_state' from: "
-                f"{self.ADapi.get_state(self.charger_data.charger_sensor, namespace = self.namespace)} "
-                f"Exception: {e}",
-                level = 'WARNING'
+            self.applog.warning_limited(f"{self.charger}_charging_state",
+                "%s Could not get attribute = 'charging_state' from: %s Exception: %s",
+                self.charger,
+                Lazy(lambda: self.ADapi.get_state(self.charger_data.charger_sensor, namespace = self.namespace)),
+                e
             )
             return None
         # Set as connected charger if restarted after cable connected.
@@ -637,7 +658,7 @@ class Tesla_charger(Charger):
             state == 'Stopped' and
             connected_charger is None
         ):
-            Registry.set_link(self.connected_vehicle, self)
+            self.registry.set_link(self.connected_vehicle, self)
 
         return state
 
@@ -682,17 +703,6 @@ class Tesla_charger(Charger):
             return True
         return False
 
-    def setChargingAmps(self, charging_amp_set:int = 16) -> int:
-        """ Function to set ampere charging to received value.
-            returns actual restricted within min/max ampere. """
-
-        self.charger_data.ampereCharging = super().setChargingAmps(charging_amp_set = charging_amp_set)
-        self.ADapi.call_service('tesla_custom/api',
-            namespace = self.namespace,
-            command = 'CHARGING_AMPS',
-            parameters = {'path_vars': {'vehicle_id': self.charger_id}, 'charging_amps': self.charger_data.ampereCharging}
-        )
-
     def MaxAmpereChanged(self, entity, attribute, old, new, kwargs) -> None:
         """ Detects if smart charger (Easee) increases ampere available to charge and updates internal charger to follow. """
 
@@ -714,52 +724,6 @@ class Tesla_charger(Charger):
             if float(new) > self.charger_data.maxChargerAmpere:
                 self.charger_data.maxChargerAmpere = new
 
-    def startCharging(self) -> None:
-        if super().startCharging():
-            self.ADapi.create_task(self.start_Tesla_charging())
-
-    async def start_Tesla_charging(self):
-        if self.connected_vehicle is not None:
-            try:
-                await self.ADapi.call_service('tesla_custom/api',
-                    namespace = self.namespace,
-                    command = 'START_CHARGE',
-                    parameters = { 'path_vars': {'vehicle_id': self.charger_id}, 'wake_if_asleep': True}
-                )
-                await self.connected_vehicle._force_API_update()
-            except Exception as e:
-                self.ADapi.log(f"{self.charger} Could not Start Charging. Exception: {e}", level = 'WARNING')
-
-    def stopCharging(self, force_stop:bool = False) -> None:
-        if super().stopCharging(force_stop = force_stop):
-            self.ADapi.create_task(self.stop_Tesla_charging())
-
-    async def stop_Tesla_charging(self):
-        try:
-            await self.ADapi.call_service('tesla_custom/api',
-                namespace = self.namespace,
-                command = 'STOP_CHARGE',
-                parameters = { 'path_vars': {'vehicle_id': self.charger_id}, 'wake_if_asleep': True}
-            )
-            await self.connected_vehicle._force_API_update()
-        except Exception as e:
-            self.ADapi.log(f"{self.charger} Could not Stop Charging: {e}", level = 'WARNING')
-
-    def _check_that_charging_started(self, kwargs) -> None:
-        connected_charger = getattr(self.connected_vehicle, "connected_charger", None)
-        if (
-            self.getChargingState() == 'NoPower'
-            and connected_charger is self
-        ):
-            Registry.unlink_by_charger(self)
-
-        elif not super()._check_that_charging_started(0):
-            self.ADapi.create_task(self.start_Tesla_charging())
-
-    def _check_that_charging_stopped(self, kwargs) -> None:
-        if not super()._check_that_charging_stopped(0):
-            self.ADapi.create_task(self.stop_Tesla_charging())
-
     def setVolts(self):
         if self.connected_vehicle.isConnected():
             try:
@@ -792,6 +756,9 @@ class Easee(Charger):
         Child class of Charger. Uses Easee EV charger component for Home Assistant. https://github.com/nordicopen/easee_hass 
         Easiest installation is via HACS. """
 
+    driver_class = EaseeDriver
+    __slots__ = ()
+
     def __init__(self, api,
         cars: Iterable[Car],
         namespace:str,
@@ -934,34 +901,16 @@ class Easee(Charger):
         if self.ADapi.get_state(self.charger_data.charger_sensor, namespace = self.namespace) == 'disconnected':
             if self.connected_vehicle is not None:
                 self._CleanUpWhenChargingStopped()
-                Registry.relink_to_onboard(self)
+                self.registry.relink_to_onboard(self)
         elif self.connected_vehicle is not None: # Check if new car is connected.
             if self.connected_vehicle.getCarChargerState() == 'Disconnected':
                 self._CleanUpWhenChargingStopped()
-                Registry.relink_to_onboard(self)
+                self.registry.relink_to_onboard(self)
                 self.findCarConnectedToCharger()
         elif self.connected_vehicle is None: # New car connected.
             self.findCarConnectedToCharger()
 
 
-    def reasonChange(self, entity, attribute, old, new, kwargs) -> None:
-        """ Listens to reasonChange in Easee charger.
-            Easee reason can be:
-            'no_current_request' / 'undefined' / 'waiting_in_queue' / 'limited_by_charger_max_limit' /
-            'limited_by_local_adjustment' / 'limited_by_car' / 'car_not_charging' /  from reason_for_no_current """
-
-        if (
-            new == 'limited_by_car'
-        ):
-            chargingAmpere = math.ceil(float(self.ADapi.get_state(self.charger_data.charging_amps,
-                namespace = self.namespace))
-            )
-            if (
-                self.connected_vehicle.car_data.car_limit_max_ampere != chargingAmpere
-                and chargingAmpere >= 6
-            ):
-                self.connected_vehicle.car_data.car_limit_max_ampere = chargingAmpere
-
     def setmaxChargingAmps(self) -> bool:
         """ Set maxChargerAmpere from charger sensors """
 
@@ -991,83 +940,12 @@ class Easee(Charger):
         except (ValueError, TypeError):
             self.charger_data.phases = 1
 
-    def setChargingAmps(self, charging_amp_set:int = 16) -> None:
-        """ Function to set ampere charging to received value.
-            returns actual restricted within min/max ampere. """
-
-        charging_amp_set = super().setChargingAmps(charging_amp_set = charging_amp_set)
-        if (
-            self.charger_data.ampereCharging != charging_amp_set
-            and self.charger_data.ampereCharging != charging_amp_set -1
-        ):
-            self.ADapi.call_service('easee/set_charger_dynamic_limit',
-                namespace = self.namespace,
-                current = charging_amp_set,
-                charger_id = self.charger_id
-            )
-
-    def findCarConnectedToCharger(self) -> bool:
-        if super().findCarConnectedToCharger():
-            if self.connected_vehicle.onboard_charger is None:
-                # Set max ampere charging for unconnected cars.
-                self.reason_for_no_current_handler = self.ADapi.listen_state(self.reasonChange, reason_for_no_current, namespace = namespace)
-            return True
-        return False
-
-    def startCharging(self) -> None:
-        if super().startCharging():
-            try:
-                self.ADapi.call_service('easee/action_command',
-                    namespace = self.namespace,
-                    action_command = 'resume',
-                    charger_id = self.charger_id
-                )
-            except Exception as e:
-                self.ADapi.log(f"{self.charger} Could not Start Charging. Exception {e}", level = 'WARNING')
-
-    def stopCharging(self, force_stop:bool = False) -> None:
-        if super().stopCharging(force_stop = force_stop):
-            try:
-                self.ADapi.call_service('easee/action_command',
-                    namespace = self.namespace,
-                    action_command = 'pause',
-                    charger_id = self.charger_id
-                )
-            except Exception as e:
-                self.ADapi.log(f"{self.charger} Could not Stop Charging. Exception: {e}", level = 'WARNING')
-
-    def _check_that_charging_started(self, kwargs) -> None:
-        if not super()._check_that_charging_started(0):
-            try:
-                self.ADapi.call_service('easee/action_command',
-                    namespace = self.namespace,
-                    action_command = 'resume',
-                    charger_id = self.charger_id
-                    )
-            except Exception as e:
-                self.ADapi.log(
-                    f"Could not Start Charging in _check_that_charging_started for {self.charger}. Exception: {e}",
-                    level = 'WARNING'
-                )
-
-    def _check_that_charging_stopped(self, kwargs) -> None:
-        if not super()._check_that_charging_stopped(0):
-            try:
-                self.ADapi.call_service('easee/action_command',
-                    namespace = self.namespace,
-                    action_command = 'pause',
-                    charger_id = self.charger_id
-                    )
-            except Exception as e:
-                self.ADapi.log(
-                    f"Could not Stop Charging in _check_that_charging_stopped for {self.charger}. Exception: {e}",
-                    level = 'WARNING'
-                )
-
 
 class Onboard_charger(Charger):
     """ Child class of Charger used for onboard for Car. """
 
+    __slots__ = ()
+
     def __init__(self, api,
         Car,
         namespace:str,
@@ -1096,7 +974,7 @@ class Onboard_charger(Charger):
                           phases = charger_data.phases)
 
         self.noPowerDetected_handler = None
-        Registry.set_onboard_link(Car, self)
+        self.registry.set_onboard_link(Car, self)
 
         self.ADapi.listen_state(self.ChargingStarted, self.charger_data.charger_switch,
             namespace = self.namespace,
@@ -1115,6 +993,9 @@ class Audi_charger(Charger):
     """ Audi Connect
         Child class of Charger. Uses Audi Connect custom integration https://github.com/audiconnect/audi_connect_ha. Easiest installation is via HACS. """
 
+    driver_class = AudiDriver
+    __slots__ = ()
+
     def __init__(self, api,
         Car,
         namespace:str,
@@ -1147,7 +1028,7 @@ class Audi_charger(Charger):
 
         self.noPowerDetected_handler = None
 
-        Registry.set_onboard_link(Car, self)
+        self.registry.set_onboard_link(Car, self)
 
         self.ADapi.listen_state(self.ChargingStarted, self.charger_data.charger_sensor,
             namespace = self.namespace,
@@ -1192,65 +1073,13 @@ class Audi_charger(Charger):
             state == 'Stopped' and
             connected_charger is None
         ):
-            Registry.set_link(self.connected_vehicle, self)
+            self.registry.set_link(self.connected_vehicle, self)
 
         if state == 'notReadyForCharging':
             return 'Disconnected'
         else:
-            self.ADapi.log(f"{self.charger} has state: {state}") ###
+            self.applog.info("%s has state: %s", self.charger, state) ###
         #elif not status == 'ready_to_charge':
         #    self.ADapi.log(f"Status: {status} for {self.charger} is not defined", level = 'WARNING')
         
         return state
-
-    def setChargingAmps(self, charging_amp_set:int = 16) -> int:
-        """ Function to set ampere charging to received value.
-            returns actual restricted within min/max ampere. """
-
-        pass # Does not support setting ampere
-
-    def startCharging(self) -> None:
-        if super().startCharging():
-            self.start_Audi_charging()
-
-    def start_Audi_charging(self):
-        if self.connected_vehicle is not None:
-            try:
-                self.ADapi.call_service('audiconnect/execute_vehicle_action',
-                    namespace = self.namespace,
-                    vin = self.charger_id,
-                    action = "start_charger"
-                )
-                #self.ADapi.create_task(self.connected_vehicle._force_API_update())
-            except Exception as e:
-                self.ADapi.log(f"{self.charger} Could not Start Charging. Exception: {e}", level = 'WARNING')
-
-    def stopCharging(self, force_stop:bool = False) -> None:
-        if super().stopCharging(force_stop = force_stop):
-            self.stop_Audi_charging()
-
-    def stop_Audi_charging(self):
-        try:
-                self.ADapi.call_service('audiconnect/execute_vehicle_action',
-                    namespace = self.namespace,
-                    vin = self.charger_id,
-                    action = "stop_charger"
-                )
-            #self.ADapi.create_task(self.connected_vehicle._force_API_update())
-        except Exception as e:
-            self.ADapi.log(f"{self.charger} Could not Stop Charging: {e}", level = 'WARNING')
-
-    def _check_that_charging_started(self, kwargs) -> None:
-        connected_charger = getattr(self.connected_vehicle, "connected_charger", None)
-        if (
-            self.getChargingState() == 'NoPower'
-            and connected_charger is self
-        ):
-            Registry.unlink_by_charger(self)
-
-        elif not super()._check_that_charging_started(0):
-            self.start_Audi_charging()
-
-    def _check_that_charging_stopped(self, kwargs) -> None:
-        if not super()._check_that_charging_stopped(0):
-            self.stop_Tesla_charging()
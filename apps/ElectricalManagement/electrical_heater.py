@@ -14,6 +14,8 @@ from utils import (
 )
 
 from scheduler import Scheduler
+from price_timeline import PriceTimeline
+from app_logging import AppLogger, Lazy
 
 UNAVAIL = ('unavailable', 'unknown')
 
@@ -22,6 +24,21 @@ class Heater:
         Parent class for on_off_switch and electrical heaters
         Sets up times to save/spend based on electricity price. """
 
+    # Slotted to keep memory pr heater low and attribute access fast in the control loop
+    __slots__ = (
+        'ADapi', 'applog', 'namespace', 'heater', 'heater_data', 'electricalPriceApp',
+        'charging_scheduler', 'notify_app', 'print_save_hours', 'price_timeline',
+        'vacation_state', 'automate', 'reset_continuous_hours', 'time_to_spend',
+        'kWh_consumption_when_turned_on', 'isSaveState', 'isOverconsumption', 'increase_now',
+        'last_reduced_state', '_consumption_stops_register_usage_handler', 'checkConsumption_handler',
+        'HeatAt', 'EndAt', 'price', 'out_temp', 'rain_amount', 'wind_amount',
+        'windows_is_open', 'notify_on_window_open', 'notify_on_window_closed',
+        'target_heater_temp', 'target_indoor_temp',
+    )
+
+    # True if heater_getNewPrices also finds times to heat extra before expensive hours
+    spends_before_peaks:bool = False
+
     def __init__(self,
         api,
         namespace,
@@ -30,9 +47,11 @@ class Heater:
         electricalPriceApp,
         charging_scheduler,
         notify_app,
-        print_save_hours
+        print_save_hours,
+        price_timeline = None,
     ):
         self.ADapi = api
+        self.applog = AppLogger(api)
         self.namespace = namespace
         self.heater = heater
         self.heater_data = heater_data
@@ -40,6 +59,9 @@ class Heater:
         self.charging_scheduler = charging_scheduler
         self.notify_app = notify_app
         self.print_save_hours = print_save_hours
+        if price_timeline is None:
+            price_timeline = PriceTimeline.shared(electricalPriceApp)
+        self.price_timeline = price_timeline
 
         # Vacation setup
         if self.heater_data.vacation is not None and self.ADapi.entity_exists(self.heater_data.vacation, namespace = self.namespace):
@@ -158,7 +180,10 @@ class Heater:
         self.heater_setNewValues()
 
         if self.print_save_hours and self.heater_data.time_to_save:
-            self.ADapi.log(f"{self.heater} save hours:{self.electricalPriceApp.print_peaks(self.heater_data.time_to_save)}")
+            self.applog.info(
+                "%s save hours:%s",
+                self.heater, Lazy(lambda: self.electricalPriceApp.print_peaks(self.heater_data.time_to_save))
+            )
 
     def heater_setNewValues(self, kwargs=None) -> None:
         """ Turns heater on or off based on this hours electricity price. """
@@ -201,7 +226,7 @@ class Heater:
                 if not self.heater_data.vacation_keep_off and self.HeatAt is not None:
                     if (
                         (start := self.HeatAt) <= now < (end := self.EndAt)
-                        or self.electricalPriceApp.electricity_price_now() <= self.price + (self.heater_data.pricedrop/2)
+                        or self.price_timeline.price_now(now) <= self.price + (self.heater_data.pricedrop/2)
                     ):
                         self.ADapi.call_service('switch/turn_on',
                             entity_id = self.heater,
@@ -224,7 +249,7 @@ class Heater:
             if self.HeatAt is not None:
                 if (
                     (start := self.HeatAt) <= now < (end := self.EndAt)
-                    or self.electricalPriceApp.electricity_price_now() <= self.price + (self.heater_data.pricedrop/2)
+                    or self.price_timeline.price_now(now) <= self.price + (self.heater_data.pricedrop/2)
                 ):
                     return
             if self.heater_data.validConsumptionSensor:
@@ -347,7 +372,7 @@ class Heater:
             If there is no consumption it will cancel the timer. """
 
         if not self.heater_data.validConsumptionSensor:
-            self.ADapi.log(f"Consumption sensor for {self.heater} not Valid. Should not see this anymore...")
+            self.applog.info("Consumption sensor for %s not Valid. Should not see this anymore...", self.heater)
             if cancel_timer_handler(ADapi = self.ADapi, handler = self.checkConsumption_handler, name = self.heater):
                self.checkConsumption_handler = None
             return
@@ -552,6 +577,10 @@ class Heater:
 class Climate(Heater):
     """ Controlling electrical heaters to heat off peak hours. """
 
+    __slots__ = ('min_temp',)
+
+    spends_before_peaks = True
+
     def __init__(self,
         api,
         namespace,
@@ -561,6 +590,7 @@ class Climate(Heater):
         charging_scheduler,
         notify_app,
         print_save_hours,
+        price_timeline = None,
     ):
 
         # Sensors
@@ -588,6 +618,7 @@ class Climate(Heater):
             charging_scheduler = charging_scheduler,
             notify_app = notify_app,
             print_save_hours = print_save_hours,
+            price_timeline = price_timeline,
         )
         self.reset_continuous_hours = True
 
@@ -597,11 +628,11 @@ class Climate(Heater):
                 attribute = 'min_temp'
             )
         except (ValueError, TypeError) as ve:
-            self.ADapi.log(
-                f"{self.heater} Attribute = 'min_temp' is not found in: "
-                f"{self.ADapi.get_state(self.heater, namespace = self.namespace, attribute = 'all')} "
-                f"ValueError: {ve}",
-                level = 'DEBUG'
+            self.applog.debug(
+                "%s Attribute = 'min_temp' is not found in: %s ValueError: %s",
+                self.heater,
+                Lazy(lambda: self.ADapi.get_state(self.heater, namespace = self.namespace, attribute = 'all')),
+                ve
             )
             self.min_temp = 5
 
@@ -614,7 +645,10 @@ class Climate(Heater):
         )
 
         if self.time_to_spend and self.print_save_hours:
-            self.ADapi.log(f"{self.heater} Extra heating at: {self.electricalPriceApp.print_peaks(self.time_to_spend)}", level = 'INFO')
+            self.applog.info(
+                "%s Extra heating at: %s",
+                self.heater, Lazy(lambda: self.electricalPriceApp.print_peaks(self.time_to_spend))
+            )
 
     def _awayStateListen_Heater(self, entity, attribute, old, new, kwargs) -> None:
 
@@ -630,7 +664,7 @@ class Climate(Heater):
                     hvac_mode = 'heat'
                 )
             except Exception as e:
-                self.ADapi.log(f"Not able to set hvac_mode to heat for {self.heater}. Exception: {e}", level = 'INFO')
+                self.applog.info("Not able to set hvac_mode to heat for %s. Exception: %s", self.heater, e)
         self.heater_setNewValues()
 
     def turn_on_heater(self) -> None:
@@ -687,7 +721,7 @@ class Climate(Heater):
                     entity_id = self.heater,
                     temperature = 10
                 )
-                self.ADapi.log(f"Error when trying to set temperature to {self.heater}: {ve}", level = 'DEBUG')
+                self.applog.debug("Error when trying to set temperature to %s: %s", self.heater, ve)
 
     def heater_setNewValues(self, kwargs=None) -> None:
         """ Adjusts temperature based on weather and time to save/spend. """
@@ -704,10 +738,7 @@ class Climate(Heater):
         try:
             heater_temp = float(self.ADapi.get_state(self.heater, namespace = self.namespace, attribute='temperature'))
         except (ValueError, TypeError) as ve:
-            self.ADapi.log(
-                f"Error when trying to get currently set temperature to {self.heater}: {ve}",
-                level = 'DEBUG'
-            )
+            self.applog.debug("Error when trying to get currently set temperature to %s: %s", self.heater, ve)
             heater_temp = self.target_heater_temp
 
         in_temp:float = -50
@@ -716,20 +747,19 @@ class Climate(Heater):
             try:
                 in_temp = float(self.ADapi.get_state(self.heater_data.indoor_sensor_temp, namespace = self.namespace))
             except (TypeError, AttributeError) as te:
-                self.ADapi.log(f"{self.heater} has no temperature. Probably offline", level = 'DEBUG')
+                self.applog.debug("%s has no temperature. Probably offline", self.heater)
             else:
                 in_temp_set = True
 
         if self.heater_data.indoor_sensor_temp is None or not in_temp_set:
             try:
                 in_temp = float(self.ADapi.get_state(self.heater, namespace = self.namespace, attribute='current_temperature'))
-                self.ADapi.log(
-                    f"{self.heater} Not able to get new inside temperature from {self.heater_data.indoor_sensor_temp}. "
-                    f"Getting in temp from heater. It is: {in_temp}",
-                    level = 'DEBUG'
+                self.applog.debug(
+                    "%s Not able to get new inside temperature from %s. Getting in temp from heater. It is: %s",
+                    self.heater, self.heater_data.indoor_sensor_temp, in_temp
                 )
             except (TypeError, AttributeError) as te:
-                self.ADapi.log(f"{self.heater} has no temperature. Probably offline. Error: {te}", level = 'DEBUG')
+                self.applog.debug("%s has no temperature. Probably offline. Error: %s", self.heater, te)
 
         # Set Target temperatures
         if 'offset' in target_temp:
@@ -754,10 +784,10 @@ class Climate(Heater):
                 window_temp = float(self.ADapi.get_state(self.heater_data.window_temp, namespace = self.namespace))
             except (TypeError, AttributeError):
                 window_temp = self.target_heater_temp + self.heater_data.window_offset
-                self.ADapi.log(f"{self.heater_data.window_temp} has no temperature. Probably offline", level = 'DEBUG')
+                self.applog.debug("%s has no temperature. Probably offline", self.heater_data.window_temp)
             except Exception as e:
                 window_temp = self.target_heater_temp + self.heater_data.window_offset
-                self.ADapi.log(f"Not able to get temperature from {self.heater_data.window_temp}. {e}", level = 'DEBUG')
+                self.applog.debug("Not able to get temperature from %s. %s", self.heater_data.window_temp, e)
             if window_temp > self.target_indoor_temp + self.heater_data.window_offset:
                 adjust = float(window_temp - (self.target_indoor_temp + self.heater_data.window_offset))
 
@@ -860,12 +890,14 @@ class Climate(Heater):
                     temperature = round(new_temperature * 2, 0) / 2
                 )
         except (TypeError, AttributeError):
-            self.ADapi.log(f"{self.heater} has no temperature. Probably offline", level = 'DEBUG')
+            self.applog.debug("%s has no temperature. Probably offline", self.heater)
 
 
 class On_off_switch(Heater):
     """ Controls on/off switches depending og given input and electricity price. """
 
+    __slots__ = ()
+
     def __init__(self,
         api,
         heater,
@@ -875,6 +907,7 @@ class On_off_switch(Heater):
         charging_scheduler,
         notify_app,
         print_save_hours,
+        price_timeline = None,
     ):
 
         super().__init__(
@@ -886,4 +919,5 @@ class On_off_switch(Heater):
             charging_scheduler = charging_scheduler,
             notify_app = notify_app,
             print_save_hours = print_save_hours,
+            price_timeline = price_timeline,
         )
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Tuple
+
+
+class EnergyIntegrator:
+    """ Integrates a power sensor (W) into energy (kWh) for the current hour.
+        Uses the trapezoidal rule on every state change and resets on the hour.
+        Keeps an error bound for the worst case where power changed as a step
+        at either end of an interval instead of as a ramp.
+        Power sensors do not update while the load is constant, so the last reading
+        is carried forward with advance() before the result is read with kWh(). """
+
+    def __init__(self):
+        self.hour_start = None
+        self.last_time = None
+        self.last_watt:float = 0.0
+        self.Wh:float = 0.0
+        self.error_Wh:float = 0.0
+        self.complete:bool = False # True when samples cover the whole hour
+
+    def add_sample(self, when, watt:float) -> None:
+        """ Add a new power reading in watt. """
+
+        if self.last_time is None:
+            self.hour_start = when.replace(minute = 0, second = 0, microsecond = 0)
+            self.complete = when == self.hour_start
+            self.last_time = when
+            self.last_watt = watt
+            return
+
+        if when <= self.last_time:
+            self.last_watt = watt
+            return
+
+        next_hour = self.hour_start + timedelta(hours = 1)
+        if when >= next_hour:
+            # Split the interval at the hour boundary with a linearly interpolated value
+            ratio = (next_hour - self.last_time) / (when - self.last_time)
+            watt_at_boundary = self.last_watt + (watt - self.last_watt) * ratio
+            self._integrate(next_hour, watt_at_boundary)
+            self._reset(when.replace(minute = 0, second = 0, microsecond = 0), watt_at_boundary)
+            if self.hour_start != next_hour:
+                self.complete = False # No samples for at least one full hour
+
+        self._integrate(when, watt)
+
+    def advance(self, now) -> None:
+        """ Integrates last reading up to *now*, as power has stayed the same since last sample. """
+
+        if self.last_time is not None and now > self.last_time:
+            self.add_sample(now, self.last_watt)
+
+    def kWh(self) -> Tuple[float, float]:
+        """ Returns kWh accumulated this hour up to last sample or advance, and the error bound in kWh. """
+
+        return self.Wh / 1000.0, self.error_Wh / 1000.0
+
+    def covers_hour(self, now) -> bool:
+        """ Returns True if samples cover the full hour *now* is in. """
+
+        if self.last_time is None:
+            return False
+        return (
+            self.complete
+            and self.hour_start == now.replace(minute = 0, second = 0, microsecond = 0)
+        )
+
+    def _integrate(self, when, watt:float) -> None:
+        hours = (when - self.last_time).total_seconds() / 3600.0
+        self.Wh += (self.last_watt + watt) / 2 * hours
+        self.error_Wh += abs(watt - self.last_watt) / 2 * hours
+        self.last_time = when
+        self.last_watt = watt
+
+    def _reset(self, hour_start, watt:float) -> None:
+        self.Wh = 0.0
+        self.error_Wh = 0.0
+        self.complete = True
+        self.hour_start = hour_start
+        self.last_time = hour_start
+        self.last_watt = watt
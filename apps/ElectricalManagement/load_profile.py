@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import math
+from typing import Optional
+
+from pydantic_models import (
+    LoadProfile,
+    BaselineProfile,
+    MINUTES_PR_WEEK,
+    BASELINE_TEMP_MIN,
+    BASELINE_TEMP_MAX,
+    BASELINE_TEMP_BUCKETS,
+    BASELINE_SIZE,
+)
+from utils import floor_even
+
+MAX_COUNTER = 255
+
+
+class LoadProfilePredictor:
+    """ Learns expected base load for every minute of the week with an exponentially
+        weighted moving average, and predicts average load for the rest of the hour.
+        Base load is consumption without car charging, that is planned separately. """
+
+    def __init__(self,
+        profile: LoadProfile,
+        alpha:float = 0.1,
+        min_samples:int = 3,
+        anomaly_minutes:float = 10,
+    ):
+        self.profile = profile
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.anomaly_decay = math.exp(-1 / anomaly_minutes) if anomaly_minutes > 0 else 0.0
+        self.last_index: Optional[int] = None
+        self._minute_sum:float = 0.0 # Sum and number of samples in the minute at last_index
+        self._minute_samples:int = 0
+
+        if (
+            len(self.profile.Consumption) != MINUTES_PR_WEEK
+            or len(self.profile.Counter) != MINUTES_PR_WEEK
+        ):
+            self.profile.Consumption = [0.0] * MINUTES_PR_WEEK
+            self.profile.Counter = [0] * MINUTES_PR_WEEK
+
+    @staticmethod
+    def minute_of_week(now) -> int:
+        return now.weekday() * 1440 + now.hour * 60 + now.minute
+
+    def update(self, now, base_watt:float) -> None:
+        """ Register base load. Samples within a minute are averaged, and the minute is learned once when
+            the next minute starts. Minutes without samples, up to one hour back, get the new sample. """
+
+        index = self.minute_of_week(now)
+        if index == self.last_index:
+            self._minute_sum += base_watt
+            self._minute_samples += 1
+            return
+
+        if self.last_index is not None:
+            self._learn(self.last_index, self._minute_sum / self._minute_samples)
+            missing = min((index - self.last_index) % MINUTES_PR_WEEK - 1, 59)
+            for offset in range(1, missing + 1):
+                self._learn((index - offset) % MINUTES_PR_WEEK, base_watt)
+
+        self.last_index = index
+        self._minute_sum = base_watt
+        self._minute_samples = 1
+
+    def _learn(self, i:int, watt:float) -> None:
+        consumption = self.profile.Consumption
+        counter = self.profile.Counter
+        if counter[i] == 0:
+            consumption[i] = round(watt, 1)
+        else:
+            consumption[i] = round(consumption[i] + self.alpha * (watt - consumption[i]), 1)
+        if counter[i] < MAX_COUNTER:
+            counter[i] += 1
+
+    def predict_average_watt(self, now, base_watt:float) -> Optional[float]:
+        """ Returns expected average base load in watt for the rest of this hour,
+            or ``None`` if the profile has too few samples to be trusted.
+            Deviation from profile right now is expected to fade out over a few minutes. """
+
+        index = self.minute_of_week(now)
+        remaining_minute = 60 - now.minute
+        consumption = self.profile.Consumption
+        counter = self.profile.Counter
+
+        if any(counter[(index + m) % MINUTES_PR_WEEK] < self.min_samples for m in range(remaining_minute)):
+            return None
+
+        anomaly = base_watt - consumption[index]
+        total = 0.0
+        for m in range(remaining_minute):
+            total += consumption[(index + m) % MINUTES_PR_WEEK] + anomaly
+            anomaly *= self.anomaly_decay
+        return total / remaining_minute
+
+
+class BaselineLoadModel:
+    """ Learns base load pr weekday, hour of day and outside temperature from every consumption check,
+        and estimates base load for the slots in available_watt. """
+
+    def __init__(self,
+        profile: BaselineProfile,
+        alpha:float = 0.05,
+        min_samples:int = 30,
+        max_temp_distance:int = 2,
+    ):
+        self.profile = profile
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.max_temp_distance = max_temp_distance
+        self._minutes:float = 0.0 # Minutes not yet counted in Counter
+
+        if (
+            len(self.profile.Consumption) != BASELINE_SIZE
+            or len(self.profile.Counter) != BASELINE_SIZE
+        ):
+            self.profile.Consumption = [0.0] * BASELINE_SIZE
+            self.profile.Counter = [0] * BASELINE_SIZE
+
+    @staticmethod
+    def temp_bucket(out_temp:float) -> int:
+        temp = min(max(floor_even(out_temp), BASELINE_TEMP_MIN), BASELINE_TEMP_MAX)
+        return (temp - BASELINE_TEMP_MIN) // 2
+
+    @staticmethod
+    def index(weekday:int, hour:int, bucket:int) -> int:
+        return (weekday * 24 + hour) * BASELINE_TEMP_BUCKETS + bucket
+
+    def update(self, now, out_temp:float, base_watt:float, minutes:float = 1) -> None:
+        """ Register base load. Weighs the sample by minutes since previous update,
+            and counts samples in whole minutes. """
+
+        i = self.index(now.weekday(), now.hour, self.temp_bucket(out_temp))
+        consumption = self.profile.Consumption
+        counter = self.profile.Counter
+        if counter[i] == 0:
+            consumption[i] = round(base_watt, 1)
+        else:
+            alpha = 1 - (1 - self.alpha) ** minutes
+            consumption[i] = round(consumption[i] + alpha * (base_watt - consumption[i]), 1)
+        self._minutes += minutes
+        whole_minutes = int(round(self._minutes, 6))
+        self._minutes -= whole_minutes
+        counter[i] = min(counter[i] + whole_minutes, MAX_COUNTER)
+
+    def predict_watt(self, when, out_temp:float) -> Optional[float]:
+        """ Returns expected base load in watt at *when*, using nearest temperature with enough samples,
+            or ``None`` if there is not enough data. """
+
+        bucket = self.temp_bucket(out_temp)
+        base = self.index(when.weekday(), when.hour, 0)
+        consumption = self.profile.Consumption
+        counter = self.profile.Counter
+        for distance in range(self.max_temp_distance + 1):
+            for b in ((bucket - distance, bucket + distance) if distance else (bucket,)):
+                if 0 <= b < BASELINE_TEMP_BUCKETS and counter[base + b] >= self.min_samples:
+                    return consumption[base + b]
+        return None
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import sys
+import tracemalloc
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+from pydantic import BaseModel
+
+from pydantic_models import TempConsumption
+
+
+def dedupe(items: list) -> int:
+    """ Removes duplicates in place and keeps first occurrence. Returns number of items removed """
+
+    seen = set()
+    kept = []
+    for item in items:
+        key = item if isinstance(item, Hashable) else id(item)
+        if key not in seen:
+            seen.add(key)
+            kept.append(item)
+    removed = len(items) - len(kept)
+    if removed:
+        items[:] = kept
+    return removed
+
+
+def prune_unknown(items: list, known: Iterable) -> int:
+    """ Removes items not in *known* in place. Returns number of items removed """
+
+    known = set(known)
+    kept = [item for item in items if item in known]
+    removed = len(items) - len(kept)
+    if removed:
+        items[:] = kept
+    return removed
+
+
+def cap_consumption_buckets(consumption_data: Dict[int, Dict[int, TempConsumption]], max_buckets: int) -> int:
+    """ Keeps the *max_buckets* hours off buckets with most samples. Returns number of buckets evicted """
+
+    if max_buckets <= 0 or len(consumption_data) <= max_buckets:
+        return 0
+
+    def samples(bucket: Dict[int, TempConsumption]) -> int:
+        return sum(
+            (t.Counter if isinstance(t, TempConsumption) else (t or {}).get('Counter')) or 0
+            for t in bucket.values()
+        )
+
+    ranked = sorted(consumption_data, key = lambda key: samples(consumption_data[key]), reverse = True)
+    for key in ranked[max_buckets:]:
+        del consumption_data[key]
+    return len(ranked) - max_buckets
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """ Size in bytes of obj and the containers and pydantic models it holds.
+        Other objects are counted by their own size only, so references to apps or heaters are not followed """
+
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, BaseModel):
+        size += deep_sizeof(obj.__dict__, seen)
+        size += deep_sizeof(getattr(obj, '__pydantic_private__', None) or {}, seen)
+    return size
+
+
+def memory_report(structures: Dict[str, Any], top:int = 10, path_filter: Optional[str] = None) -> str:
+    """ Text report with length and size of each structure, and allocations from tracemalloc when tracing """
+
+    lines = ["Memory pr structure:"]
+    rows = []
+    for name, obj in structures.items():
+        length = len(obj) if hasattr(obj, '__len__') else ''
+        rows.append((deep_sizeof(obj), name, length))
+    for size, name, length in sorted(rows, reverse = True):
+        lines.append(f"  {name}: {size / 1024:.1f} KiB" + (f", {length} items" if length != '' else ''))
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append(f"Traced memory: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB")
+        snapshot = tracemalloc.take_snapshot()
+        if path_filter is not None:
+            snapshot = snapshot.filter_traces((tracemalloc.Filter(True, f"{path_filter}*"),))
+        lines.append(f"Top {top} allocations:")
+        for stat in snapshot.statistics('lineno')[:top]:
+            lines.append(f"  {stat}")
+    return '\n'.join(lines)
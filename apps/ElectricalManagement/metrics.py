@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import math
+import os
+import time
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from api_proxy import ADAPIProxy
+
+Labels = Tuple[Tuple[str, str], ...]
+
+PREFIX = 'electricalmanagement_'
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels
+    ) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts: List[int] = [0] * len(DURATION_BUCKETS)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Metrics:
+    """ Counters and duration histograms updated in place, and gauges read from the app when rendered.
+        Rendering to Prometheus text format only happens when the metrics file is written.
+        const_labels are added to every series, so files from several app instances can be collected together. """
+
+    def __init__(self, const_labels: Labels = ()):
+        self.const_labels = const_labels
+        self._help: Dict[str, Tuple[str, str]] = {} # name: (type, help)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._gauges: Dict[str, Callable[[], Iterable[Tuple[Labels, float]]]] = {}
+
+    def counter(self, name: str, help: str) -> None:
+        self._help[name] = ('counter', help)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help: str) -> None:
+        self._help[name] = ('histogram', help)
+        self._histograms.setdefault(name, {})
+
+    def gauge(self, name: str, help: str, read: Callable[[], float | Iterable[Tuple[Labels, float]]]) -> None:
+        """ read returns a value, or (labels, value) pairs, when rendered """
+
+        self._help[name] = ('gauge', help)
+        self._gauges[name] = read
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        series = self._counters[name]
+        series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, seconds: float, labels: Labels = ()) -> None:
+        series = self._histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = _Histogram()
+        histogram.observe(seconds)
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """ Wraps func so its duration is observed in histogram *name* """
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start)
+        return wrapper
+
+    def render(self) -> str:
+        lines: List[str] = []
+        const = self.const_labels
+        for name, (kind, help) in self._help.items():
+            full_name = PREFIX + name
+            lines.append(f"# HELP {full_name} {help}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == 'counter':
+                for labels, value in list(self._counters[name].items()):
+                    lines.append(f"{full_name}{_format_labels(const + labels)} {_format_value(value)}")
+            elif kind == 'histogram':
+                for labels, histogram in list(self._histograms[name].items()):
+                    labels = const + labels
+                    cumulative = 0
+                    for bound, count in zip(DURATION_BUCKETS, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+            else:
+                try:
+                    value = self._gauges[name]()
+                except Exception:
+                    continue
+                if isinstance(value, (int, float)) or value is None:
+                    value = [((), value)]
+                for labels, v in value:
+                    lines.append(f"{full_name}{_format_labels(const + labels)} {_format_value(v)}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """ Writes metrics atomically, so the textfile collector never reads a partial file """
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding = 'utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class MetricsADAPI(ADAPIProxy):
+    """ Wraps the AppDaemon api to count service calls pr domain """
+
+    def __init__(self, ADapi, metrics: Metrics):
+        super().__init__(ADapi)
+        self._metrics = metrics
+        metrics.counter('service_calls_total', "Service calls made by the app pr domain")
+
+    def call_service(self, service: str, **kwargs):
+        self._metrics.inc('service_calls_total', (('domain', service.split('/', 1)[0]),))
+        return self._ADapi.call_service(service, **kwargs)
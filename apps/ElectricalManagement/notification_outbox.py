@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional
+
+
+@dataclass
+class _Outgoing:
+    service: Optional[str] # None: send through notify app
+    kwargs: dict
+    attempts: int = 0
+
+
+class NotificationOutbox:
+    """ Sends notifications and infotext updates from an async callback, so callers on the worker thread
+        do not wait for notification round-trips.
+        Notifications with the same tag to the same recipient within coalesce_seconds are merged, and only the latest is sent.
+        Notifications without tag are sent right away.
+        Infotext updates with unchanged text are skipped. Failed sends are retried with exponential back-off. """
+
+    def __init__(self, ADapi, notify_app,
+        coalesce_seconds:float = 10,
+        retries:int = 3,
+        retry_delay:float = 30,
+    ):
+        self.ADapi = ADapi
+        self.notify_app = notify_app
+        self.coalesce_seconds = coalesce_seconds
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.merged:int = 0
+
+        self._pending: Dict[Hashable, _Outgoing] = {}
+        self._texts: Dict[str, str] = {} # entity_id: last text sent
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._flush_handler = None
+
+    def send_notification(self, **kwargs) -> None:
+        """ Queues notification. Takes same arguments as Notify_Mobiles.send_notification """
+
+        tag = (kwargs.get('data') or {}).get('tag')
+        expand = getattr(self.notify_app, 'notification_calls', None)
+        if expand is not None:
+            items = [(service, _Outgoing(service, data)) for service, data in expand(**kwargs)]
+        else:
+            recipients = kwargs.get('message_recipient')
+            if isinstance(recipients, list):
+                recipients = tuple(recipients)
+            items = [(recipients, _Outgoing(None, kwargs))]
+
+        with self._lock:
+            for recipient, item in items:
+                key = ('tag', tag, recipient) if tag is not None else ('untagged', next(self._order))
+                if key in self._pending:
+                    self.merged += 1
+                self._pending[key] = item
+            if tag is None:
+                self.ADapi.run_in(self._flush, 0, untagged_only = True)
+            else:
+                self._schedule_flush()
+
+    def set_text(self, entity_id:str, value:str, namespace:str) -> None:
+        """ Queues input_text update if text has changed since last update """
+
+        with self._lock:
+            if self._texts.get(entity_id) == value:
+                return
+            self._texts[entity_id] = value
+            self._pending[('text', entity_id)] = _Outgoing('input_text/set_value', {
+                'value': value,
+                'entity_id': entity_id,
+                'namespace': namespace,
+            })
+            self._schedule_flush()
+
+    def _schedule_flush(self, delay: Optional[float] = None) -> None:
+        if self._flush_handler is None:
+            self._flush_handler = self.ADapi.run_in(self._flush, self.coalesce_seconds if delay is None else delay)
+
+    async def _flush(self, kwargs) -> None:
+        with self._lock:
+            if kwargs.get('untagged_only'):
+                # Tagged notifications and texts stay until the coalescing window ends
+                pending = {key: item for key, item in self._pending.items() if key[0] == 'untagged'}
+                for key in pending:
+                    del self._pending[key]
+            else:
+                pending, self._pending = self._pending, {}
+                self._flush_handler = None
+
+        for key, item in pending.items():
+            try:
+                if item.service is not None:
+                    await self.ADapi.call_service(item.service, **item.kwargs)
+                else:
+                    await self.ADapi.run_in_executor(self.notify_app.send_notification, **item.kwargs)
+            except Exception as e:
+                self._failed(key, item, e)
+
+    def _failed(self, key: Hashable, item: _Outgoing, error: Exception) -> None:
+        item.attempts += 1
+        if item.attempts > self.retries:
+            self.ADapi.log(
+                f"Not able to send {item.service or 'notification'} after {item.attempts} attempts: {error}",
+                level = 'WARNING'
+            )
+            if key[0] == 'text':
+                with self._lock:
+                    if self._texts.get(key[1]) == item.kwargs['value']:
+                        del self._texts[key[1]]
+            return
+        self.ADapi.run_in(self._retry, self.retry_delay * 2 ** (item.attempts - 1), key = key, item = item)
+
+    def _retry(self, kwargs) -> None:
+        with self._lock:
+            # A newer message with same key replaces the failed one
+            self._pending.setdefault(kwargs['key'], kwargs['item'])
+            self._schedule_flush(0)
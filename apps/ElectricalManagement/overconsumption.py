@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, List
+
+SWITCH_COST = 0.1 # Added for every action, so fewer actions are preferred when cost is equal
+
+
+@dataclass
+class ReduceOption:
+    """ One way to reduce consumption. Heaters are turned down entirely, chargers can be reduced in whole amps. """
+    target: Any # Heater or Car
+    watt: float # Largest possible reduction
+    cost: float # Comfort or priority cost pr kW reduced
+    divisible: bool = False
+    step_watt: float = 0.0 # Watt pr amp for chargers
+
+    @property
+    def action_cost(self) -> float:
+        return self.watt / 1000 * self.cost + SWITCH_COST
+
+
+def cheapest_reduction(deficit_watt: float, options: List[ReduceOption], resolution: float = 50) -> List[ReduceOption]:
+    """ Returns the set of options with lowest total cost that together reduces at least *deficit_watt*,
+        as a 0/1 knapsack over watt in steps of *resolution*. If all options together are not enough,
+        all are returned. Options are returned cheapest first. """
+
+    options = [o for o in options if o.watt > 0]
+    if deficit_watt <= 0 or not options:
+        return []
+    if sum(o.watt for o in options) <= deficit_watt:
+        return sorted(options, key=lambda o: o.cost)
+
+    size = math.ceil(deficit_watt / resolution)
+    INF = float('inf')
+    cost = [0.0] + [INF] * size
+    chosen: List[List[int]] = [[] for _ in range(size + 1)]
+
+    for i, option in enumerate(options):
+        units = max(1, int(option.watt // resolution))
+        action_cost = option.action_cost
+        for covered in range(size, -1, -1):
+            if cost[covered] == INF:
+                continue
+            target = min(size, covered + units)
+            if cost[covered] + action_cost < cost[target]:
+                cost[target] = cost[covered] + action_cost
+                chosen[target] = chosen[covered] + [i]
+
+    if cost[size] == INF:
+        return sorted(options, key=lambda o: o.cost)
+    return sorted((options[i] for i in chosen[size]), key=lambda o: o.cost)
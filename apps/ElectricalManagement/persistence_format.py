@@ -0,0 +1,161 @@
+""" Compact binary format for persistent data.
+
+    The document is the same as the json file, with some changes before it is compressed:
+    lists of dicts with the same keys, and dicts of dicts with the same keys like the consumption grids,
+    are stored as columns, and long lists of numbers are stored as packed arrays after the json part.
+    Decoding gives back exactly the json document.
+
+    Convert between formats with:
+        python persistence_format.py to-json electricalmanagement.bin electricalmanagement.json
+        python persistence_format.py to-binary electricalmanagement.json electricalmanagement.bin
+"""
+from __future__ import annotations
+
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Tuple
+
+MAGIC = b'EMPB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHI') # magic, format version, schema version, length of json part
+MIN_ARRAY_LENGTH = 64
+
+ARRAY_KEY = '$array'
+COLUMNS_KEY = '$columns'
+ROWS_KEY = '$rows'
+
+
+class BinaryFormatError(ValueError):
+    """ Raised when a file is not in the binary persistence format or is written by a newer version. """
+
+
+def is_binary(content: bytes) -> bool:
+    return content[:len(MAGIC)] == MAGIC
+
+
+def _numbers_typecode(values: list) -> str | None:
+    if len(values) < MIN_ARRAY_LENGTH:
+        return None
+    if all(type(v) is float for v in values):
+        return 'd'
+    if all(type(v) is int for v in values):
+        if all(-2**63 <= v < 2**63 for v in values):
+            return 'q'
+    return None
+
+
+def _can_be_columns(values) -> bool:
+    """ True if *values* are two or more non-empty dicts with the same keys in the same order and only scalar values. """
+    if len(values) < 2 or not all(type(v) is dict for v in values):
+        return False
+    keys = list(values[0])
+    if not keys:
+        return False
+    return all(
+        list(v) == keys
+        and not any(isinstance(x, (dict, list)) for x in v.values())
+        for v in values
+    )
+
+
+def _columns(rows: list, blobs: bytearray) -> list:
+    keys = list(rows[0])
+    return [_pack([row[key] for row in rows], blobs) for key in keys]
+
+
+def _pack(value: Any, blobs: bytearray) -> Any:
+    if isinstance(value, dict):
+        rows = list(value.values())
+        if _can_be_columns(rows):
+            return {
+                ROWS_KEY: list(value),
+                COLUMNS_KEY: list(rows[0]),
+                'values': _columns(rows, blobs),
+            }
+        return {key: _pack(v, blobs) for key, v in value.items()}
+    if isinstance(value, list):
+        typecode = _numbers_typecode(value)
+        if typecode is not None:
+            packed = array(typecode, value).tobytes()
+            offset = len(blobs)
+            blobs.extend(packed)
+            return {ARRAY_KEY: typecode, 'offset': offset, 'count': len(value)}
+        if _can_be_columns(value):
+            return {
+                COLUMNS_KEY: list(value[0]),
+                'values': _columns(value, blobs),
+            }
+        return [_pack(v, blobs) for v in value]
+    return value
+
+
+def _unpack(value: Any, blobs: memoryview) -> Any:
+    if isinstance(value, dict):
+        if ARRAY_KEY in value:
+            typecode = value[ARRAY_KEY]
+            values = array(typecode)
+            start = value['offset']
+            values.frombytes(blobs[start:start + value['count'] * values.itemsize])
+            return values.tolist()
+        if COLUMNS_KEY in value:
+            keys = value[COLUMNS_KEY]
+            columns = [_unpack(column, blobs) for column in value['values']]
+            rows = [dict(zip(keys, row)) for row in zip(*columns)]
+            if ROWS_KEY in value:
+                return dict(zip(value[ROWS_KEY], rows))
+            return rows
+        return {key: _unpack(v, blobs) for key, v in value.items()}
+    if isinstance(value, list):
+        return [_unpack(v, blobs) for v in value]
+    return value
+
+
+def encode(document: dict, schema_version:int = 0) -> bytes:
+    """ Returns the json document in binary format. """
+
+    blobs = bytearray()
+    packed = _pack(document, blobs)
+    json_part = json.dumps(packed, separators = (',', ':')).encode('utf-8')
+    body = zlib.compress(json_part + bytes(blobs), 1)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, schema_version, len(json_part)) + body
+
+
+def decode(content: bytes) -> Tuple[dict, int]:
+    """ Returns the json document and the schema version it was written with.
+        zlib checks the content, so a damaged file raises instead of returning wrong data. """
+
+    if len(content) < HEADER.size or not is_binary(content):
+        raise BinaryFormatError("Not a binary persistence file")
+    magic, format_version, schema_version, json_length = HEADER.unpack_from(content)
+    if format_version > FORMAT_VERSION:
+        raise BinaryFormatError(f"Binary persistence format version {format_version} is not supported")
+    try:
+        body = zlib.decompress(content[HEADER.size:])
+    except zlib.error as e:
+        raise BinaryFormatError(f"Damaged binary persistence file: {e}") from e
+    document = json.loads(body[:json_length])
+    return _unpack(document, memoryview(body)[json_length:]), schema_version
+
+
+def _main(argv: list) -> int:
+    if len(argv) != 3 or argv[0] not in ('to-json', 'to-binary'):
+        print("Usage: persistence_format.py to-json|to-binary <input> <output>")
+        return 2
+    command, source, target = argv
+    with open(source, 'rb') as f:
+        content = f.read()
+    if command == 'to-json':
+        document, _ = decode(content)
+        with open(target, 'w') as f:
+            json.dump(document, f, indent = 4, ensure_ascii = False)
+    else:
+        with open(target, 'wb') as f:
+            f.write(encode(json.loads(content)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
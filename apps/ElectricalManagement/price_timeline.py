@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import weakref
+from typing import List, Optional, Tuple
+
+
+class PriceTimeline:
+    """ Local copy of price slots from electricalPriceApp, built once pr price update.
+        Keeps index of current slot and moves it forward at slot boundaries,
+        so price now, next slot and remaining slots does not need calls to the price app.
+        App instances using the same price app share one timeline through shared(). """
+
+    _shared: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+    _shared_lock = threading.Lock()
+
+    def __init__(self, electricalPriceApp):
+        self.electricalPriceApp = electricalPriceApp
+        self.starts: List = []
+        self.ends: List = []
+        self.prices: List[Optional[float]] = []
+        self.idx:int = -1
+        self._lock = threading.RLock()
+
+    @classmethod
+    def shared(cls, electricalPriceApp) -> PriceTimeline:
+        """ Returns the timeline for *electricalPriceApp*, and creates it if no instance holds one. """
+
+        with cls._shared_lock:
+            timeline = cls._shared.get(id(electricalPriceApp))
+            if timeline is None or timeline.electricalPriceApp is not electricalPriceApp:
+                timeline = cls(electricalPriceApp)
+                cls._shared[id(electricalPriceApp)] = timeline
+            return timeline
+
+    def refresh(self) -> None:
+        """ Rebuild timeline from electricalPriceApp.elpricestoday. """
+
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        items = list(getattr(self.electricalPriceApp, 'elpricestoday', None) or [])
+        self.starts = [item.start for item in items]
+        self.ends = [item.end for item in items]
+        self.prices = [getattr(item, 'price', None) for item in items]
+        self.idx = -1
+
+    def _current_index(self, now) -> int:
+        """ Returns index of slot containing *now* or -1. Rebuilds once if *now* is outside timeline. """
+
+        if not self._inside(now):
+            self._find(now)
+            if not self._inside(now):
+                self._refresh()
+                self._find(now)
+                if not self._inside(now):
+                    return -1
+
+        while self.ends[self.idx] <= now:
+            self.idx += 1
+        return self.idx
+
+    def _inside(self, now) -> bool:
+        return (
+            0 <= self.idx < len(self.starts)
+            and self.starts[self.idx] <= now < self.ends[-1]
+        )
+
+    def _find(self, now) -> None:
+        self.idx = bisect.bisect_right(self.starts, now) - 1
+
+    def price_now(self, now) -> float:
+        """ Returns price for the slot *now* is in. Asks price app only the first time in a slot without price. """
+
+        with self._lock:
+            idx = self._current_index(now)
+            if idx == -1:
+                return self.electricalPriceApp.electricity_price_now()
+            if self.prices[idx] is None:
+                self.prices[idx] = self.electricalPriceApp.electricity_price_now()
+            return self.prices[idx]
+
+    def next_slot(self, now) -> Optional[Tuple]:
+        """ Returns (start, end, price) for the slot after the one *now* is in, or ``None``. """
+
+        with self._lock:
+            idx = self._current_index(now)
+            if idx == -1 or idx + 1 >= len(self.starts):
+                return None
+            return self.starts[idx + 1], self.ends[idx + 1], self.prices[idx + 1]
+
+    def remaining_slots(self, now) -> int:
+        """ Returns number of slots after the one *now* is in. """
+
+        with self._lock:
+            idx = self._current_index(now)
+            if idx == -1:
+                return 0
+            return len(self.starts) - idx - 1
+
+    def slot_duration_seconds(self) -> float:
+        """ Returns duration of the first slot in seconds, or one hour if timeline is empty. """
+
+        with self._lock:
+            if not self.starts:
+                self._refresh()
+            if not self.starts:
+                return 3600.0
+            return (self.ends[0] - self.starts[0]).total_seconds()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import cProfile
+import inspect
+import io
+import os
+import pstats
+import threading
+from functools import wraps
+from typing import Callable, Optional
+
+from api_proxy import ADAPIProxy
+
+
+class ProfileCapture:
+    """ Profiles the next *calls* invocations of wrapped functions with cProfile when started,
+        and writes the aggregated stats as .pstats and a text summary of the top functions.
+        Wrapped functions only check a flag while capture is not running.
+        Nested wrapped calls are part of the outermost profile. """
+
+    def __init__(self, ADapi, directory:str = '.', calls:int = 100, top:int = 40):
+        self.ADapi = ADapi
+        self.directory = directory
+        self.calls = calls
+        self.top = top
+        self.on_finished: Optional[Callable[[], None]] = None
+
+        self.active:bool = False
+        self._remaining:int = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start(self, calls: Optional[int] = None) -> None:
+        with self._lock:
+            self._remaining = calls or self.calls
+            self._stats = None
+            self.active = True
+        self.ADapi.log(f"Profiling next {self._remaining} callbacks", level = 'INFO')
+
+    def stop(self) -> Optional[str]:
+        """ Stops capture and writes stats. Returns path to .pstats file, or None if nothing was captured """
+
+        with self._lock:
+            if not self.active:
+                return None
+            self.active = False
+            stats, self._stats = self._stats, None
+        path = self._write(stats) if stats is not None else None
+        if self.on_finished is not None:
+            self.on_finished()
+        return path
+
+    def wrap(self, func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func) or getattr(func, '_profiled', False):
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.active or getattr(self._local, 'running', False):
+                return func(*args, **kwargs)
+            self._local.running = True
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(func, *args, **kwargs)
+            finally:
+                self._local.running = False
+                self._add(profile)
+
+        wrapper._profiled = True
+        return wrapper
+
+    def _add(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if not self.active:
+                return
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._remaining -= 1
+            done = self._remaining <= 0
+        if done:
+            self.stop()
+
+    def _write(self, stats: pstats.Stats) -> str:
+        name = f"profile_{self.ADapi.datetime(aware = True):%Y%m%d_%H%M%S}"
+        path = os.path.join(self.directory, name)
+        stats.dump_stats(path + '.pstats')
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats('cumulative').print_stats(self.top)
+        with open(path + '.txt', 'w', encoding = 'utf-8') as f:
+            f.write(summary.getvalue())
+
+        self.ADapi.log(f"Profile written to {path}.pstats and {path}.txt", level = 'INFO')
+        return path + '.pstats'
+
+
+class ProfiledADAPI(ADAPIProxy):
+    """ Wraps the AppDaemon api so listen_state callbacks are profiled while a capture runs """
+
+    wrap_callbacks = ('listen_state',)
+
+    def __init__(self, ADapi, capture: ProfileCapture):
+        super().__init__(ADapi)
+        self._capture = capture
+
+    def wrap_callback(self, callback: Callable) -> Callable:
+        return self._capture.wrap(callback)
@@ -3,11 +3,75 @@
 
 from __future__ import annotations
 from datetime import datetime, timedelta
+import hashlib
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union, Callable
-from pydantic import BaseModel, Field, conlist, conint
-from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, List, Optional, Tuple, Union, Callable
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError, conlist, conint
+from pydantic_core import from_json
+from dataclasses import dataclass, field
+
+import persistence_format
+
+MINUTES_PR_WEEK = 7 * 24 * 60
+BASELINE_TEMP_MIN = -30
+BASELINE_TEMP_MAX = 30
+BASELINE_TEMP_BUCKETS = (BASELINE_TEMP_MAX - BASELINE_TEMP_MIN) // 2 + 1
+BASELINE_SIZE = 7 * 24 * BASELINE_TEMP_BUCKETS
+
+# Bump when a change in the models makes files written by an older version unsafe to load without validation
+PERSISTENCE_SCHEMA_VERSION = 1
+
+
+class LazyFieldsModel(BaseModel):
+    """ Model where fields in ``lazy_fields`` can be kept as raw json data when loaded from a trusted file,
+        and are validated on first access. """
+    lazy_fields: ClassVar[Tuple[str, ...]] = ()
+    _pending: Dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    def __getattr__(self, name: str) -> Any:
+        private = self.__pydantic_private__
+        if private and name in private.get('_pending', ()):
+            raw = private['_pending'].pop(name)
+            self.__pydantic_validator__.validate_assignment(self, name, raw)
+            # Keep field order so the file is written the same way it was read
+            fields = self.__dict__
+            ordered = {key: fields[key] for key in type(self).model_fields if key in fields}
+            fields.clear()
+            fields.update(ordered)
+            return fields[name]
+        return super().__getattr__(name)
+
+    @classmethod
+    def construct_trusted(cls, raw: dict):
+        """ Validates all fields except ``lazy_fields``, which are validated on first access. """
+        pending = {}
+        data = dict(raw)
+        for name in cls.lazy_fields:
+            alias = cls.model_fields[name].alias or name
+            if alias in data:
+                pending[name] = data.pop(alias)
+        obj = cls.model_validate(data)
+        for name in pending:
+            del obj.__dict__[name]
+        obj._pending.update(pending)
+        return obj
+
+    def validate_pending(self) -> None:
+        """ Validates all fields still waiting as raw data. """
+        for name in list(self._pending):
+            if name in self.__dict__:
+                self._pending.pop(name) # Replaced before it was read
+            else:
+                getattr(self, name)
+
+    def model_dump(self, **kwargs) -> dict:
+        self.validate_pending()
+        return super().model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs) -> str:
+        self.validate_pending()
+        return super().model_dump_json(**kwargs)
 
 
 class MaxUsage(BaseModel):
@@ -17,7 +81,7 @@ class MaxUsage(BaseModel):
 
 class HighConsumptionHour(BaseModel):
     high_consumption_hours: conlist(
-        conint(ge=6, le=22)
+        conint(ge=0, le=23)
     ) = Field(default_factory=list)
 
 class TempConsumption(BaseModel):
@@ -30,6 +94,16 @@ class IdleBlock(BaseModel):
     ConsumptionData: Dict[int, TempConsumption] = Field(default_factory=dict)
 
 
+class LoadProfile(BaseModel):
+    """ Expected base load in watt for every minute of the week, starting monday 00:00 """
+    Consumption: List[float] = Field(default_factory=lambda: [0.0] * MINUTES_PR_WEEK)
+    Counter: List[int] = Field(default_factory=lambda: [0] * MINUTES_PR_WEEK)
+
+class BaselineProfile(BaseModel):
+    """ Expected base load in watt pr weekday, hour of day and outside temperature in steps of 2 degrees """
+    Consumption: List[float] = Field(default_factory=lambda: [0.0] * BASELINE_SIZE)
+    Counter: List[int] = Field(default_factory=lambda: [0] * BASELINE_SIZE)
+
 class PeakHour(BaseModel):
     start: datetime
     end: datetime
@@ -38,7 +112,9 @@ class PeakHour(BaseModel):
 class WeatherData(BaseModel):
     out_temp: float = 10.0
 
-class HeaterBlock(BaseModel):
+class HeaterBlock(LazyFieldsModel):
+    lazy_fields: ClassVar[Tuple[str, ...]] = ('ConsumptionData',)
+
     heater: str | None = None
     consumptionSensor: str | None = None
     validConsumptionSensor: bool | None = None
@@ -154,15 +230,15 @@ class ChargingQueueItem(BaseModel):
             exclude_none=True
         )
 
-@dataclass(order=True)
+@dataclass(order=True, slots=True)
 class WattSlot:
     start: datetime
     end: datetime
     available_Wh: float
+    duration_hours: float = field(init=False, repr=False, compare=False) # Not persisted
 
-    @property
-    def duration_hours(self) -> float:
-        return (self.end - self.start).total_seconds() / 3600.0
+    def __post_init__(self) -> None:
+        self.duration_hours = (self.end - self.start).total_seconds() / 3600.0
 
 @dataclass(frozen=True)
 class Decision:
@@ -171,10 +247,14 @@ class Decision:
     action:   Callable[[], None]
 
 
-class PersistenceData(BaseModel):
+class PersistenceData(LazyFieldsModel):
+    lazy_fields: ClassVar[Tuple[str, ...]] = ('idle_usage', 'available_watt')
+
     max_usage: MaxUsage = Field(alias="MaxUsage", default_factory=MaxUsage)
     high_consumption: HighConsumptionHour = Field(alias="HighConsumptionHour", default_factory=HighConsumptionHour)
     idle_usage: IdleBlock = Field(alias="IdleUsage", default_factory=IdleBlock)
+    load_profile: LoadProfile = Field(alias="LoadProfile", default_factory=LoadProfile)
+    baseline_profile: BaselineProfile = Field(alias="BaselineProfile", default_factory=BaselineProfile)
     charger: Dict[str, ChargerData] = Field(alias="charger", default_factory=dict)
     car: Dict[str, CarData] = Field(alias="carName", default_factory=dict)
     heater: Dict[str, HeaterBlock] = Field(alias="heater", default_factory=dict)
@@ -188,7 +268,7 @@ class PersistenceData(BaseModel):
         "arbitrary_types_allowed": True,
         "populate_by_name": False,
         "json_encoders": {   # <‑‑ tell pydantic how to serialise a WattSlot
-            WattSlot: lambda ws: ws.__dict__,
+            WattSlot: lambda ws: {'start': ws.start, 'end': ws.end, 'available_Wh': ws.available_Wh},
         },
     }
 
@@ -196,19 +276,144 @@ class PersistenceData(BaseModel):
         """ Return  ``True`` if at least one collection is non empty. """
         return bool(self.car) or bool(self.charger) or bool(self.heater)
 
+    def validate_pending(self) -> None:
+        super().validate_pending()
+        for heater_block in self.heater.values():
+            heater_block.validate_pending()
+
+    @classmethod
+    def construct_trusted(cls, raw: dict) -> PersistenceData:
+        """ Builds PersistenceData from a file this app wrote itself.
+            Learned profiles are fixed size lists of numbers and are used as is,
+            heater consumption data, idle consumption and available watt are validated on first access. """
+        data = dict(raw)
+        heaters = data.get('heater') or {}
+        data['heater'] = {name: HeaterBlock.construct_trusted(block) for name, block in heaters.items()}
+        if 'LoadProfile' in data:
+            data['LoadProfile'] = LoadProfile.model_construct(**data['LoadProfile'])
+        if 'BaselineProfile' in data:
+            data['BaselineProfile'] = BaselineProfile.model_construct(**data['BaselineProfile'])
+        return super().construct_trusted(data)
+
+def _is_number_list(value: Any) -> bool:
+    return isinstance(value, list) and all(type(item) in (int, float) for item in value)
+
+def _dumps_json(value: Any, level: int = 0) -> str:
+    """Indented JSON where lists of numbers, like the load profile arrays, are written on one line
+    instead of one number pr line."""
+    indent = '    ' * (level + 1)
+    if isinstance(value, dict) and value:
+        items = [f"{indent}{json.dumps(str(key), ensure_ascii=False)}: {_dumps_json(item, level + 1)}" for key, item in value.items()]
+    elif isinstance(value, list) and not _is_number_list(value):
+        items = [f"{indent}{_dumps_json(item, level + 1)}" for item in value]
+    else:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    brackets = '{}' if isinstance(value, dict) else '[]'
+    return brackets[0] + '\n' + ',\n'.join(items) + '\n' + '    ' * level + brackets[1]
+
 def _json_path(path: str) -> Path:
     return Path(path).expanduser()
 
-def load_persistence(path: str) -> PersistenceData:
-    """Load a JSON file into a typed PersistenceData instance."""
+def _header_path(path: str) -> Path:
+    json_path = _json_path(path)
+    return json_path.with_name(json_path.name + '.header')
+
+def _checksum(content: bytes) -> str:
+    return hashlib.blake2b(content, digest_size = 16).hexdigest()
+
+def _read_header(path: str) -> dict:
+    try:
+        with open(_header_path(path), 'r') as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return header if isinstance(header, dict) else {}
+
+def _binary_path(path: str) -> Path:
+    return _json_path(path).with_suffix('.bin')
+
+def _load_binary(path: str) -> Optional[PersistenceData]:
+    """Load the binary file if it exists. Returns ``None`` if there is no binary file."""
+    try:
+        with open(_binary_path(path), 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+
+    document, schema_version = persistence_format.decode(content)
+    if schema_version == PERSISTENCE_SCHEMA_VERSION:
+        try:
+            return PersistenceData.construct_trusted(document)
+        except (ValueError, ValidationError):
+            pass
+    return PersistenceData.model_validate(document)
+
+def persistence_files(path: str) -> List[Path]:
+    """Files that can hold persistence for *path*: JSON, JSON header and binary."""
+    return [_json_path(path), _header_path(path), _binary_path(path)]
+
+def persistence_exists(path: str) -> bool:
+    """Return ``True`` if a JSON or binary persistence file exists for *path*."""
+    return _json_path(path).exists() or _binary_path(path).exists()
+
+def load_persistence(path: str, binary: bool = False, warn: Optional[Callable[[str], None]] = None) -> PersistenceData:
+    """Load a JSON file into a typed PersistenceData instance.
+    Files written by this app with the same schema version and an unchanged checksum are trusted
+    and loaded without validating the heavy sections until they are used.
+    Any other file is fully validated.
+    With *binary* the compact file next to the JSON is used, falling back to the JSON if it does not exist yet.
+    Without *binary* the compact file is used if there is no JSON, as only one of them is kept.
+    A damaged compact file is renamed to ``.damaged`` and reported with *warn*."""
+    if binary or not _json_path(path).exists():
+        try:
+            persistence = _load_binary(path)
+        except (ValueError, KeyError, TypeError) as e:
+            # Damaged or unreadable binary file. ValidationError and BinaryFormatError are ValueErrors
+            persistence = None
+            damaged_path = _binary_path(path).with_name(_binary_path(path).name + '.damaged')
+            _binary_path(path).replace(damaged_path)
+            if warn is not None:
+                warn(f"Persistence in {_binary_path(path)} is damaged and is kept as {damaged_path}. {e}")
+        if persistence is not None:
+            return persistence
+
     try:
-        return PersistenceData.parse_file(_json_path(path))
+        with open(_json_path(path), 'rb') as f:
+            content = f.read()
     except FileNotFoundError:
         persistence = PersistenceData()
-        dump_persistence(path, persistence)
+        dump_persistence(path, persistence, binary = binary)
         return persistence
 
-def dump_persistence(path: str, data: PersistenceData) -> None:
-    """Write the PersistenceData back to JSON."""
-    with open(_json_path(path), 'w') as f:
-        f.write(data.model_dump_json(exclude_none=True, by_alias=True, indent=4))
+    header = _read_header(path)
+    if (
+        header.get('schema_version') == PERSISTENCE_SCHEMA_VERSION
+        and header.get('checksum') == _checksum(content)
+    ):
+        try:
+            return PersistenceData.construct_trusted(from_json(content, cache_strings = 'keys'))
+        except (ValueError, ValidationError):
+            pass
+    return PersistenceData.model_validate_json(content)
+
+def dump_persistence(path: str, data: PersistenceData, binary: bool = False) -> None:
+    """Write the PersistenceData back to JSON, with a header file holding schema version and checksum.
+    With *binary* the data is written to the compact file instead.
+    Files in the other format are removed, so an old copy is never loaded in place of the current data."""
+    if binary:
+        document = data.model_dump(mode='json', exclude_none=True, by_alias=True)
+        with open(_binary_path(path), 'wb') as f:
+            f.write(persistence_format.encode(document, schema_version = PERSISTENCE_SCHEMA_VERSION))
+        _json_path(path).unlink(missing_ok = True)
+        _header_path(path).unlink(missing_ok = True)
+        return
+
+    content = _dumps_json(data.model_dump(mode='json', exclude_none=True, by_alias=True)).encode('utf-8')
+    with open(_json_path(path), 'wb') as f:
+        f.write(content)
+    with open(_header_path(path), 'w') as f:
+        json.dump({
+            'schema_version': PERSISTENCE_SCHEMA_VERSION,
+            'checksum': _checksum(content),
+        }, f)
+    _binary_path(path).unlink(missing_ok = True)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic_models import ChargingQueueItem
+
+ORDERS = ('priority', 'edf')
+
+
+def _time_key(dt) -> Tuple[int, float]:
+    return (1, 0.0) if dt is None else (0, dt.timestamp())
+
+
+def _priority_bucket(priority: int) -> int:
+    """ Priority 1-4 is kept. Everything else is handled last, as priority 5 """
+    return priority if 1 <= priority <= 4 else 5
+
+
+class ReadyQueue:
+    """ Index over the charging queue to find next vehicle to start in O(log n).
+        Jobs wait in a heap ordered by chargingStart, and move to a ready heap when their charging time starts.
+        The ready heap is ordered by (priority, chargingStart, finish_by_hour), or by earliest deadline first
+        with order 'edf'. Removed, charging and replanned entries are skipped lazily when they reach the top.
+        The index is rebuilt from the queue after it is invalidated. """
+
+    def __init__(self, order:str = 'priority'):
+        self.order = order if order in ORDERS else 'priority'
+        self._dirty:bool = True
+        self._seq:int = 0
+        self._items: Dict[str, Tuple[int, ChargingQueueItem]] = {}
+        self._charging: Set[str] = set()
+        self._waiting: List[tuple] = [] # (chargingStart, seq, vehicle_id)
+        self._ready: List[tuple] = []   # (order key, seq, vehicle_id)
+        self._all: List[tuple] = []     # (order key, seq, vehicle_id) regardless of charging time
+
+    def invalidate(self) -> None:
+        """ Call when jobs are added, removed or get new charging times """
+        self._dirty = True
+
+    def _order_key(self, item: ChargingQueueItem) -> tuple:
+        if self.order == 'edf':
+            return (_time_key(item.chargingStop), item.finish_by_hour, _priority_bucket(item.priority), _time_key(item.chargingStart))
+        return (_priority_bucket(item.priority), _time_key(item.chargingStart), item.finish_by_hour)
+
+    def rebuild(self, queue: Iterable[ChargingQueueItem]) -> None:
+        self._items.clear()
+        self._waiting = []
+        self._ready = []
+        self._all = []
+        for item in queue:
+            self._push(item)
+        heapq.heapify(self._waiting)
+        heapq.heapify(self._all)
+        self._dirty = False
+
+    def _push(self, item: ChargingQueueItem) -> None:
+        self._seq += 1
+        seq = self._seq
+        self._items[item.vehicle_id] = (seq, item)
+        key = self._order_key(item)
+        self._all.append((key, seq, item.vehicle_id))
+        if item.chargingStart is not None and item.chargingStop is not None:
+            self._waiting.append((item.chargingStart, seq, item.vehicle_id))
+
+    def mark_charging(self, vehicle_id: str) -> None:
+        self._charging.add(vehicle_id)
+
+    def unmark_charging(self, vehicle_id: str) -> None:
+        """ Vehicle stopped charging and can be started again """
+
+        if vehicle_id not in self._charging:
+            return
+        self._charging.discard(vehicle_id)
+        entry = self._items.get(vehicle_id)
+        if entry is None or self._dirty:
+            return
+        seq, item = entry
+        key = self._order_key(item)
+        # Charging entries were dropped from the heaps when they reached the top
+        heapq.heappush(self._all, (key, seq, vehicle_id))
+        if item.chargingStart is not None and item.chargingStop is not None:
+            heapq.heappush(self._waiting, (item.chargingStart, seq, vehicle_id))
+
+    def _valid(self, seq: int, vehicle_id: str) -> bool:
+        entry = self._items.get(vehicle_id)
+        return entry is not None and entry[0] == seq and vehicle_id not in self._charging
+
+    def next_ready(self, now, queue: Iterable[ChargingQueueItem]) -> Optional[str]:
+        """ Returns vehicle with highest order among those in charging time that is not charging """
+
+        if self._dirty:
+            self.rebuild(queue)
+
+        while self._waiting and self._waiting[0][0] <= now:
+            start, seq, vehicle_id = heapq.heappop(self._waiting)
+            if self._valid(seq, vehicle_id):
+                item = self._items[vehicle_id][1]
+                heapq.heappush(self._ready, (self._order_key(item), seq, vehicle_id))
+
+        while self._ready:
+            key, seq, vehicle_id = self._ready[0]
+            item = self._items.get(vehicle_id, (None, None))[1]
+            if (
+                not self._valid(seq, vehicle_id)
+                or item.chargingStop is None
+                or item.chargingStop <= now
+            ):
+                heapq.heappop(self._ready)
+                continue
+            return vehicle_id
+        return None
+
+    def next_any(self, queue: Iterable[ChargingQueueItem]) -> Optional[str]:
+        """ Returns vehicle with highest order that is not charging, regardless of charging time """
+
+        if self._dirty:
+            self.rebuild(queue)
+
+        while self._all:
+            key, seq, vehicle_id = self._all[0]
+            if not self._valid(seq, vehicle_id):
+                heapq.heappop(self._all)
+                continue
+            return vehicle_id
+        return None
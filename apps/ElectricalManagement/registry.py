@@ -3,41 +3,55 @@ from __future__ import annotations
 
 from typing import Dict, Optional
 
+from thread_safety import NO_LOCK, serialized
+
+# Methods that change registry or links. Wrapped to hold the instance state lock
+_MUTATORS = (
+    'register_car',
+    'register_charger',
+    'set_onboard_link',
+    'set_link',
+    'unlink',
+    'unlink_by_charger',
+    'relink_to_onboard',
+)
+
+
 class Registry:
-    _cars: Dict[str, "Car"] = {}
-    _chargers: Dict[str, "Charger"] = {}
+    """ Cars and chargers for one ElectricalUsage instance.
+        Mutators hold the instance state lock, so links are changed by one callback at a time. """
 
+    def __init__(self, lock = NO_LOCK):
+        self.lock = lock
+        self._cars: Dict[str, "Car"] = {}
+        self._chargers: Dict[str, "Charger"] = {}
+        for name in _MUTATORS:
+            setattr(self, name, serialized(getattr(self, name), self.lock))
 
-    @classmethod
-    def register_car(cls, car: "Car") -> None:
-        """Store a Car instance in the global registry."""
-        cls._cars[car.vehicle_id] = car
+    def register_car(self, car: "Car") -> None:
+        """Store a Car instance in the registry."""
+        self._cars[car.vehicle_id] = car
 
-    @classmethod
-    def register_charger(cls, charger: "Charger") -> None:
-        """Store a Charger instance in the global registry."""
-        cls._chargers[charger.charger_id] = charger
+    def register_charger(self, charger: "Charger") -> None:
+        """Store a Charger instance in the registry."""
+        self._chargers[charger.charger_id] = charger
 
-    @classmethod
-    def get_car(cls, vehicle_id: str) -> Optional["Car"]:
+    def get_car(self, vehicle_id: str) -> Optional["Car"]:
         """Return the Car instance for the given ID, or ``None``."""
-        return cls._cars.get(vehicle_id)
+        return self._cars.get(vehicle_id)
 
-    @classmethod
-    def get_charger(cls, charger_id: str) -> Optional["Charger"]:
+    def get_charger(self, charger_id: str) -> Optional["Charger"]:
         """Return the Charger instance for the given ID, or ``None``."""
-        return cls._chargers.get(charger_id)
+        return self._chargers.get(charger_id)
 
-    @classmethod
-    def set_onboard_link(cls, car: "Car", charger: "Charger") -> None:
+    def set_onboard_link(self, car: "Car", charger: "Charger") -> None:
         """
         Link a car to a onboard charger
         """
         charger.connected_vehicle = car
         car.onboard_charger = charger
 
-    @classmethod
-    def set_link(cls, car: "Car", charger: "Charger") -> None:
+    def set_link(self, car: "Car", charger: "Charger") -> None:
         """
         Link a car and a charger both in memory and in the persistent
         data structures.
@@ -53,8 +67,7 @@ class Registry:
         # Persist the IDs for next restart
         car.car_data.connected_charger_id = charger.charger_id
 
-    @classmethod
-    def unlink(cls, car: "Car") -> Optional["Charger"]:
+    def unlink(self, car: "Car") -> Optional["Charger"]:
         """
         Remove the association between a car and its charger.
 
@@ -74,8 +87,7 @@ class Registry:
 
         return charger
 
-    @classmethod
-    def unlink_by_charger(cls, charger: "Charger") -> Optional["Car"]:
+    def unlink_by_charger(self, charger: "Charger") -> Optional["Car"]:
         """
         Symmetric to :meth:`unlink`.  Removes the link that the charger
         has to its car, if any.
@@ -86,10 +98,9 @@ class Registry:
         car = getattr(charger, "connected_vehicle", None)
         if car is None:
             return None
-        return cls.unlink(car)
+        return self.unlink(car)
 
-    @classmethod
-    def relink_to_onboard(cls, charger: "Charger") -> Optional["Car"]:
+    def relink_to_onboard(self, charger: "Charger") -> Optional["Car"]:
         """
         Symmetric to :meth:`unlink`.  Removes the link that the charger
         has to its car, if any.
@@ -100,8 +111,8 @@ class Registry:
         car = getattr(charger, "connected_vehicle", None)
         if car is None:
             return None
-        charger_to_return = cls.unlink(car)
+        charger_to_return = self.unlink(car)
         onboard = getattr(car, "onboard_charger", None)
         if onboard is not None:
-            cls.set_link(car, onboard)
-        return charger_to_return
\ No newline at end of file
+            self.set_link(car, onboard)
+        return charger_to_return
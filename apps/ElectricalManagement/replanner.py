@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic_models import ChargingQueueItem, PeakHour
+from scheduler import PLANNED_FIELDS, PlanState
+
+# Fields set when a job is replanned. Only these are copied from a new plan to the active queue
+REPLANNED_FIELDS = ('kWhRemaining', 'estHourCharge') + PLANNED_FIELDS
+
+
+@dataclass
+class HeaterSnapshot:
+    """ Heater settings used to find save and spend windows, copied when the run starts """
+    heater: str
+    pricedrop: float
+    max_continuous_hours: int
+    on_for_minimum: int
+    pricedifference_increase: float
+    reset_continuous_hours: bool
+    previous_save_hours: list
+    priceincrease: Optional[float] = None # Set when heater also heats extra before expensive hours
+
+
+@dataclass
+class PlanSnapshot:
+    run_id: int
+    deadline: float
+    queue_version: int
+    queue: List[ChargingQueueItem]
+    heaters: List[HeaterSnapshot]
+    state: PlanState
+
+
+@dataclass
+class PlanResult:
+    run_id: int
+    queue_version: int
+    queue: Optional[List[ChargingQueueItem]] = None
+    simultaneous_complete: List[str] = field(default_factory=list)
+    time_to_save: Dict[str, List[PeakHour]] = field(default_factory=dict)
+    time_to_spend: Dict[str, list] = field(default_factory=dict)
+    save_endHour: Optional[datetime] = None
+    complete: bool = True
+
+
+class PlanReplanner:
+    """ Receding horizon planning. Every replan_interval minutes all queued cars are planned again with current
+        state of charge, latest available_watt and prices, and heater save windows are found again.
+        Planning runs on a snapshot with the schedule offloader, and does not read or change the live queue,
+        heaters, price app or scheduler state. The result is applied in an AppDaemon callback. A newer run makes older runs stop at the next step, and only changes
+        from the active plan are applied. plan_version increases every time a change is applied. """
+
+    def __init__(self, api,
+        scheduler,
+        heaters: list,
+        offloader,
+        registry,
+        time_budget:float = 10,
+    ):
+        self.ADapi = api
+        self.scheduler = scheduler
+        self.heaters = heaters
+        self.offloader = offloader
+        self.registry = registry
+        self.time_budget = time_budget
+
+        self.plan_version:int = 0
+        self._run_id:int = 0
+        self._future = None
+
+    def replan(self, kwargs) -> None:
+        """ Starts a new planning run and cancels the previous if it has not started yet """
+
+        self._run_id += 1
+        if self._future is not None:
+            self._future.cancel()
+
+        snapshot = PlanSnapshot(
+            run_id = self._run_id,
+            deadline = time.monotonic() + self.time_budget,
+            queue_version = self.scheduler.queue_version,
+            queue = [self._refreshed_copy(item) for item in self.scheduler.chargingQueue],
+            heaters = [self._heater_snapshot(heater) for heater in self.heaters],
+            state = self.scheduler.plan_state(),
+        )
+        self._future = self.offloader.submit(self._plan, snapshot, self._apply, name = 'charging and heater plan')
+
+    def _refreshed_copy(self, item: ChargingQueueItem) -> ChargingQueueItem:
+        copy = item.model_copy()
+        car = self.registry.get_car(item.vehicle_id)
+        if car is None or not car.car_data.battery_sensor or not car.car_data.charge_limit:
+            return copy
+        try:
+            battery_pct = float(self.ADapi.get_state(car.car_data.battery_sensor, namespace = car.namespace))
+            limit_pct = float(self.ADapi.get_state(car.car_data.charge_limit, namespace = car.namespace))
+        except (ValueError, TypeError):
+            return copy
+        if battery_pct < limit_pct:
+            copy.kWhRemaining = round((limit_pct - battery_pct) / 100 * car.car_data.battery_size, 2)
+        return copy
+
+    def _heater_snapshot(self, heater) -> HeaterSnapshot:
+        heater_data = heater.heater_data
+        return HeaterSnapshot(
+            heater = heater.heater,
+            pricedrop = heater_data.pricedrop,
+            max_continuous_hours = heater_data.max_continuous_hours,
+            on_for_minimum = heater_data.on_for_minimum,
+            pricedifference_increase = heater_data.pricedifference_increase,
+            reset_continuous_hours = heater.reset_continuous_hours,
+            previous_save_hours = list(heater_data.time_to_save),
+            priceincrease = heater_data.priceincrease if heater.spends_before_peaks else None,
+        )
+
+    def _is_stale(self, snapshot: PlanSnapshot) -> bool:
+        return snapshot.run_id != self._run_id or time.monotonic() > snapshot.deadline
+
+    def _plan(self, snapshot: PlanSnapshot) -> PlanResult:
+        result = PlanResult(run_id = snapshot.run_id, queue_version = snapshot.queue_version)
+        electricalPriceApp = snapshot.state.electricalPriceApp
+
+        if snapshot.queue:
+            for item in snapshot.queue:
+                item.estHourCharge = self.scheduler._calculate_expected_chargetime(
+                    kWhRemaining = item.kWhRemaining,
+                    totalW_AllChargers = item.maxAmps * item.voltPhase,
+                    state = snapshot.state,
+                )
+            if self._is_stale(snapshot):
+                result.complete = False
+                return result
+            result.simultaneous_complete = self.scheduler._plan_charging_queue(snapshot.queue, state = snapshot.state)
+            result.queue = snapshot.queue
+            result.save_endHour = snapshot.state.save_endHour
+
+        for heater in snapshot.heaters:
+            if self._is_stale(snapshot):
+                result.complete = False
+                break
+            result.time_to_save[heater.heater] = electricalPriceApp.find_times_to_save(
+                pricedrop = heater.pricedrop,
+                max_continuous_hours = heater.max_continuous_hours,
+                on_for_minimum = heater.on_for_minimum,
+                pricedifference_increase = heater.pricedifference_increase,
+                reset_continuous_hours = heater.reset_continuous_hours,
+                previous_save_hours = heater.previous_save_hours
+            )
+            if heater.priceincrease is not None:
+                result.time_to_spend[heater.heater] = electricalPriceApp.find_times_to_spend(
+                    priceincrease = heater.priceincrease
+                )
+        return result
+
+    def _apply(self, result: PlanResult) -> None:
+        if result.run_id != self._run_id:
+            return # A newer run has started
+        if not result.complete:
+            self.ADapi.log("Replanning did not finish within time budget. Keeping the rest of the active plan", level = 'DEBUG')
+
+        queue_changed = False
+        if result.queue is not None and result.queue_version == self.scheduler.queue_version:
+            self.scheduler.save_endHour = result.save_endHour
+            queue_changed = self.scheduler.apply_planned(result.queue, result.simultaneous_complete, fields = REPLANNED_FIELDS)
+
+        heaters_changed = False
+        for heater in self.heaters:
+            changed = False
+            time_to_save = result.time_to_save.get(heater.heater)
+            if time_to_save is not None and time_to_save != heater.heater_data.time_to_save:
+                heater.heater_data.time_to_save = time_to_save
+                changed = True
+            time_to_spend = result.time_to_spend.get(heater.heater)
+            if time_to_spend is not None and time_to_spend != heater.time_to_spend:
+                heater.time_to_spend = time_to_spend
+                changed = True
+            if changed:
+                heater.heater_setNewValues()
+                heaters_changed = True
+
+        if queue_changed or heaters_changed:
+            self.plan_version += 1
+            self.ADapi.log(f"Applied plan version {self.plan_version}", level = 'DEBUG')
+        if queue_changed:
+            self.scheduler.informHandler = self.ADapi.run_in(self.scheduler.notifyChargeTime, 3)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import bisect
+import copy
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from watt_slots import WattSlots
+from thread_safety import NO_LOCK
+
+OFFLOAD_MODES = ('off', 'thread', 'process')
+
+
+@dataclass
+class AvailableWattSnapshot:
+    """ Plain data needed to build available_watt, so it can be sent to another process. """
+    slots: List[Tuple[datetime, datetime]]
+    max_kwh_usage_pr_hour: float
+    slot_watt: List[Optional[float]] # Expected base load for each slot
+    # (end of save period, expected Wh to recover, Wh pr slot the heater can use)
+    heater_loads: List[Tuple[datetime, float, float]] = field(default_factory=list)
+
+
+def snapshot_price_app(electricalPriceApp):
+    """ Returns a copy of the price app with its own lists and dicts, so planning away from the worker thread
+        uses prices from when the snapshot was taken and does not read the live app while it updates. """
+
+    snapshot = copy.copy(electricalPriceApp)
+    for name, value in vars(electricalPriceApp).items():
+        if isinstance(value, (list, dict)):
+            setattr(snapshot, name, copy.copy(value))
+    return snapshot
+
+
+def build_available_watt(snapshot: AvailableWattSnapshot) -> WattSlots:
+    """ Returns available Wh for every price slot after base load and heaters recovering after saving """
+
+    slots = WattSlots()
+    for (start, end), watt in zip(snapshot.slots, snapshot.slot_watt):
+        duration_hours = (end - start).total_seconds() / 3600.0
+        available_Wh = snapshot.max_kwh_usage_pr_hour * 1_000 * duration_hours
+        if watt is not None:
+            available_Wh -= watt * duration_hours
+        slots.append(start, end, available_Wh)
+
+    available = slots.available_Wh
+    for end_time, expected_wh, heater_consumption in snapshot.heater_loads:
+        idx = bisect.bisect_left(slots.start, end_time)
+        remaining = expected_wh
+        for i in range(idx, len(available)):
+            if remaining <= 0:
+                break
+            if remaining > heater_consumption:
+                if available[i] < heater_consumption:
+                    remaining -= available[i]
+                    available[i] = 0.0
+                else:
+                    remaining -= heater_consumption
+                    available[i] -= heater_consumption
+            else:
+                available[i] -= remaining
+                remaining = 0.0
+                break
+    return slots
+
+
+class ScheduleOffloader:
+    """ Runs scheduling computations on a snapshot away from the AppDaemon worker thread,
+        and applies the result in one step in an AppDaemon callback.
+        Charging plans use a copy of the price app that can not be sent to another process, and always
+        run in a thread. Pure functions on plain snapshots, like available watt, run in a separate process
+        in 'process' mode. 'off' runs everything directly. """
+
+    def __init__(self, ADapi, mode:str = 'thread', lock = NO_LOCK):
+        self.ADapi = ADapi
+        self.lock = lock
+        if mode not in OFFLOAD_MODES:
+            self.ADapi.log(
+                f"schedule_offload must be one of {OFFLOAD_MODES}. Got {mode}. Using 'thread'",
+                level = 'WARNING'
+            )
+            mode = 'thread'
+        self.mode = mode
+        self._thread_executor: Optional[ThreadPoolExecutor] = None
+        self._process_executor: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self, pure:bool) -> Executor:
+        if pure and self.mode == 'process':
+            if self._process_executor is None:
+                # Spawn a clean interpreter instead of forking the threaded AppDaemon process
+                self._process_executor = ProcessPoolExecutor(
+                    max_workers = 1,
+                    mp_context = multiprocessing.get_context('spawn'),
+                )
+            return self._process_executor
+        if self._thread_executor is None:
+            self._thread_executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'ElectricalManagement')
+        return self._thread_executor
+
+    def submit(self, func: Callable, snapshot, apply: Callable, name:str, pure:bool = False) -> Optional[Future]:
+        """ Runs func(snapshot) and then apply(result). Returns the future, or ``None`` when run directly. """
+
+        if self.mode == 'off':
+            apply(func(snapshot))
+            return None
+        future = self._executor(pure).submit(func, snapshot)
+        future.add_done_callback(lambda f: self._done(f, apply, name))
+        return future
+
+    def _done(self, future: Future, apply: Callable, name:str) -> None:
+        """ Runs in the executor thread. Hands the result back to AppDaemon """
+
+        if not future.cancelled():
+            self.ADapi.run_in(self._apply, 0, future = future, apply = apply, name = name)
+
+    def _apply(self, kwargs) -> None:
+        future: Future = kwargs['future']
+        apply: Callable = kwargs['apply']
+        name:str = kwargs['name']
+        try:
+            result = future.result()
+        except Exception as e:
+            self.ADapi.log(f"Calculating {name} failed: {e}", level = 'WARNING')
+            return
+        with self.lock:
+            try:
+                apply(result)
+            except Exception as e:
+                self.ADapi.log(f"Not able to apply new {name}: {e}", level = 'WARNING')
+
+    def shutdown(self) -> None:
+        for executor in (self._thread_executor, self._process_executor):
+            if executor is not None:
+                executor.shutdown(wait = False, cancel_futures = True)
+        self._thread_executor = None
+        self._process_executor = None
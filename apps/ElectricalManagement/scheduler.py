@@ -6,8 +6,44 @@ from datetime import timedelta
 from typing import Iterable, List, Optional, Tuple
 
 # Local imports – adjust the module names to your actual project layout
-from pydantic_models import ChargingQueueItem, WattSlot
+from pydantic_models import ChargingQueueItem
+from watt_slots import WattSlots
+from price_timeline import PriceTimeline
+from ready_queue import ReadyQueue
 from utils import get_next_runtime_aware
+from thread_safety import NO_LOCK, serialized
+from schedule_offload import snapshot_price_app
+
+# Fields set by _plan_charging_queue. Only these are copied from a plan made on copies to the active queue
+PLANNED_FIELDS = ('chargingStart', 'chargingStop', 'estimateStop', 'price')
+
+# Methods that read or change the charging queue. Wrapped to hold the instance state lock
+_MUTATORS = (
+    'markAsCharging',
+    'removeFromCharging',
+    'findNextChargerToStart',
+    'removeFromQueue',
+    'queueForCharging',
+    'previewCharging',
+    'process_charging_queue',
+    'process_charging_queue_offloaded',
+    'apply_planned',
+)
+
+
+class PlanState:
+    """ Values a planning run reads and moves forward. Runs away from the worker thread plan with their own
+        PlanState, and the scheduler takes save_endHour back when the plan is applied.
+        Prices are read from a snapshot of the price app, and time from *now* when the state was made. """
+
+    __slots__ = ('save_endHour', 'available_watt', 'electricalPriceApp', 'now')
+
+    def __init__(self, save_endHour, available_watt: WattSlots, electricalPriceApp, now):
+        self.save_endHour = save_endHour
+        self.available_watt = available_watt
+        self.electricalPriceApp = electricalPriceApp
+        self.now = now
+
 
 class Scheduler:
     """ Class for calculating and schedule charge times """
@@ -20,8 +56,11 @@ class Scheduler:
         electricalPriceApp,
         notify_app,
         recipients,
+        price_timeline: Optional[PriceTimeline] = None,
         chargingQueue: Optional[list[ChargingQueueItem]] = None,
-        available_watt: Optional[List[WattSlot]] = None,
+        available_watt: Optional[WattSlots] = None,
+        charging_order:str = 'priority',
+        lock = NO_LOCK,
     ):
         self.ADapi = api
         self.namespace = namespace
@@ -31,59 +70,74 @@ class Scheduler:
         self.stopAtPriceIncrease = stopAtPriceIncrease
         self.startBeforePrice = startBeforePrice
         self.infotext = infotext
+        if price_timeline is None:
+            price_timeline = PriceTimeline.shared(electricalPriceApp)
+        self.price_timeline = price_timeline
 
         self.chargingQueue: list[ChargingQueueItem] = chargingQueue
-        self.available_watt: List[WattSlot] = available_watt
+        if available_watt is None:
+            available_watt = WattSlots()
+        self.available_watt: WattSlots = available_watt
 
         self.simultaneousChargeComplete: list[str] = []
+        self.queue_version:int = 0 # Increased when jobs are added or removed. Used to discard outdated background plans
         self.currentlyCharging: set[str] = set()
+        self.ready_queue = ReadyQueue(order = charging_order)
         self.informHandler = None
 
         # helper values
         now = self.ADapi.datetime(aware=True)
         self.save_endHour = now.replace(minute=0, second=0, microsecond=0)
 
+        self.lock = lock
+        for name in _MUTATORS:
+            setattr(self, name, serialized(getattr(self, name), lock))
+
     def _calculate_expected_chargetime(
         self,
         kWhRemaining: float = 2,
         totalW_AllChargers: float = 3600,
         start_time: Optional[self.ADapi.datetime(aware=True)] = None,
+        state: Optional[PlanState] = None,
     ) -> float:
-        """ Estimate the *number of hours* it will take to finish a charge """
+        """ Estimate the *number of hours* it will take to finish a charge.
+            Uses and updates *state*, or the scheduler itself when not planning on copies """
 
+        if state is None:
+            state = self
         if start_time is None:
-            start_time = self.ADapi.datetime(aware=True)
+            start_time = state.now if isinstance(state, PlanState) else self.ADapi.datetime(aware=True)
 
-        if start_time > self.save_endHour:
-            self.save_endHour = get_next_runtime_aware(
+        if start_time > state.save_endHour:
+            state.save_endHour = get_next_runtime_aware(
                 startTime = start_time, offset_seconds=0, delta_in_seconds=60 * 15
             )
 
-        idx_start = bisect.bisect_left([s.start for s in self.available_watt], self.save_endHour)
+        slots = state.available_watt
+        idx_start = bisect.bisect_left(slots.start, state.save_endHour)
 
         wh_remaining = kWhRemaining * 1_000
         hours_to_charge = 0.0
 
-        for slot in self.available_watt[idx_start:]:
+        for available_Wh, duration_hours in zip(slots.available_Wh[idx_start:], slots.duration_hours[idx_start:]):
             if wh_remaining <= 0:
                 break
 
             usable_wh = min(
-                slot.available_Wh,
-                totalW_AllChargers * slot.duration_hours,
+                available_Wh,
+                totalW_AllChargers * duration_hours,
             )
 
             if wh_remaining <= usable_wh:
-                hours_to_charge += slot.duration_hours
+                hours_to_charge += duration_hours
                 wh_remaining = 0
             else:
                 wh_remaining -= usable_wh
-                hours_to_charge += slot.duration_hours
+                hours_to_charge += duration_hours
 
-        if wh_remaining > 0 and self.available_watt:
-            last = self.available_watt[-1]
-            if last.available_Wh > 0:
-                extra = (wh_remaining / last.available_Wh) * last.duration_hours
+        if wh_remaining > 0 and slots:
+            if slots.available_Wh[-1] > 0:
+                extra = (wh_remaining / slots.available_Wh[-1]) * slots.duration_hours[-1]
                 hours_to_charge += extra
 
         return hours_to_charge
@@ -157,7 +211,7 @@ class Scheduler:
             max_price = self._update_prices_for_future_hours()
             if max_price == -1:
                 return False
-        return self.electricalPriceApp.electricity_price_now() <= max_price
+        return self.price_timeline.price_now(self.ADapi.datetime(aware=True)) <= max_price
 
 
     def _update_prices_for_future_hours(self) -> float:
@@ -238,10 +292,12 @@ class Scheduler:
         if vehicle_id in self.currentlyCharging:
             return
         self.currentlyCharging.add(vehicle_id)
+        self.ready_queue.mark_charging(vehicle_id)
 
     def removeFromCharging(self, vehicle_id):
         if vehicle_id in self.currentlyCharging:
             self.currentlyCharging.discard(vehicle_id)
+            self.ready_queue.unmark_charging(vehicle_id)
 
     def isCurrentlyCharging(self, vehicle_id):
         return vehicle_id in self.currentlyCharging
@@ -249,15 +305,21 @@ class Scheduler:
     def findNextChargerToStart(self, check_if_charging_time:bool = True) -> Optional[str]:
         """ Return the *vehicle_id* of the next charging job that is ready to start """
 
-        for priority in range(1, 6):
-            for entry in self.chargingQueue:
-                if entry.priority == priority or priority == 5:
-                    if (
-                        not self.isCurrentlyCharging(entry.vehicle_id) and
-                        (self.isChargingTime(entry.vehicle_id) or not check_if_charging_time)
-                    ):
-                        return entry.vehicle_id
-        return None
+        if not self.chargingQueue:
+            return None
+
+        if (
+            not check_if_charging_time
+            or (
+                self.ADapi.now_is_between("09:00:00", "14:00:00")
+                and not self.electricalPriceApp.tomorrow_valid
+                and self._is_charging_price()
+            )
+        ):
+            # Every job is in charging time
+            return self.ready_queue.next_any(self.chargingQueue)
+
+        return self.ready_queue.next_ready(self.ADapi.datetime(aware=True), self.chargingQueue)
 
     def removeFromQueue(self, vehicle_id: str) -> None:
         """ Remove the first queue entry that matches *vehicle_id* """
@@ -265,6 +327,8 @@ class Scheduler:
         for idx, entry in enumerate(self.chargingQueue):
             if entry.vehicle_id == vehicle_id:
                 del self.chargingQueue[idx]
+                self.queue_version += 1
+                self.ready_queue.invalidate()
                 break
 
     def queueForCharging(
@@ -284,12 +348,35 @@ class Scheduler:
         if kWhRemaining <= 0:
             return False
 
+        new_item = self._new_queue_item(vehicle_id, kWhRemaining, maxAmps, voltPhase, finish_by_hour, priority, name)
+        self.chargingQueue.append(new_item)
+        self.queue_version += 1
+        self.ready_queue.invalidate()
+
+        if self.ADapi.now_is_between("09:00:00", "14:00:00") and not self.electricalPriceApp.tomorrow_valid:
+            return self.isChargingTime(vehicle_id=vehicle_id)
+
+        self.process_charging_queue()
+        return self.isChargingTime(vehicle_id=vehicle_id)
+
+    def _new_queue_item(
+        self,
+        vehicle_id: str,
+        kWhRemaining: float,
+        maxAmps: int,
+        voltPhase: int,
+        finish_by_hour: int,
+        priority: int,
+        name: str,
+        state: Optional[PlanState] = None,
+    ) -> ChargingQueueItem:
         est_hour_charge = self._calculate_expected_chargetime(
             kWhRemaining=kWhRemaining,
             totalW_AllChargers=maxAmps * voltPhase,
+            state=state,
         )
 
-        new_item = ChargingQueueItem(
+        return ChargingQueueItem(
             vehicle_id=vehicle_id,
             kWhRemaining=kWhRemaining,
             maxAmps=maxAmps,
@@ -299,30 +386,109 @@ class Scheduler:
             estHourCharge=est_hour_charge,
             name=name,
         )
-        self.chargingQueue.append(new_item)
-
-        if self.ADapi.now_is_between("09:00:00", "14:00:00") and not self.electricalPriceApp.tomorrow_valid:
-            return self.isChargingTime(vehicle_id=vehicle_id)
 
-        self.process_charging_queue()
-        return self.isChargingTime(vehicle_id=vehicle_id)
+    def previewCharging(
+        self,
+        vehicle_id: str,
+        kWhRemaining: float,
+        maxAmps: int,
+        voltPhase: int,
+        finish_by_hour: int,
+        priority: int,
+        name: str,
+    ) -> Tuple[List[ChargingQueueItem], List[str]]:
+        """ Dry run of queueForCharging and process_charging_queue.
+        Plans copies of the queue items, so the live queue, persistence and
+        notifications are not touched. Returns ``(planned queue, simultaneous charging)`` """
+
+        state = self.plan_state()
+        queue = [item.model_copy() for item in self.chargingQueue if item.vehicle_id != vehicle_id]
+        if kWhRemaining > 0:
+            queue.append(self._new_queue_item(vehicle_id, kWhRemaining, maxAmps, voltPhase, finish_by_hour, priority, name, state = state))
+        simultaneous_complete = self._plan_charging_queue(queue, state = state)
+        return queue, simultaneous_complete
 
     def process_charging_queue(self) -> None:
         """ Resolve the whole queue, scheduling charging windows, detecting
         simultaneous sessions and finally computing the “best” price block
         for each job """
 
-        self.chargingQueue.sort(key=lambda c: c.finish_by_hour)
+        self.simultaneousChargeComplete = self._plan_charging_queue(self.chargingQueue)
+        self.ready_queue.invalidate()
+
+    def plan_state(self) -> PlanState:
+        """ Returns a PlanState to plan on copies with.
+            WattSlots.replace swaps in new arrays, so the slots in the state do not change afterwards """
+
+        slots = WattSlots()
+        slots.replace(self.available_watt)
+        return PlanState(
+            self.save_endHour,
+            slots,
+            snapshot_price_app(self.electricalPriceApp),
+            self.ADapi.datetime(aware=True),
+        )
+
+    def process_charging_queue_offloaded(self, offloader) -> None:
+        """ Plans a copy of the queue with *offloader* and copies the planned fields to the
+        active queue when done, unless jobs were added or removed in the meantime """
+
+        queue = [item.model_copy() for item in self.chargingQueue]
+        version = self.queue_version
+        state = self.plan_state()
+
+        def _apply(simultaneous_complete: List[str]) -> None:
+            if version != self.queue_version:
+                return
+            self.save_endHour = state.save_endHour
+            self.apply_planned(queue, simultaneous_complete)
+
+        offloader.submit(lambda q: self._plan_charging_queue(q, state = state), queue, _apply, name = 'charging queue')
+
+    def apply_planned(self,
+        planned: List[ChargingQueueItem],
+        simultaneous_complete: List[str],
+        fields: Tuple[str, ...] = PLANNED_FIELDS,
+    ) -> bool:
+        """ Copies *fields* that differ from planned copies to the active queue items, so changes made to
+            the items while planning are kept. Returns True if anything changed """
+
+        active = {item.vehicle_id: item for item in self.chargingQueue}
+        changed = False
+        for new_item in planned:
+            item = active.get(new_item.vehicle_id)
+            if item is None:
+                continue
+            for name in fields:
+                value = getattr(new_item, name)
+                if getattr(item, name) != value:
+                    setattr(item, name, value)
+                    changed = True
+
+        if changed:
+            self.chargingQueue.sort(key=lambda c: c.finish_by_hour)
+            self.ready_queue.invalidate()
+        if simultaneous_complete != self.simultaneousChargeComplete:
+            self.simultaneousChargeComplete = simultaneous_complete
+            changed = True
+        return changed
+
+    def _plan_charging_queue(self, queue: List[ChargingQueueItem], state: Optional[PlanState] = None) -> List[str]:
+        """ Sets charging windows for all jobs in *queue* and returns the
+        vehicles that are planned to charge simultaneously """
+
+        queue.sort(key=lambda c: c.finish_by_hour)
+        electricalPriceApp = state.electricalPriceApp if state is not None else self.electricalPriceApp
 
         simultaneous_charge: List[str] = []
-        self.simultaneousChargeComplete = []
+        simultaneous_complete: List[str] = []
 
-        for i, current_car in enumerate(self.chargingQueue):
+        for i, current_car in enumerate(queue):
             (
                 current_car.chargingStart,
                 current_car.chargingStop,
                 current_car.price,
-            ) = self.electricalPriceApp.get_Continuous_Cheapest_Time(
+            ) = electricalPriceApp.get_Continuous_Cheapest_Time(
                 hoursTotal=current_car.estHourCharge,
                 calculateBeforeNextDayPrices=False,
                 finishByHour=current_car.finish_by_hour,
@@ -335,16 +501,16 @@ class Scheduler:
             has_overlap = False
             for overlapping_id in simultaneous_charge:
                 idx = next(
-                    (j for j, c in enumerate(self.chargingQueue) if c.vehicle_id == overlapping_id),
+                    (j for j, c in enumerate(queue) if c.vehicle_id == overlapping_id),
                     None,
                 )
-                if idx is not None and self.chargingQueue[idx].chargingStop > current_car.chargingStart:
+                if idx is not None and queue[idx].chargingStop > current_car.chargingStart:
                     has_overlap = True
                     break
 
             if not has_overlap:
                 for j in range(i - 1, -1, -1):
-                    prev = self.chargingQueue[j]
+                    prev = queue[j]
                     if prev.chargingStop is not None and current_car.chargingStart < prev.chargingStop:
                         simultaneous_charge.append(prev.vehicle_id)
                 simultaneous_charge.append(current_car.vehicle_id)
@@ -352,30 +518,40 @@ class Scheduler:
                 simultaneous_charge.append(current_car.vehicle_id)
 
             next_index = i + 1
-            if next_index < len(self.chargingQueue):
-                next_car = self.chargingQueue[next_index]
+            if next_index < len(queue):
+                next_car = queue[next_index]
                 if next_car.chargingStart is not None and current_car.chargingStop is not None:
                     if next_car.chargingStart >= current_car.chargingStop:
                         if simultaneous_charge:
-                            self.calcSimultaneousCharge(simultaneous_charge)
-                            self.simultaneousChargeComplete.extend(simultaneous_charge)
+                            self.calcSimultaneousCharge(simultaneous_charge, queue = queue, state = state)
+                            simultaneous_complete.extend(simultaneous_charge)
                             simultaneous_charge = []
 
         if simultaneous_charge:
             if len(simultaneous_charge) > 1:
-                self.calcSimultaneousCharge(simultaneous_charge)
-                self.simultaneousChargeComplete.extend(simultaneous_charge)
+                self.calcSimultaneousCharge(simultaneous_charge, queue = queue, state = state)
+                simultaneous_complete.extend(simultaneous_charge)
 
-    def calcSimultaneousCharge(self, simultaneous_charge: List[str]) -> None:
+        return simultaneous_complete
+
+    def calcSimultaneousCharge(self,
+        simultaneous_charge: List[str],
+        queue: Optional[List[ChargingQueueItem]] = None,
+        state: Optional[PlanState] = None,
+    ) -> None:
         """ Re-calculate the charging window for a group of vehicles that must run
         at the same time.  The function updates the queue in place """
 
+        if queue is None:
+            queue = self.chargingQueue
+
         finish_by_hour = 0
         kWh_to_charge = 0.0
         total_w_all_chargers = 0.0
-        start_time = self.ADapi.datetime(aware=True)
+        start_time = state.now if state is not None else self.ADapi.datetime(aware=True)
+        electricalPriceApp = state.electricalPriceApp if state is not None else self.electricalPriceApp
 
-        simultaneous_items = [c for c in self.chargingQueue if c.vehicle_id in simultaneous_charge]
+        simultaneous_items = [c for c in queue if c.vehicle_id in simultaneous_charge]
 
         simultaneous_items.sort(key=lambda c: c.priority)
 
@@ -396,9 +572,10 @@ class Scheduler:
             kWhRemaining=kWh_to_charge,
             totalW_AllChargers=total_w_all_chargers,
             start_time=start_time,
+            state=state,
         )
 
-        charging_at, charging_stop, price = self.electricalPriceApp.get_Continuous_Cheapest_Time(
+        charging_at, charging_stop, price = electricalPriceApp.get_Continuous_Cheapest_Time(
             hoursTotal=hours_to_charge,
             calculateBeforeNextDayPrices=False,
             finishByHour=finish_by_hour,
@@ -495,13 +672,7 @@ class Scheduler:
             info_text = price_msg
 
         if self.infotext not in (None, "Charge "):
-            info_text.strip()
-            self.ADapi.call_service(
-                "input_text/set_value",
-                value = info_text,
-                entity_id = self.infotext,
-                namespace = self.namespace,
-            )
+            self.notify_app.set_text(self.infotext, info_text.strip(), self.namespace)
 
             if send_new_info:
                 data = {"tag": "chargequeue"}
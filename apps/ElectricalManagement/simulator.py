@@ -0,0 +1,850 @@
+""" Offline replay of recorded Home Assistant history through ElectricalManagement.
+
+    Runs the real ElectricalUsage, Scheduler, Charger and Heater code against a virtual clock, and
+    reports kWh, peak and service calls pr hour. Use it to test tuning before changing production:
+
+        python simulator.py --config apps.yaml --app electricity --history history.json --prices prices.csv \\
+            --loads loads.json --set buffer=0.6 --set stopAtPriceIncrease=0.2 --report report.csv
+
+    History is a Home Assistant history export: CSV with entity_id, state, last_changed columns,
+    or JSON as returned by /api/history/period. Prices are CSV or JSON with start, end (optional) and price.
+    Loads maps entities the app switches to watt, so the recorded power is adjusted when the app acts different
+    than what was recorded: {"switch.heater": 1200, "number.charger_amps": {"watt_per_unit": 690}}
+
+    @Pythm / https://github.com/Pythm
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import csv
+import heapq
+import itertools
+import json
+import math
+import os
+import sys
+import tempfile
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import partial
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from pydantic_models import PeakHour
+
+ON_STATES = ('on', 'heat', 'cool', 'heat_cool', 'auto', 'dry', 'fan_only', 'charging')
+
+
+@dataclass(order = True)
+class HistoryEvent:
+    time: datetime
+    entity_id: str = field(compare = False)
+    state: Any = field(compare = False)
+    attributes: dict = field(default_factory = dict, compare = False)
+
+
+@dataclass
+class PriceSlot:
+    start: datetime
+    end: datetime
+    price: float
+
+
+def _parse_time(value, tz: tzinfo) -> datetime:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz)
+    dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo = tz)
+    return dt.astimezone(tz)
+
+
+def _read_rows(path: str) -> Iterable[dict]:
+    with open(path, 'r', encoding = 'utf-8') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+            return
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('history') or data.get('prices') or list(data.values())
+    for row in data:
+        if isinstance(row, list):
+            # /api/history/period returns one list pr entity. Later rows may leave out entity_id
+            entity_id = None
+            for item in row:
+                entity_id = item.get('entity_id', entity_id)
+                yield {**item, 'entity_id': entity_id}
+        else:
+            yield row
+
+
+def load_history(path: str, tz: tzinfo) -> List[HistoryEvent]:
+    """ Reads a Home Assistant history export and returns events sorted by time """
+
+    events = [
+        HistoryEvent(
+            time = _parse_time(row.get('last_changed') or row.get('last_updated') or row['time'], tz),
+            entity_id = row['entity_id'],
+            state = row.get('state'),
+            attributes = row.get('attributes') or {},
+        )
+        for row in _read_rows(path)
+    ]
+    events.sort()
+    return events
+
+
+def load_prices(path: str, tz: tzinfo) -> List[PriceSlot]:
+    """ Reads price slots. Slots without end lasts until next slot starts, or one hour for the last slot """
+
+    rows = sorted(
+        ((_parse_time(row['start'], tz), row.get('end'), float(row['price'])) for row in _read_rows(path)),
+        key = lambda r: r[0],
+    )
+    slots: List[PriceSlot] = []
+    for i, (start, end, price) in enumerate(rows):
+        if end:
+            end = _parse_time(end, tz)
+        elif i + 1 < len(rows):
+            end = rows[i + 1][0]
+        else:
+            end = start + timedelta(hours = 1)
+        slots.append(PriceSlot(start = start, end = end, price = price))
+    return slots
+
+
+class _Completed:
+    """ Awaitable result of a service call or state read made from a coroutine """
+
+    def __init__(self, value = None):
+        self.value = value
+
+    def __await__(self):
+        return self.value
+        yield
+
+
+def _in_event_loop() -> bool:
+    """ True when called from a coroutine, where AppDaemon api calls return awaitables """
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class SimulatedPriceApp:
+    """ Stand in for ElectricalPriceCalc built from a recorded price series.
+        Tomorrow's prices are known from release_hour the day before. Cheapest time and save hours
+        are simplified versions of the calculations in the price app. Pass the real price app to
+        Simulation to use the exact calculations. """
+
+    def __init__(self, api, prices: List[PriceSlot],
+        currency:str = 'NOK',
+        daytax:float = 0.0,
+        nighttax:float = 0.0,
+        release_hour:int = 13,
+    ):
+        self.ADapi = api
+        self.prices = prices
+        self._starts = [p.start for p in prices]
+        self.currency = currency
+        self.current_daytax = daytax
+        self.current_nighttax = nighttax
+        self.release_hour = release_hour
+
+    @property
+    def tomorrow_valid(self) -> bool:
+        now = self.ADapi.datetime(aware = True)
+        tomorrow = now.replace(hour = 0, minute = 0, second = 0, microsecond = 0) + timedelta(days = 1)
+        return now.hour >= self.release_hour and bool(self.prices) and self.prices[-1].end > tomorrow
+
+    def _known_until(self) -> datetime:
+        now = self.ADapi.datetime(aware = True)
+        midnight = now.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+        return midnight + timedelta(days = 2 if now.hour >= self.release_hour else 1)
+
+    @property
+    def elpricestoday(self) -> List[PriceSlot]:
+        now = self.ADapi.datetime(aware = True)
+        midnight = now.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+        lo = bisect.bisect_left(self._starts, midnight)
+        hi = bisect.bisect_left(self._starts, self._known_until())
+        return self.prices[lo:hi]
+
+    def _future_slots(self, until: Optional[datetime] = None) -> List[PriceSlot]:
+        now = self.ADapi.datetime(aware = True)
+        lo = max(bisect.bisect_right(self._starts, now) - 1, 0)
+        hi = bisect.bisect_left(self._starts, min(until or self._known_until(), self._known_until()))
+        return [s for s in self.prices[lo:hi] if s.end > now]
+
+    def electricity_price_now(self) -> float:
+        now = self.ADapi.datetime(aware = True)
+        idx = bisect.bisect_right(self._starts, now) - 1
+        if idx < 0 or self.prices[idx].end <= now:
+            return 0.0
+        return self.prices[idx].price
+
+    def get_Continuous_Cheapest_Time(self,
+        hoursTotal:float = 1,
+        calculateBeforeNextDayPrices:bool = False,
+        finishByHour:int = 7,
+        startBeforePrice:float = 0.01,
+        stopAtPriceIncrease:float = 0.01,
+    ) -> Tuple[Optional[datetime], Optional[datetime], Optional[float]]:
+        """ Returns (start, stop, price) of cheapest continuous window that ends before finishByHour """
+
+        now = self.ADapi.datetime(aware = True)
+        deadline = now.replace(hour = 0, minute = 0, second = 0, microsecond = 0) + timedelta(hours = finishByHour)
+        if deadline <= now:
+            deadline += timedelta(days = 1)
+        slots = self._future_slots(deadline)
+        if not slots:
+            return now, now + timedelta(hours = hoursTotal), self.electricity_price_now()
+
+        slot_hours = (slots[0].end - slots[0].start).total_seconds() / 3600
+        count = min(max(1, math.ceil(hoursTotal / slot_hours)), len(slots))
+        sums = [0.0] + list(itertools.accumulate(s.price for s in slots))
+        first = min(range(len(slots) - count + 1), key = lambda i: sums[i + count] - sums[i])
+        last = first + count - 1
+        price = max(s.price for s in slots[first:last + 1])
+
+        while first > 0 and slots[first - 1].price <= price + startBeforePrice:
+            first -= 1
+        while last + 1 < len(slots) and slots[last + 1].price <= price + stopAtPriceIncrease:
+            last += 1
+        return max(slots[first].start, now), slots[last].end, price
+
+    def get_lowest_prices(self, checkitem:int = 0, hours:float = 1, min_change:float = 0.1) -> float:
+        prices = sorted(s.price for s in self._future_slots())
+        if not prices:
+            return self.electricity_price_now()
+        return prices[min(len(prices) - 1, max(0, math.ceil(hours) - 1))]
+
+    def _merge(self, selected: List[PriceSlot], max_hours: Optional[float] = None) -> List[PeakHour]:
+        peaks: List[PeakHour] = []
+        for s in selected:
+            if (
+                peaks
+                and peaks[-1].end == s.start
+                and (max_hours is None or peaks[-1].duration < timedelta(hours = max_hours))
+            ):
+                peaks[-1].end = s.end
+                peaks[-1].duration = peaks[-1].end - peaks[-1].start
+            else:
+                peaks.append(PeakHour(start = s.start, end = s.end, duration = s.end - s.start))
+        return peaks
+
+    def find_times_to_save(self,
+        pricedrop:float,
+        max_continuous_hours:float,
+        on_for_minimum:float,
+        pricedifference_increase:float,
+        reset_continuous_hours:bool = False,
+        previous_save_hours: Optional[List[PeakHour]] = None,
+    ) -> List[PeakHour]:
+        """ Save in slots where price drops more than pricedrop within max_continuous_hours """
+
+        slots = self._future_slots()
+        window = timedelta(hours = max_continuous_hours)
+        selected = []
+        for i, s in enumerate(slots):
+            later = [o.price for o in slots[i + 1:] if o.start < s.end + window]
+            if later and s.price - min(later) >= pricedrop:
+                selected.append(s)
+        return self._merge(selected, max_continuous_hours)
+
+    def find_times_to_spend(self, priceincrease:float) -> List[PeakHour]:
+        """ Spend in slots where price increases more than priceincrease within three hours """
+
+        slots = self._future_slots()
+        selected = []
+        for i, s in enumerate(slots):
+            later = [o.price for o in slots[i + 1:] if o.start < s.end + timedelta(hours = 3)]
+            if later and max(later) - s.price >= priceincrease:
+                selected.append(s)
+        return self._merge(selected)
+
+    def print_peaks(self, peaks: Optional[List[PeakHour]]) -> str:
+        return ', '.join(f"{p.start:%d %H:%M}-{p.end:%H:%M}" for p in peaks or [])
+
+
+class SimulatedADAPI:
+    """ The parts of the AppDaemon api used by ElectricalManagement, driven by a virtual clock.
+        States come from recorded history. Service calls are recorded, and change state of the entity
+        instead of the recorded history from then on. Power and accumulated kWh sensors are the recorded
+        values adjusted by the difference in watt between simulated and recorded state of loads. """
+
+    def __init__(self, start: datetime, tz: tzinfo,
+        loads: Optional[Dict[str, Any]] = None,
+        config_dir:str = '.',
+    ):
+        self.now = start
+        self.tz = tz
+        self.AD = SimpleNamespace(config_dir = config_dir)
+        self.apps: Dict[str, Any] = {}
+        self.states: Dict[str, dict] = {}
+        self.recorded: Dict[str, Any] = {}
+        self.controlled: set = set() # Entities changed by service calls
+        self.loads: Dict[str, dict] = {
+            entity: (load if isinstance(load, dict) else {'watt': float(load)})
+            for entity, load in (loads or {}).items()
+        }
+        self.power_sensor: Optional[str] = None
+        self.accumulated_sensor: Optional[str] = None
+
+        self._handles = itertools.count(1)
+        self._timers: List[tuple] = [] # (time, seq, handle)
+        self._timer_info: Dict[str, tuple] = {} # handle: (callback, kwargs, interval)
+        self._state_listeners: Dict[str, tuple] = {} # handle: (callback, entity, kwargs)
+        self._event_listeners: Dict[str, tuple] = {} # handle: (callback, event, kwargs)
+
+        self.calls: List[Tuple[datetime, str, dict]] = []
+        self.errors: List[str] = []
+        self.warnings: int = 0
+        self.verbose:bool = False
+
+        # Energy meter
+        self.hour_Wh: Dict[datetime, float] = defaultdict(float)
+        self.hour_peak: Dict[datetime, float] = defaultdict(float)
+        self._delta_Wh_this_hour: float = 0.0
+        self._delta_hour = start.replace(minute = 0, second = 0, microsecond = 0)
+        self._meter_time = start
+
+    # ----------------------------------------------------------------------- #
+    # Clock and timers
+    # ----------------------------------------------------------------------- #
+
+    def datetime(self, aware:bool = False) -> datetime:
+        return self.now if aware else self.now.replace(tzinfo = None)
+
+    def get_now(self) -> datetime:
+        return self.now
+
+    def _time_today(self, value) -> datetime:
+        if isinstance(value, str):
+            value = time.fromisoformat(value)
+        return datetime.combine(self.now.date(), value, tzinfo = self.tz)
+
+    def parse_datetime(self, value, aware:bool = False) -> datetime:
+        dt = self._time_today(value)
+        return dt if aware else dt.replace(tzinfo = None)
+
+    def convert_utc(self, value) -> datetime:
+        return _parse_time(value, timezone.utc)
+
+    def now_is_between(self, start_time:str, end_time:str) -> bool:
+        now = self.now.time()
+        start, end = time.fromisoformat(start_time), time.fromisoformat(end_time)
+        if start <= end:
+            return start <= now <= end
+        return now >= start or now <= end
+
+    def _schedule(self, callback: Callable, when: datetime, interval: Optional[float], kwargs: dict) -> str:
+        handle = f"timer_{next(self._handles)}"
+        self._timer_info[handle] = (callback, kwargs, interval)
+        heapq.heappush(self._timers, (when, next(self._handles), handle))
+        return handle
+
+    def run_in(self, callback: Callable, delay: float, **kwargs) -> str:
+        return self._schedule(callback, self.now + timedelta(seconds = delay), None, kwargs)
+
+    def run_at(self, callback: Callable, start, **kwargs) -> str:
+        if not isinstance(start, datetime):
+            start = self._time_today(start)
+            if start < self.now:
+                start += timedelta(days = 1)
+        return self._schedule(callback, start, None, kwargs)
+
+    def run_every(self, callback: Callable, start, interval: float, **kwargs) -> str:
+        if start == 'now' or start is None:
+            start = self.now
+        elif not isinstance(start, datetime):
+            start = self._time_today(start)
+        while start < self.now:
+            start += timedelta(seconds = interval)
+        return self._schedule(callback, start, interval, kwargs)
+
+    def run_daily(self, callback: Callable, start, **kwargs) -> str:
+        when = self._time_today(start)
+        if when < self.now:
+            when += timedelta(days = 1)
+        return self._schedule(callback, when, 86400, kwargs)
+
+    def timer_running(self, handle) -> bool:
+        return handle in self._timer_info
+
+    def cancel_timer(self, handle, silent:bool = False) -> bool:
+        return self._timer_info.pop(handle, None) is not None
+
+    def next_timer(self) -> Optional[datetime]:
+        while self._timers and self._timers[0][2] not in self._timer_info:
+            heapq.heappop(self._timers)
+        return self._timers[0][0] if self._timers else None
+
+    def fire_next_timer(self) -> None:
+        when, _, handle = heapq.heappop(self._timers)
+        callback, kwargs, interval = self._timer_info[handle]
+        if interval:
+            heapq.heappush(self._timers, (when + timedelta(seconds = interval), next(self._handles), handle))
+        else:
+            del self._timer_info[handle]
+        self._call(callback, dict(kwargs))
+
+    def _call(self, callback: Callable, *args, **kwargs) -> None:
+        try:
+            result = callback(*args, **kwargs)
+            if hasattr(result, 'send'):
+                self.create_task(result)
+        except Exception as e:
+            self.errors.append(f"{self.now.isoformat()} {getattr(callback, '__qualname__', callback)}: {e!r}")
+
+    # ----------------------------------------------------------------------- #
+    # States
+    # ----------------------------------------------------------------------- #
+
+    def _load_watt(self, entity_id: str, state) -> float:
+        load = self.loads.get(entity_id)
+        if load is None or state is None:
+            return 0.0
+        if 'watt_per_unit' in load:
+            try:
+                return float(state) * load['watt_per_unit']
+            except (ValueError, TypeError):
+                return 0.0
+        return load['watt'] if str(state).lower() in ON_STATES else 0.0
+
+    def delta_watt(self) -> float:
+        """ Difference in watt from recorded history caused by the app acting different """
+
+        delta = 0.0
+        for entity_id in self.controlled:
+            if entity_id in self.loads:
+                delta += (
+                    self._load_watt(entity_id, self.states.get(entity_id, {}).get('state'))
+                    - self._load_watt(entity_id, self.recorded.get(entity_id))
+                )
+        return delta
+
+    def consumption_watt(self) -> float:
+        try:
+            recorded = float(self.recorded.get(self.power_sensor))
+        except (ValueError, TypeError):
+            recorded = 0.0
+        return max(recorded + self.delta_watt(), 0.0)
+
+    def advance(self, to: datetime) -> None:
+        """ Moves the clock and integrates consumption pr hour """
+
+        watt = self.consumption_watt()
+        delta = self.delta_watt()
+        t = self._meter_time
+        while t < to:
+            hour = t.replace(minute = 0, second = 0, microsecond = 0)
+            if hour != self._delta_hour:
+                self._delta_hour = hour
+                self._delta_Wh_this_hour = 0.0
+            step = min(to, hour + timedelta(hours = 1))
+            hours = (step - t).total_seconds() / 3600
+            self.hour_Wh[hour] += watt * hours
+            self._delta_Wh_this_hour += delta * hours
+            self.hour_peak[hour] = max(self.hour_peak[hour], watt)
+            t = step
+        self._meter_time = max(self._meter_time, to)
+        self.now = to
+
+    def _derived_state(self, entity_id: str):
+        if entity_id == self.power_sensor:
+            return str(round(self.consumption_watt(), 1))
+        if entity_id == self.accumulated_sensor:
+            try:
+                recorded = float(self.recorded.get(entity_id))
+            except (ValueError, TypeError):
+                hour = self.now.replace(minute = 0, second = 0, microsecond = 0)
+                return str(round(self.hour_Wh[hour] / 1000, 3))
+            return str(round(max(recorded + self._delta_Wh_this_hour / 1000, 0.0), 3))
+        return None
+
+    def _state_dict(self, entity_id: str) -> Optional[dict]:
+        state = self.states.get(entity_id)
+        derived = self._derived_state(entity_id)
+        if derived is not None:
+            state = {**(state or {'attributes': {}}), 'state': derived}
+        return state
+
+    def get_state(self, entity_id = None, attribute = None, default = None, namespace = None, copy:bool = True, **kwargs):
+        if _in_event_loop():
+            return _Completed(self._get_state(entity_id, attribute, default))
+        return self._get_state(entity_id, attribute, default)
+
+    def _get_state(self, entity_id = None, attribute = None, default = None):
+        if entity_id is None:
+            return {e: self._state_dict(e) for e in self.states}
+        if '.' not in entity_id:
+            return {e: self._state_dict(e) for e in self.states if e.startswith(entity_id + '.')}
+        state = self._state_dict(entity_id)
+        if state is None:
+            return default
+        if attribute == 'all':
+            return state
+        if attribute is None:
+            value = state.get('state')
+        elif attribute in state and attribute != 'attributes':
+            value = state[attribute]
+        else:
+            value = state.get('attributes', {}).get(attribute)
+        return default if value is None else value
+
+    def entity_exists(self, entity_id: str, namespace = None) -> bool:
+        return entity_id in self.states
+
+    def set_state(self, entity_id: str, state = None, attributes: Optional[dict] = None, namespace = None, **kwargs) -> dict:
+        old = self._state_dict(entity_id)
+        new = dict(old or {'attributes': {}})
+        if state is not None:
+            new['state'] = state
+        if attributes:
+            new['attributes'] = {**new.get('attributes', {}), **attributes}
+        new['last_changed'] = new['last_updated'] = self.now.isoformat()
+        self.states[entity_id] = new
+        self._notify_state(entity_id, old, self._state_dict(entity_id))
+        return new
+
+    def apply_history(self, event: HistoryEvent, notify:bool = True) -> None:
+        old = self._state_dict(event.entity_id)
+        self.recorded[event.entity_id] = event.state
+        if event.entity_id in self.controlled:
+            return
+        self.states[event.entity_id] = {
+            'entity_id': event.entity_id,
+            'state': event.state,
+            'attributes': event.attributes,
+            'last_changed': event.time.isoformat(),
+            'last_updated': event.time.isoformat(),
+        }
+        if notify:
+            self._notify_state(event.entity_id, old, self._state_dict(event.entity_id))
+
+    def _notify_state(self, entity_id: str, old: Optional[dict], new: Optional[dict]) -> None:
+        for handle, (callback, entity, kwargs) in list(self._state_listeners.items()):
+            if entity != entity_id and not (entity is not None and '.' not in entity and entity_id.startswith(entity + '.')):
+                continue
+            attribute = kwargs.get('attribute')
+            if attribute == 'all':
+                old_value, new_value = old, new
+            elif attribute is None:
+                old_value, new_value = (old or {}).get('state'), (new or {}).get('state')
+            else:
+                old_value = (old or {}).get('attributes', {}).get(attribute)
+                new_value = (new or {}).get('attributes', {}).get(attribute)
+            if old_value == new_value:
+                continue
+            if 'new' in kwargs and kwargs['new'] != new_value:
+                continue
+            if 'old' in kwargs and kwargs['old'] != old_value:
+                continue
+            if kwargs.get('oneshot'):
+                self._state_listeners.pop(handle, None)
+            self._call(callback, entity_id, attribute, old_value, new_value, kwargs)
+
+    def listen_state(self, callback: Callable, entity_id: Optional[str] = None, **kwargs) -> str:
+        handle = f"state_{next(self._handles)}"
+        self._state_listeners[handle] = (callback, entity_id, kwargs)
+        return handle
+
+    def cancel_listen_state(self, handle, silent:bool = False) -> bool:
+        return self._state_listeners.pop(handle, None) is not None
+
+    def listen_event(self, callback: Callable, event: Optional[str] = None, **kwargs) -> str:
+        handle = f"event_{next(self._handles)}"
+        self._event_listeners[handle] = (callback, event, kwargs)
+        return handle
+
+    def cancel_listen_event(self, handle, silent:bool = False) -> bool:
+        return self._event_listeners.pop(handle, None) is not None
+
+    def fire_event(self, event: str, namespace = None, **kwargs) -> None:
+        for callback, name, listen_kwargs in list(self._event_listeners.values()):
+            if name is None or name == event:
+                self._call(callback, event, kwargs, **listen_kwargs)
+
+    # ----------------------------------------------------------------------- #
+    # Services and other
+    # ----------------------------------------------------------------------- #
+
+    def call_service(self, service: str, **kwargs):
+        self.calls.append((self.now, service, kwargs))
+        entity_id = kwargs.get('entity_id')
+        if isinstance(entity_id, str):
+            domain, action = service.split('/', 1)
+            new_state = None
+            if action in ('turn_on', 'turn_off'):
+                new_state = action[5:]
+            elif action in ('set_value', 'select_option'):
+                new_state = kwargs.get('value', kwargs.get('option'))
+            elif action == 'set_hvac_mode':
+                new_state = kwargs.get('hvac_mode')
+            elif action == 'set_temperature':
+                self.controlled.add(entity_id)
+                self.set_state(entity_id, attributes = {'temperature': kwargs.get('temperature')})
+            if new_state is not None:
+                self.controlled.add(entity_id)
+                self.set_state(entity_id, state = new_state)
+                if entity_id in self.loads and self.power_sensor:
+                    self._notify_state(self.power_sensor, None, self._state_dict(self.power_sensor))
+        return _Completed()
+
+    def create_task(self, coroutine):
+        """ Runs coroutine to end in its own event loop, so the virtual clock does not move while it runs.
+            Called from a coroutine, the task is added to the running loop instead. """
+
+        if _in_event_loop():
+            return asyncio.get_running_loop().create_task(self._run_task(coroutine))
+        asyncio.run(self._run_task(coroutine))
+
+    async def _run_task(self, coroutine) -> None:
+        try:
+            await coroutine
+        except Exception as e:
+            self.errors.append(f"{self.now.isoformat()} {getattr(coroutine, '__qualname__', coroutine)}: {e!r}")
+
+    async def run_in_executor(self, func: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args, **kwargs))
+
+    def get_app(self, name: str):
+        return self.apps.get(name)
+
+    def register_endpoint(self, callback: Callable, name: Optional[str] = None) -> str:
+        return f"endpoint_{next(self._handles)}"
+
+    def deregister_endpoint(self, handle) -> None:
+        pass
+
+    def log(self, message, level:str = 'INFO', **kwargs) -> None:
+        if level in ('WARNING', 'ERROR'):
+            self.warnings += 1
+        if self.verbose and level != 'DEBUG':
+            print(f"{self.now:%Y-%m-%d %H:%M:%S} {level} {message}", file = sys.stderr)
+
+
+@dataclass
+class HourReport:
+    start: datetime
+    kWh: float
+    peak_watt: float
+    price: Optional[float]
+    calls: int
+
+
+@dataclass
+class SimulationReport:
+    hours: List[HourReport]
+    calls: Counter
+    errors: List[str]
+    warnings: int
+
+    @property
+    def total_kWh(self) -> float:
+        return sum(h.kWh for h in self.hours)
+
+    @property
+    def max_hour_kWh(self) -> float:
+        return max((h.kWh for h in self.hours), default = 0.0)
+
+    @property
+    def cost(self) -> float:
+        return sum(h.kWh * h.price for h in self.hours if h.price is not None)
+
+    def top_hours(self, count:int = 3) -> List[HourReport]:
+        return sorted(self.hours, key = lambda h: h.kWh, reverse = True)[:count]
+
+    def summary(self) -> str:
+        lines = [
+            f"Hours simulated: {len(self.hours)}",
+            f"Total: {self.total_kWh:.2f} kWh, cost {self.cost:.2f}",
+            "Highest hours: " + ', '.join(f"{h.start:%Y-%m-%d %H:00} {h.kWh:.2f} kWh" for h in self.top_hours()),
+            f"Peak power: {max((h.peak_watt for h in self.hours), default = 0.0):.0f} W",
+            f"Service calls: {sum(self.calls.values())}",
+        ]
+        lines += [f"  {service}: {count}" for service, count in self.calls.most_common()]
+        lines.append(f"Warnings logged: {self.warnings}. Errors in callbacks: {len(self.errors)}")
+        lines += [f"  {error}" for error in self.errors[:10]]
+        return '\n'.join(lines)
+
+    def write_csv(self, path: str) -> None:
+        with open(path, 'w', newline = '', encoding = 'utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['hour', 'kWh', 'peak_watt', 'price', 'service_calls'])
+            for h in self.hours:
+                writer.writerow([h.start.isoformat(), round(h.kWh, 3), round(h.peak_watt), h.price, h.calls])
+
+
+class Simulation:
+    """ Replays history through a new ElectricalUsage app with *config* as app arguments.
+        Scheduling runs directly and persistence is written to a temporary file unless json_path is configured.
+        With async_control_loop the check runs in an event loop and executor thread, as in AppDaemon. """
+
+    def __init__(self, config: dict,
+        history: List[HistoryEvent],
+        prices: List[PriceSlot],
+        loads: Optional[Dict[str, Any]] = None,
+        time_zone:str = 'UTC',
+        price_app = None,
+    ):
+        self.config = dict(config)
+        self.history = history
+        self.prices = prices
+        self.loads = loads
+        self.tz = ZoneInfo(time_zone)
+        self.price_app = price_app
+
+    def run(self, start: Optional[datetime] = None, end: Optional[datetime] = None, verbose:bool = False) -> SimulationReport:
+        from electricalManagement import ElectricalUsage
+
+        if not self.history:
+            raise ValueError("History is empty")
+        start = start or self.history[0].time
+        end = end or self.history[-1].time
+
+        with tempfile.TemporaryDirectory() as config_dir:
+            api = SimulatedADAPI(start = start, tz = self.tz, loads = self.loads, config_dir = config_dir)
+            api.verbose = verbose
+            api.power_sensor = self.config.get('power_consumption')
+            api.accumulated_sensor = self.config.get('accumulated_consumption_current_hour')
+            price_app = self.price_app or SimulatedPriceApp(api, self.prices)
+            api.apps[self.config.get('electricalPriceApp', 'electricalPriceApp')] = price_app
+            self.config.setdefault('electricalPriceApp', 'electricalPriceApp')
+
+            idx = 0
+            while idx < len(self.history) and self.history[idx].time <= start:
+                api.apply_history(self.history[idx], notify = False)
+                idx += 1
+
+            args = {
+                **self.config,
+                'schedule_offload': 'off',
+                'thread_safe': False,
+                'async_control_loop': self.config.get('async_control_loop', False),
+            }
+            app = object.__new__(ElectricalUsage)
+            app.name = 'simulator'
+            app.args = args
+            app.AD = api.AD
+            app.get_ad_api = lambda: api
+            app.initialize()
+
+            while True:
+                next_timer = api.next_timer()
+                next_event = self.history[idx].time if idx < len(self.history) else None
+                if next_event is not None and (next_timer is None or next_event < next_timer):
+                    if next_event > end:
+                        break
+                    api.advance(next_event)
+                    api.apply_history(self.history[idx])
+                    idx += 1
+                elif next_timer is not None and next_timer <= end:
+                    api.advance(max(next_timer, api.now))
+                    api.fire_next_timer()
+                else:
+                    break
+            api.advance(end)
+            if hasattr(app, 'terminate'):
+                app.terminate()
+
+        return self._report(api)
+
+    def _report(self, api: SimulatedADAPI) -> SimulationReport:
+        calls_pr_hour = Counter(t.replace(minute = 0, second = 0, microsecond = 0) for t, _, _ in api.calls)
+        starts = [p.start for p in self.prices]
+        hours = []
+        for hour in sorted(api.hour_Wh):
+            idx = bisect.bisect_right(starts, hour) - 1
+            price = self.prices[idx].price if idx >= 0 and self.prices[idx].end > hour else None
+            hours.append(HourReport(
+                start = hour,
+                kWh = api.hour_Wh[hour] / 1000,
+                peak_watt = api.hour_peak[hour],
+                price = price,
+                calls = calls_pr_hour.get(hour, 0),
+            ))
+        return SimulationReport(
+            hours = hours,
+            calls = Counter(service for _, service, _ in api.calls),
+            errors = api.errors,
+            warnings = api.warnings,
+        )
+
+
+def _load_config(path: str, app_name: Optional[str]) -> dict:
+    with open(path, 'r', encoding = 'utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if app_name is not None:
+        return data[app_name]
+    if 'module' in data or 'class' in data:
+        return data
+    return next(v for v in data.values() if isinstance(v, dict) and v.get('module') == 'electricalManagement')
+
+
+def _parse_value(value: str):
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description = "Replay recorded history through ElectricalManagement")
+    parser.add_argument('--config', required = True, help = "apps.yaml or json with app configuration")
+    parser.add_argument('--app', help = "Name of app in config file")
+    parser.add_argument('--history', required = True, help = "Home Assistant history export (csv or json)")
+    parser.add_argument('--prices', required = True, help = "Price series (csv or json)")
+    parser.add_argument('--loads', help = "json with watt for entities the app controls")
+    parser.add_argument('--time-zone', default = 'UTC')
+    parser.add_argument('--start', help = "Start replay at (iso format)")
+    parser.add_argument('--end', help = "End replay at (iso format)")
+    parser.add_argument('--set', action = 'append', default = [], metavar = 'KEY=VALUE', help = "Override app argument")
+    parser.add_argument('--report', help = "Write report pr hour as csv")
+    parser.add_argument('--verbose', action = 'store_true', help = "Print app log")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    tz = ZoneInfo(args.time_zone)
+    config = _load_config(args.config, args.app)
+    for item in args.set:
+        key, _, value = item.partition('=')
+        config[key] = _parse_value(value)
+    loads = None
+    if args.loads:
+        with open(args.loads, 'r', encoding = 'utf-8') as f:
+            loads = json.load(f)
+
+    simulation = Simulation(
+        config = config,
+        history = load_history(args.history, tz),
+        prices = load_prices(args.prices, tz),
+        loads = loads,
+        time_zone = args.time_zone,
+    )
+    report = simulation.run(
+        start = _parse_time(args.start, tz) if args.start else None,
+        end = _parse_time(args.end, tz) if args.end else None,
+        verbose = args.verbose,
+    )
+    print(report.summary())
+    if args.report:
+        report.write_csv(args.report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
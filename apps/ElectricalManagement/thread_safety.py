@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import inspect
+import threading
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable
+
+# Used in place of a lock when thread safety is off. Holding it does nothing
+NO_LOCK = nullcontext()
+
+
+def state_lock(enabled:bool):
+    """ Returns a new lock for the shared state of one app instance, or NO_LOCK when *enabled* is False """
+
+    return threading.RLock() if enabled else NO_LOCK
+
+
+def serialized(callback: Callable, lock) -> Callable:
+    """ Wraps a callback or a mutator so it holds *lock* while running.
+        Coroutines run in the event loop thread and are returned as is, and so is everything when *lock* is NO_LOCK. """
+
+    if (
+        lock is NO_LOCK
+        or inspect.iscoroutinefunction(callback)
+        or getattr(callback, '_serialized', False)
+    ):
+        return callback
+
+    @wraps(callback)
+    def wrapper(*args, **kwargs):
+        with lock:
+            return callback(*args, **kwargs)
+
+    wrapper._serialized = True
+    return wrapper
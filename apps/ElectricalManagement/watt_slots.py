@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from array import array
+from datetime import datetime
+from typing import Iterable, List
+
+from pydantic_models import WattSlot
+
+
+class WattSlots:
+    """ Available Wh pr price slot stored as parallel arrays, used while the app runs.
+        Wh and duration are packed doubles, and duration is calculated once when the slot is added.
+        Converted to WattSlot models only when persistence is written. """
+
+    __slots__ = ('start', 'end', 'available_Wh', 'duration_hours')
+
+    def __init__(self):
+        self.start: List[datetime] = []
+        self.end: List[datetime] = []
+        self.available_Wh = array('d')
+        self.duration_hours = array('d')
+
+    @classmethod
+    def from_slots(cls, slots: Iterable[WattSlot]) -> WattSlots:
+        store = cls()
+        for slot in slots:
+            store.append(slot.start, slot.end, slot.available_Wh)
+        return store
+
+    def to_slots(self) -> List[WattSlot]:
+        return [
+            WattSlot(start = start, end = end, available_Wh = available_Wh)
+            for start, end, available_Wh in zip(self.start, self.end, self.available_Wh)
+        ]
+
+    def append(self, start: datetime, end: datetime, available_Wh: float) -> None:
+        self.start.append(start)
+        self.end.append(end)
+        self.available_Wh.append(available_Wh)
+        self.duration_hours.append((end - start).total_seconds() / 3600.0)
+
+    def replace(self, other: WattSlots) -> None:
+        """ Updates in place, so everyone holding this store sees the new slots """
+
+        self.start = other.start
+        self.end = other.end
+        self.available_Wh = other.available_Wh
+        self.duration_hours = other.duration_hours
+
+    def __len__(self) -> int:
+        return len(self.start)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Apps import each other by module name, as AppDaemon adds the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'apps', 'ElectricalManagement'))
@@ -0,0 +1,49 @@
+from async_loop import TickADAPI
+
+
+class FakeADAPI:
+    def __init__(self):
+        self.calls = []
+
+    def get_state(self, entity_id = None, **kwargs):
+        return 'live'
+
+    def call_service(self, service, **kwargs):
+        self.calls.append((service, kwargs))
+        return {'result': 'ok'}
+
+
+def _tick_states():
+    return {
+        (None, 'switch.heater'): {'state': 'off', 'attributes': {}},
+        ('tesla', 'number.charging_amps'): {'state': '6', 'attributes': {}},
+        (None, 'climate.floor'): {'state': 'heat', 'attributes': {'temperature': 20}},
+    }
+
+
+def test_reads_in_a_tick_see_writes_from_the_same_tick():
+    api = TickADAPI(FakeADAPI())
+    api.begin_tick(_tick_states())
+    api.call_service('switch/turn_on', entity_id = 'switch.heater')
+    api.call_service('number/set_value', entity_id = 'number.charging_amps', value = 16, namespace = 'tesla')
+    api.call_service('climate/set_temperature', entity_id = 'climate.floor', temperature = 23)
+
+    assert api.get_state('switch.heater') == 'on'
+    assert api.get_state('number.charging_amps', namespace = 'tesla') == '16'
+    assert api.get_state('climate.floor', attribute = 'temperature') == 23
+    assert api.get_state('climate.floor') == 'heat'
+    assert api._ADapi.calls == []
+
+    calls = api.end_tick()
+    assert [service for service, _ in calls] == ['switch/turn_on', 'number/set_value', 'climate/set_temperature']
+
+
+def test_calls_outside_a_tick_go_straight_to_appdaemon():
+    api = TickADAPI(FakeADAPI())
+    assert api.call_service('switch/turn_off', entity_id = 'switch.heater') == {'result': 'ok'}
+    assert api.get_state('switch.heater') == 'live'
+
+    api.begin_tick(_tick_states())
+    assert api.get_state('sensor.not_read') == 'live'
+    api.end_tick()
+    assert api.get_state('switch.heater') == 'live'
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from energy_integrator import EnergyIntegrator
+
+HOUR = datetime(2026, 1, 5, 10, 0)
+
+
+def test_constant_power_integrates_to_kWh():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(HOUR, 1000)
+    integrator.add_sample(HOUR + timedelta(minutes = 30), 1000)
+    kWh, error = integrator.kWh()
+    assert kWh == pytest.approx(0.5)
+    assert error == 0
+    assert integrator.covers_hour(HOUR + timedelta(minutes = 30))
+
+
+def test_ramp_uses_trapezoid_and_step_error_bound():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(HOUR, 0)
+    integrator.add_sample(HOUR + timedelta(minutes = 30), 2000)
+    kWh, error = integrator.kWh()
+    assert kWh == pytest.approx(0.5)
+    assert error == pytest.approx(0.5)
+
+
+def test_kWh_is_a_query_and_advance_carries_last_reading_forward():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(HOUR, 600)
+    assert integrator.kWh() == (0.0, 0.0)
+    assert integrator.kWh() == (0.0, 0.0)
+
+    integrator.advance(HOUR + timedelta(minutes = 50))
+    kWh, error = integrator.kWh()
+    assert kWh == pytest.approx(0.5)
+    assert error == 0
+    assert integrator.covers_hour(HOUR + timedelta(minutes = 50))
+
+
+def test_advance_past_the_hour_starts_a_new_hour():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(HOUR, 1200)
+    integrator.advance(HOUR + timedelta(minutes = 75))
+    assert integrator.kWh()[0] == pytest.approx(0.3)
+    assert integrator.covers_hour(HOUR + timedelta(minutes = 75))
+
+
+def test_resets_on_the_hour_with_interpolated_boundary():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(HOUR + timedelta(minutes = 30), 1000)
+    assert not integrator.covers_hour(HOUR + timedelta(minutes = 40))
+
+    integrator.add_sample(HOUR + timedelta(minutes = 90), 3000)
+    now = HOUR + timedelta(minutes = 90)
+    kWh, error = integrator.kWh()
+    # 2000 W at 11:00, ramping to 3000 W at 11:30
+    assert kWh == pytest.approx(1.25)
+    assert integrator.covers_hour(now)
+
+
+def test_hour_without_samples_is_not_covered():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(HOUR, 1000)
+    now = HOUR + timedelta(hours = 2, minutes = 30)
+    integrator.add_sample(now, 1000)
+    assert integrator.kWh()[0] == pytest.approx(0.5)
+    assert not integrator.covers_hour(now)
+
+
+def test_empty_integrator_returns_zero():
+    integrator = EnergyIntegrator()
+    assert integrator.kWh() == (0.0, 0.0)
+    assert not integrator.covers_hour(HOUR)
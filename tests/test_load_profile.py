@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from load_profile import BaselineLoadModel, LoadProfilePredictor
+from pydantic_models import BaselineProfile, LoadProfile
+
+MONDAY = datetime(2026, 1, 5)
+
+
+def test_samples_in_same_minute_are_averaged_and_learned_once():
+    predictor = LoadProfilePredictor(LoadProfile())
+    for second, watt in ((0, 1000), (10, 2000), (20, 3000)):
+        predictor.update(MONDAY + timedelta(seconds = second), watt)
+    assert predictor.profile.Counter[0] == 0
+
+    predictor.update(MONDAY + timedelta(minutes = 1), 500)
+    assert predictor.profile.Consumption[0] == 2000
+    assert predictor.profile.Counter[0] == 1
+    assert predictor.profile.Counter[1] == 0
+
+
+def test_minutes_without_samples_get_the_new_sample():
+    predictor = LoadProfilePredictor(LoadProfile())
+    predictor.update(MONDAY, 1000)
+    predictor.update(MONDAY + timedelta(minutes = 4), 400)
+    assert predictor.profile.Consumption[:4] == [1000, 400, 400, 400]
+    assert predictor.profile.Counter[:5] == [1, 1, 1, 1, 0]
+
+
+def test_profile_weight_is_pr_minute_not_pr_sample():
+    predictor = LoadProfilePredictor(LoadProfile(), alpha = 0.5)
+    predictor.update(MONDAY, 1000)
+    predictor.update(MONDAY + timedelta(minutes = 1), 0)
+    predictor.last_index = None # Next week, same minute
+    for second in range(0, 60, 10):
+        predictor.update(MONDAY + timedelta(seconds = second), 2000)
+    predictor.update(MONDAY + timedelta(minutes = 1), 0)
+    assert predictor.profile.Consumption[0] == 1500
+    assert predictor.profile.Counter[0] == 2
+
+
+def test_gap_is_limited_to_one_hour():
+    predictor = LoadProfilePredictor(LoadProfile())
+    predictor.update(MONDAY, 1000)
+    predictor.update(MONDAY + timedelta(hours = 3), 400)
+    assert sum(predictor.profile.Counter) == 60
+
+
+def test_baseline_counts_minutes_not_samples():
+    model = BaselineLoadModel(BaselineProfile(), min_samples = 30)
+    now = MONDAY + timedelta(hours = 12)
+    for sample in range(6 * 29):
+        model.update(now + timedelta(seconds = 10 * sample), out_temp = 5, base_watt = 1000, minutes = 1 / 6)
+    assert model.predict_watt(now, out_temp = 5) is None
+    for sample in range(6):
+        model.update(now + timedelta(minutes = 29, seconds = 10 * sample), out_temp = 5, base_watt = 1000, minutes = 1 / 6)
+    assert model.predict_watt(now, out_temp = 5) == 1000
+
+
+def test_baseline_weight_is_pr_minute_not_pr_sample():
+    def learn(samples, minutes):
+        model = BaselineLoadModel(BaselineProfile(), alpha = 0.5, min_samples = 1)
+        model.update(MONDAY, out_temp = 5, base_watt = 0, minutes = 1)
+        for _ in range(samples):
+            model.update(MONDAY, out_temp = 5, base_watt = 1000, minutes = minutes)
+        return model.predict_watt(MONDAY, out_temp = 5)
+
+    assert learn(6, 1 / 6) == pytest.approx(learn(1, 1), abs = 1)
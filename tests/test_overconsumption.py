@@ -0,0 +1,59 @@
+import pytest
+
+from overconsumption import SWITCH_COST, ReduceOption, cheapest_reduction
+
+
+def option(watt, cost, **kwargs):
+    return ReduceOption(target = f"{watt}W", watt = watt, cost = cost, **kwargs)
+
+
+def test_no_deficit_or_no_options_reduces_nothing():
+    assert cheapest_reduction(0, [option(1000, 1)]) == []
+    assert cheapest_reduction(500, []) == []
+    assert cheapest_reduction(500, [option(0, 1)]) == []
+
+
+def test_picks_cheapest_combination_that_covers_deficit():
+    heater = option(1000, 1.0)
+    cheap_small = option(600, 0.2)
+    cheap_small2 = option(500, 0.2)
+    chosen = cheapest_reduction(1000, [heater, cheap_small, cheap_small2])
+    assert chosen == [cheap_small, cheap_small2]
+
+
+def test_prefers_one_action_when_cost_pr_kw_is_equal():
+    big = option(1200, 1.0)
+    small = [option(400, 1.0), option(400, 1.0), option(400, 1.0)]
+    assert cheapest_reduction(1000, [big] + small) == [big]
+
+
+def test_expensive_option_is_used_only_when_needed():
+    cheap = option(800, 0.5)
+    expensive = option(2000, 5.0)
+    assert cheapest_reduction(700, [cheap, expensive]) == [cheap]
+    chosen = cheapest_reduction(1500, [cheap, expensive])
+    assert expensive in chosen
+
+
+def test_returns_all_options_cheapest_first_when_not_enough():
+    a, b = option(300, 2.0), option(200, 1.0)
+    assert cheapest_reduction(1000, [a, b]) == [b, a]
+
+
+def test_result_covers_deficit_at_lowest_cost():
+    options = [option(w, c) for w, c in ((700, 1.0), (900, 0.8), (400, 0.3), (1500, 2.0), (250, 0.1))]
+    deficit = 1300
+    chosen = cheapest_reduction(deficit, options)
+    assert sum(o.watt for o in chosen) >= deficit
+
+    best = None
+    for mask in range(1, 2 ** len(options)):
+        subset = [o for i, o in enumerate(options) if mask >> i & 1]
+        if sum(o.watt for o in subset) >= deficit:
+            total = sum(o.action_cost for o in subset)
+            best = total if best is None else min(best, total)
+    assert sum(o.action_cost for o in chosen) == pytest.approx(best)
+
+
+def test_action_cost_includes_switch_cost():
+    assert option(2000, 1.5).action_cost == 2 * 1.5 + SWITCH_COST
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+import persistence_format
+from persistence_format import BinaryFormatError, decode, encode
+from pydantic_models import PersistenceData, _dumps_json, dump_persistence, load_persistence
+
+
+def roundtrip(document):
+    decoded, _ = decode(encode(document))
+    return decoded
+
+
+@pytest.mark.parametrize('document', [
+    {'a': {'x': {}, 'y': {}}, 'b': [{}, {}]},
+    {'a': {'x': {'k': 1}, 'y': {}}, 'b': [{}, {'k': None}]},
+    {'nested': [[1, 2], [[3], []], [{'k': [1.5]}]], 'empty': [], 'none': None},
+    {'rows': [{'k': 1, 'v': None}, {'k': 2, 'v': 'x'}]},
+    {'grid': {'-5': {'Consumption': 1.5, 'Counter': 2}, '0': {'Consumption': 1.0, 'Counter': 1}}},
+    {'floats': [float(i) / 3 for i in range(100)], 'ints': list(range(-50, 50))},
+    {'mixed': [1, 1.5] * 40, 'big': [2**70] * 70},
+])
+def test_roundtrip_is_lossless(document):
+    assert roundtrip(document) == document
+
+
+def test_roundtrip_keeps_types_of_packed_arrays():
+    document = {'floats': [1.0] * 70, 'ints': [1] * 70}
+    decoded = roundtrip(document)
+    assert all(type(v) is float for v in decoded['floats'])
+    assert all(type(v) is int for v in decoded['ints'])
+
+
+def test_schema_version_is_returned():
+    _, schema_version = decode(encode({}, schema_version = 7))
+    assert schema_version == 7
+
+
+def test_damaged_file_raises():
+    content = encode({'a': list(range(100))})
+    with pytest.raises(BinaryFormatError):
+        decode(content[:persistence_format.HEADER.size] + b'damaged')
+    with pytest.raises(BinaryFormatError):
+        decode(b'not binary')
+
+
+def test_writing_one_format_removes_the_other(tmp_path):
+    path = str(tmp_path / 'electricalmanagement.json')
+    data = PersistenceData()
+    data.max_usage.max_kwh_usage_pr_hour = 9
+    dump_persistence(path, data)
+    data.max_usage.max_kwh_usage_pr_hour = 10
+    dump_persistence(path, data, binary = True)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['electricalmanagement.bin']
+
+    # Switching back to json reads the binary file once
+    assert load_persistence(path).max_usage.max_kwh_usage_pr_hour == 10
+    dump_persistence(path, data)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['electricalmanagement.json', 'electricalmanagement.json.header']
+
+
+def test_damaged_binary_is_kept_aside_with_warning(tmp_path):
+    path = str(tmp_path / 'electricalmanagement.json')
+    (tmp_path / 'electricalmanagement.bin').write_bytes(b'EMPB damaged')
+    warnings = []
+
+    loaded = load_persistence(path, binary = True, warn = warnings.append)
+    assert loaded.max_usage.max_kwh_usage_pr_hour == PersistenceData().max_usage.max_kwh_usage_pr_hour
+    assert len(warnings) == 1
+    assert (tmp_path / 'electricalmanagement.bin.damaged').read_bytes() == b'EMPB damaged'
+
+
+def test_json_writes_number_lists_on_one_line_and_keeps_strings(tmp_path):
+    path = str(tmp_path / 'electricalmanagement.json')
+    data = PersistenceData()
+    data.load_profile.Consumption[:3] = [1.5, 2, 3]
+    data.high_consumption.high_consumption_hours = [7, 8]
+    document = {'name': 'Car [1, 2]', 'values': [1, 2.5], 'nested': [[1, 2], []], 'empty': {}}
+    assert json.loads(_dumps_json(document)) == document
+    assert '"Car [1, 2]"' in _dumps_json(document)
+
+    dump_persistence(path, data)
+    content = (tmp_path / 'electricalmanagement.json').read_text()
+    assert '[7,8]' in content
+    assert load_persistence(path).model_dump() == data.model_dump()
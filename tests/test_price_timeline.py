@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from price_timeline import PriceTimeline
+
+DAY = datetime(2026, 1, 5)
+
+
+class FakePriceApp:
+    def __init__(self, prices):
+        self.elpricestoday = [
+            SimpleNamespace(start = DAY + timedelta(hours = hour), end = DAY + timedelta(hours = hour + 1), price = price)
+            for hour, price in enumerate(prices)
+        ]
+        self.calls = 0
+
+    def electricity_price_now(self):
+        self.calls += 1
+        return 9.0
+
+
+def test_price_and_next_slot_follow_now():
+    timeline = PriceTimeline(FakePriceApp([1.0, 2.0, 3.0]))
+    assert timeline.price_now(DAY + timedelta(minutes = 30)) == 1.0
+    assert timeline.price_now(DAY + timedelta(hours = 1)) == 2.0
+    assert timeline.next_slot(DAY + timedelta(hours = 1)) == (DAY + timedelta(hours = 2), DAY + timedelta(hours = 3), 3.0)
+    assert timeline.next_slot(DAY + timedelta(hours = 2)) is None
+    assert timeline.remaining_slots(DAY) == 2
+
+
+def test_missing_price_is_asked_once_pr_slot():
+    app = FakePriceApp([1.0, None])
+    timeline = PriceTimeline(app)
+    now = DAY + timedelta(hours = 1, minutes = 5)
+    assert timeline.price_now(now) == 9.0
+    assert timeline.price_now(now + timedelta(minutes = 10)) == 9.0
+    assert app.calls == 1
+
+
+def test_outside_timeline_asks_price_app():
+    app = FakePriceApp([1.0])
+    timeline = PriceTimeline(app)
+    assert timeline.price_now(DAY + timedelta(hours = 5)) == 9.0
+    assert timeline.remaining_slots(DAY + timedelta(hours = 5)) == 0
+
+
+def test_refresh_picks_up_new_prices():
+    app = FakePriceApp([1.0])
+    timeline = PriceTimeline(app)
+    assert timeline.price_now(DAY) == 1.0
+    app.elpricestoday = FakePriceApp([4.0, 5.0]).elpricestoday
+    timeline.refresh()
+    assert timeline.price_now(DAY) == 4.0
+    assert timeline.slot_duration_seconds() == 3600.0
+
+
+def test_shared_timeline_pr_price_app():
+    app, other = FakePriceApp([1.0]), FakePriceApp([2.0])
+    timeline = PriceTimeline.shared(app)
+    assert PriceTimeline.shared(app) is timeline
+    assert PriceTimeline.shared(other) is not timeline
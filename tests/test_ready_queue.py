@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from pydantic_models import ChargingQueueItem
+from ready_queue import ReadyQueue
+
+NOW = datetime(2026, 1, 5, 12, 0)
+
+
+def _item(vehicle_id, priority, start_hours, stop_hours, finish_by_hour = 7):
+    return ChargingQueueItem(
+        vehicle_id = vehicle_id,
+        kWhRemaining = 10,
+        maxAmps = 16,
+        voltPhase = 230,
+        finish_by_hour = finish_by_hour,
+        priority = priority,
+        estHourCharge = 1,
+        name = vehicle_id,
+        chargingStart = None if start_hours is None else NOW + timedelta(hours = start_hours),
+        chargingStop = None if stop_hours is None else NOW + timedelta(hours = stop_hours),
+    )
+
+
+def test_highest_priority_in_charging_time_is_next():
+    queue = [
+        _item('low', 3, -1, 1),
+        _item('high', 1, -1, 1),
+        _item('later', 1, 2, 3),
+    ]
+    ready = ReadyQueue()
+    assert ready.next_ready(NOW, queue) == 'high'
+    assert ready.next_ready(NOW + timedelta(hours = 2), queue) == 'later'
+
+
+def test_charging_vehicles_are_skipped_until_unmarked():
+    queue = [_item('a', 1, -1, 1), _item('b', 2, -1, 1)]
+    ready = ReadyQueue()
+    ready.mark_charging('a')
+    assert ready.next_ready(NOW, queue) == 'b'
+    ready.mark_charging('b')
+    assert ready.next_ready(NOW, queue) is None
+
+    ready.unmark_charging('a')
+    assert ready.next_ready(NOW, queue) == 'a'
+
+
+def test_expired_charging_time_is_not_ready():
+    queue = [_item('done', 1, -2, -1), _item('unplanned', 1, None, None)]
+    ready = ReadyQueue()
+    assert ready.next_ready(NOW, queue) is None
+    assert ready.next_any(queue) == 'done'
+
+
+def test_edf_orders_by_charging_stop_before_priority():
+    queue = [_item('priority', 1, -1, 3), _item('deadline', 4, -1, 1)]
+    assert ReadyQueue().next_ready(NOW, queue) == 'priority'
+    assert ReadyQueue(order = 'edf').next_ready(NOW, queue) == 'deadline'
+
+
+def test_unknown_order_falls_back_to_priority():
+    assert ReadyQueue(order = 'random').order == 'priority'
+
+
+def test_invalidate_rebuilds_from_new_queue():
+    ready = ReadyQueue()
+    assert ready.next_any([_item('a', 2, None, None)]) == 'a'
+    assert ready.next_any([_item('b', 1, None, None)]) == 'a'
+    ready.invalidate()
+    assert ready.next_any([_item('b', 1, None, None)]) == 'b'
@@ -0,0 +1,70 @@
+import threading
+from datetime import datetime, timedelta
+
+from schedule_offload import AvailableWattSnapshot, ScheduleOffloader, build_available_watt, snapshot_price_app
+
+HOUR = datetime(2026, 1, 5, 10, 0)
+
+
+class FakeADAPI:
+    def __init__(self):
+        self.scheduled = []
+
+    def run_in(self, callback, delay, **kwargs):
+        self.scheduled.append((callback, kwargs))
+
+    def log(self, message, level = 'INFO'):
+        pass
+
+
+def test_result_is_applied_in_an_appdaemon_callback():
+    api = FakeADAPI()
+    offloader = ScheduleOffloader(api, mode = 'thread')
+    applied = []
+    future = offloader.submit(lambda x: (x * 2, threading.current_thread()), 21,
+        lambda result: applied.append((result, threading.current_thread())), name = 'test')
+    future.result()
+    offloader.shutdown()
+    assert applied == []
+
+    callback, kwargs = api.scheduled[0]
+    callback(kwargs)
+    (value, worker_thread), apply_thread = applied[0]
+    assert value == 42
+    assert apply_thread is threading.current_thread()
+    assert worker_thread is not apply_thread
+
+
+def test_off_runs_directly():
+    api = FakeADAPI()
+    applied = []
+    assert ScheduleOffloader(api, mode = 'off').submit(lambda x: x + 1, 1, applied.append, name = 'test') is None
+    assert applied == [2]
+    assert api.scheduled == []
+
+
+def test_price_snapshot_keeps_prices_when_app_updates():
+    class PriceApp:
+        def __init__(self):
+            self.elpricestoday = [1.0, 2.0]
+
+        def cheapest(self):
+            return min(self.elpricestoday)
+
+    app = PriceApp()
+    snapshot = snapshot_price_app(app)
+    app.elpricestoday.append(0.5)
+    assert snapshot.cheapest() == 1.0
+    assert app.cheapest() == 0.5
+
+
+def test_available_watt_subtracts_base_load_and_heater_recovery():
+    slots = [(HOUR + timedelta(hours = h), HOUR + timedelta(hours = h + 1)) for h in range(3)]
+    snapshot = AvailableWattSnapshot(
+        slots = slots,
+        max_kwh_usage_pr_hour = 5,
+        slot_watt = [1000, None, 2000],
+        heater_loads = [(HOUR + timedelta(hours = 1), 1500, 1000)],
+    )
+    available = build_available_watt(snapshot)
+    assert list(available.available_Wh) == [4000, 4000, 2500]
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from simulator import HistoryEvent, PriceSlot, SimulatedADAPI, Simulation, _Completed
+
+START = datetime(2026, 1, 5, 0, 0, tzinfo = timezone.utc)
+HOURS = 6
+
+CONFIG = {
+    'module': 'electricalManagement',
+    'class': 'ElectricalUsage',
+    'electricalPriceApp': 'elprice',
+    'power_consumption': 'sensor.power',
+    'accumulated_consumption_current_hour': 'sensor.accumulated',
+    'options': [],
+    'vacation': 'input_boolean.vacation',
+    'heater_switches': [{'switch': 'switch.vvb', 'consumptionSensor': 'sensor.vvb_power'}],
+}
+
+
+def _history():
+    """ 1 kW base load and a 2 kW water heater that was on for the whole period """
+
+    history = [
+        HistoryEvent(START, 'input_boolean.vacation', 'off'),
+        HistoryEvent(START, 'switch.vvb', 'on'),
+        HistoryEvent(START, 'sensor.vvb_power', '2000'),
+    ]
+    for minute in range(0, HOURS * 60, 5):
+        history.append(HistoryEvent(START + timedelta(minutes = minute), 'sensor.power', '3000'))
+    return history
+
+
+def _prices():
+    return [
+        PriceSlot(start = START + timedelta(hours = h), end = START + timedelta(hours = h + 1),
+            price = 3.0 if h in (2, 3) else 1.0)
+        for h in range(48)
+    ]
+
+
+def test_meter_integrates_recorded_power_pr_hour():
+    api = SimulatedADAPI(start = START, tz = timezone.utc)
+    api.power_sensor = 'sensor.power'
+    api.apply_history(HistoryEvent(START, 'sensor.power', '1200'), notify = False)
+    api.advance(START + timedelta(minutes = 90))
+
+    assert api.hour_Wh[START] == pytest.approx(1200)
+    assert api.hour_Wh[START + timedelta(hours = 1)] == pytest.approx(600)
+
+
+def test_get_state_is_awaitable_in_a_coroutine():
+    api = SimulatedADAPI(start = START, tz = timezone.utc)
+    api.apply_history(HistoryEvent(START, 'sensor.power', '1200'), notify = False)
+
+    async def read():
+        return isinstance(api.get_state('sensor.power'), _Completed), await api.get_state('sensor.power')
+
+    assert api.get_state('sensor.power') == '1200'
+    assert asyncio.run(read()) == (True, '1200')
+
+
+@pytest.mark.parametrize('async_control_loop', [False, True])
+def test_replay_reports_every_hour_without_errors(async_control_loop):
+    pytest.importorskip('appdaemon')
+
+    report = Simulation(
+        {**CONFIG, 'async_control_loop': async_control_loop},
+        history = _history(),
+        prices = _prices(),
+        loads = {'switch.vvb': 2000},
+    ).run()
+
+    assert report.errors == []
+    assert report.warnings == 0
+    assert [h.start for h in report.hours] == [START + timedelta(hours = h) for h in range(HOURS)]
+    # Water heater can only be turned off, so the replay never uses more than was recorded
+    assert HOURS * 1.0 <= report.total_kWh <= HOURS * 3.0 + 0.01
+    assert all(h.price == (3.0 if h.start.hour in (2, 3) else 1.0) for h in report.hours)
+
+
+def test_async_control_loop_makes_the_same_decisions():
+    pytest.importorskip('appdaemon')
+
+    reports = [
+        Simulation(
+            {**CONFIG, 'async_control_loop': async_control_loop},
+            history = _history(),
+            prices = _prices(),
+            loads = {'switch.vvb': 2000},
+        ).run()
+        for async_control_loop in (False, True)
+    ]
+
+    assert reports[0].calls == reports[1].calls
+    assert reports[0].total_kWh == pytest.approx(reports[1].total_kWh)
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+from pydantic_models import WattSlot
+from watt_slots import WattSlots
+
+HOUR = datetime(2026, 1, 5, 10, 0)
+
+
+def test_round_trip_to_models():
+    slots = [
+        WattSlot(start = HOUR, end = HOUR + timedelta(minutes = 15), available_Wh = 250.0),
+        WattSlot(start = HOUR + timedelta(minutes = 15), end = HOUR + timedelta(hours = 1), available_Wh = -100.0),
+    ]
+    store = WattSlots.from_slots(slots)
+    assert len(store) == 2
+    assert list(store.duration_hours) == [0.25, 0.75]
+    assert store.to_slots() == slots
+
+
+def test_replace_updates_in_place():
+    store = WattSlots()
+    holder = store
+    other = WattSlots()
+    other.append(HOUR, HOUR + timedelta(hours = 1), 1000.0)
+    store.replace(other)
+    assert len(holder) == 1
+    assert holder.available_Wh[0] == 1000.0
+    assert holder.duration_hours[0] == 1.0